@@ -7,74 +7,238 @@ import sys
 import os
 sys.path.append('scripts')
 
-from ingesta_bronze import IngestaBronze
+from ingesta_bronze import IngestaBronze, FUENTES_DEFAULT
 from limpieza_silver import LimpiezaSilver
-import logging
+from capa_gold import CapaGold
+from cubos_gold import CubosGold
+from compactacion import CompactacionSilver
+from planificador import PlanificadorDAG
+from cache_etapas import CacheEtapas
+from reglas_silver import TABLAS_SILVER
+from servicio_workflow import ServicioWorkflow, encolar
+from ingesta_streaming import IngestaStreaming
+from observabilidad import Trazador, obtener_logger
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from datetime import datetime
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/main_workflow.log'),
-        logging.StreamHandler()
-    ]
-)
+logger = obtener_logger('main_workflow')
 
 class WorkflowLIDL:
-    def __init__(self):
+    def __init__(self, incremental=False, full_refresh=False, motor='auto', en_memoria=True,
+                 max_concurrencia=None, reintentos=1, cache=True, sesion=None, pool=None):
         self.start_time = datetime.now()
+        self.incremental = incremental
+        self.full_refresh = full_refresh
+        self.motor = motor
+        # en_memoria: Silver recibe los datos de Bronze sin releer el Parquet,
+        # que se escribe en segundo plano para auditoría
+        self.en_memoria = en_memoria
+        # Planificador: tareas simultáneas (por defecto dos por fuente) y reintentos por tarea
+        self.max_concurrencia = max_concurrencia
+        self.reintentos = reintentos
+        # cache: saltar las tablas cuyas entradas, reglas y código no cambiaron (ver CacheEtapas)
+        self.cache = CacheEtapas() if cache else None
+        self.tiempos = {}
+        # Spans por etapa y tabla: logs/metricas.jsonl y logs/metricas.prom (Prometheus)
+        self.trazador = Trazador()
+        # Modo servicio: SparkSession y pool de ingesta vivos entre ejecuciones (no se cierran aquí)
+        self.sesion = sesion
+        self.pool = pool
+    
+    def medir(self, nombre, funcion, metricas=None, **atributos):
+        """
+        Envolver una tarea del DAG en un span. metricas(resultado) retorna las métricas
+        del span ({'filas_salida': n, ...}) a partir del resultado de la tarea
+        """
+        def tarea(*args):
+            with self.trazador.span(nombre, **atributos) as span:
+                resultado = funcion(*args)
+                if metricas:
+                    span.registrar(**metricas(resultado))
+                return resultado
+        return tarea
+    
+    def construir_dag(self, ingesta, limpieza, pool):
+        """
+        Un grafo por tabla: bronze_<fuente> -> silver_<fuente> -> compactar_<fuente>. Cada
+        limpieza arranca en cuanto su fuente está ingerida, sin esperar a las demás fuentes, y
+        su Bronze se escribe en segundo plano desde ese momento (ingestar_fuente).
+        Gold espera a todas las tablas Silver y reutiliza la sesión Spark de la limpieza si
+        la hay; los cubos de agregados y el índice de claves se resuelven en paralelo a Gold
+        """
+        planificador = PlanificadorDAG(
+            max_concurrencia=self.max_concurrencia or 2 * len(ingesta.fuentes),
+            reintentos=self.reintentos
+        )
+        compactacion = CompactacionSilver(cache=self.cache)
+        for fuente in ingesta.fuentes:
+            planificador.agregar(f'bronze_{fuente}', partial(ingesta.ingestar_fuente, fuente, pool))
+            if fuente in TABLAS_SILVER:
+                planificador.agregar(
+                    f'silver_{fuente}',
+                    partial(limpieza.limpiar_tabla, fuente, self.full_refresh),
+                    dependencias=[f'bronze_{fuente}']
+                )
+                # Une los archivos pequeños que dejan las escrituras incrementales antes de leer Silver
+                planificador.agregar(
+                    f'compactar_{fuente}',
+                    self.medir(
+                        'compactacion',
+                        lambda stats, tabla=TABLAS_SILVER[fuente]['tabla']: compactacion.compactar_tabla(tabla),
+                        lambda stats: {'archivos_antes': stats['archivos_antes'],
+                                       'archivos_despues': stats['archivos_despues']},
+                        tabla=fuente
+                    ),
+                    dependencias=[f'silver_{fuente}']
+                )
+        
+        silver = [f'compactar_{fuente}' for fuente in ingesta.fuentes if fuente in TABLAS_SILVER]
+        gold = CapaGold(motor=self.motor, spark=limpieza.spark, sesion=self.sesion, cache=self.cache)
+        planificador.agregar(
+            'gold',
+            self.medir('gold', lambda *silver: gold.ejecutar_gold(), lambda stats: {'filas_salida': stats['registros']}),
+            dependencias=silver
+        )
         
+        # Los cubos solo recalculan los rangos de codigo que cambiaron en Silver
+        cubos = CubosGold()
+        planificador.agregar(
+            'cubos',
+            self.medir('cubos', lambda *silver: cubos.actualizar(self.full_refresh),
+                       lambda estado: {'rangos_recalculados': len(estado['rangos_recalculados'])}),
+            dependencias=silver
+        )
+        
+        # Cada silver_<fuente> ya dejó sus claves en el índice: solo falta cruzarlas
+        planificador.agregar(
+            'indice_claves',
+            lambda *tablas: limpieza.construir_indice(),
+            dependencias=[f'silver_{fuente}' for fuente in ingesta.fuentes if fuente in TABLAS_SILVER]
+        )
+        return planificador
+    
+    def resumen_tareas(self):
+        """Registrar estado, intentos y duración de cada tarea del DAG"""
+        logger.info("\n⏱️  Tareas:")
+        for nombre, t in self.tiempos.items():
+            duracion = f"{t['duracion']:.2f} s" if t['duracion'] is not None else "-"
+            logger.info(f"  {nombre:<20} {t['estado']:<12} intentos={t['intentos']} {duracion}")
+    
     def ejecutar_workflow_completo(self):
-        """Ejecutar workflow completo: Bronze → Silver"""
+        """Ejecutar workflow completo: Bronze → Silver → Gold (span raíz 'workflow' de la traza)"""
+        modo = 'incremental' if self.incremental else 'completo'
+        try:
+            with self.trazador.span('workflow', motor=self.motor, modo=modo) as span:
+                return self._ejecutar_etapas(span)
+        finally:
+            self.trazador.exportar()
+    
+    def _ejecutar_etapas(self, span):
         
-        logging.info("="*60)
-        logging.info("🏪 PROYECTO LIDL - PIPELINE DE DATOS")
-        logging.info("="*60)
+        logger.info("="*60)
+        logger.info("🏪 PROYECTO LIDL - PIPELINE DE DATOS")
+        logger.info("="*60)
         
         try:
-            # ETAPA 1: Ingesta Bronze
-            logging.info("\n📥 ETAPA 1: Ingesta Bronze Layer")
-            logging.info("-"*60)
-            ingesta = IngestaBronze()
-            bronze_data = ingesta.ejecutar_ingesta()
+            # Bronze y Silver por tabla en un DAG: ingesta en procesos, limpieza con motor compartido
+            logger.info("\n📥🧹🏆 ETAPAS 1-3: Ingesta Bronze → Limpieza Silver (por tabla) → Gold")
+            logger.info("-"*60)
+            ingesta = IngestaBronze(incremental=self.incremental, en_memoria=self.en_memoria, cache=self.cache,
+                                    trazador=self.trazador)
+            limpieza = LimpiezaSilver(incremental=self.incremental, motor=self.motor, cache=self.cache,
+                                      trazador=self.trazador, sesion=self.sesion, indice_claves=True)
+            
+            # Silver arranca antes de tener Bronze: el motor automático se elige por el tamaño de las fuentes
+            limpieza.iniciar(self.full_refresh, tamano_estimado=ingesta.tamano_fuentes())
+            resultados = {}
+            try:
+                trabajadores = min(len(ingesta.fuentes), os.cpu_count() or 1)
+                with nullcontext(self.pool) if self.pool else ProcessPoolExecutor(max_workers=trabajadores) as pool:
+                    planificador = self.construir_dag(ingesta, limpieza, pool)
+                    resultados = planificador.ejecutar()
+                    self.tiempos = planificador.tiempos
+            finally:
+                # Stats y estado de lo que sí terminó, aunque alguna tabla haya fallado (los lotes
+                # en memoria ya se están escribiendo desde que terminó su bronze_<fuente>)
+                ingesta.finalizar_ingesta({f: resultados.get(f'bronze_{f}') for f in ingesta.fuentes})
+                limpieza.guardar_stats()
+                limpieza.detener()
             
-            # Verificar que todos los DataFrames se cargaron correctamente
-            if any(df is None for df in bronze_data.values()):
-                raise Exception("Error en ingesta Bronze - Datos incompletos")
+            # Bronze debe quedar escrito antes de dar el workflow por completado (normalmente ya lo está)
+            ingesta.esperar_persistencia()
+            self.resumen_tareas()
             
-            # ETAPA 2: Limpieza Silver
-            logging.info("\n🧹 ETAPA 2: Limpieza Silver Layer")
-            logging.info("-"*60)
-            limpieza = LimpiezaSilver()
-            silver_data = limpieza.ejecutar_limpieza()
+            if planificador.fallidas():
+                raise Exception(f"Tareas fallidas: {', '.join(planificador.fallidas())}")
             
             # Resumen final
             self.end_time = datetime.now()
             duration = (self.end_time - self.start_time).total_seconds()
             
-            logging.info("\n" + "="*60)
-            logging.info("✅ WORKFLOW COMPLETADO EXITOSAMENTE")
-            logging.info("="*60)
-            logging.info(f"⏱️  Duración total: {duration:.2f} segundos")
-            logging.info(f"📁 Archivos Bronze: bronze/ventas/")
-            logging.info(f"📁 Archivos Silver: silver/ventas/")
-            logging.info(f"📋 Logs: logs/")
-            logging.info("="*60)
+            logger.info("\n" + "="*60)
+            logger.info("✅ WORKFLOW COMPLETADO EXITOSAMENTE")
+            logger.info("="*60)
+            logger.info(f"⏱️  Duración total: {duration:.2f} segundos")
+            logger.info(f"📁 Archivos Bronze: bronze/ventas/")
+            logger.info(f"📁 Archivos Silver: silver/ventas/")
+            logger.info(f"📁 Archivos Gold: gold/ventas/")
+            logger.info(f"📋 Logs: logs/ (métricas: {self.trazador.jsonl_file}, {self.trazador.prometheus_file})")
+            logger.info("="*60)
             
             return True
-            
+        
         except Exception as e:
-            logging.error(f"\n❌ ERROR EN WORKFLOW: {str(e)}")
-            logging.error("Revisa los logs para más detalles")
+            logger.error(f"\n❌ ERROR EN WORKFLOW: {str(e)}")
+            logger.error("Revisa los logs para más detalles")
+            span.fallar(e)
             return False
 
 
+def ejecutar_peticion(opciones, sesion, pool):
+    """Ejecutar una petición del modo servicio con la sesión Spark y el pool compartidos"""
+    workflow = WorkflowLIDL(**opciones, sesion=sesion, pool=pool)
+    exito = workflow.ejecutar_workflow_completo()
+    return {'exito': exito, 'traza': workflow.trazador.traza_id}
+
+
 if __name__ == "__main__":
     os.makedirs('logs', exist_ok=True)
     
-    workflow = WorkflowLIDL()
+    # --incremental: procesar solo lo añadido a las fuentes desde la última ejecución
+    # --full-refresh: reconstruir Silver completo (backfills) aunque se use --incremental
+    # --motor=auto|spark|arrow: motor de limpieza Silver (auto: Arrow si el Bronze es pequeño)
+    # --bronze-en-disco: Silver relee Bronze desde Parquet en lugar de recibirlo en memoria
+    # --sin-cache: no reutilizar salidas de ejecuciones anteriores con las mismas entradas
+    # --daemon: servicio con sesión Spark y pool vivos; atiende las peticiones de peticiones/pendientes
+    # --encolar: dejar una petición con los flags anteriores para el servicio y salir
+    # --streaming: vigilar landing/ e ingerir cada archivo delta a Bronze y Silver al llegar
+    motor = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--motor=')), 'auto')
+    opciones = {
+        'incremental': '--incremental' in sys.argv,
+        'full_refresh': '--full-refresh' in sys.argv,
+        'motor': motor,
+        'en_memoria': '--bronze-en-disco' not in sys.argv,
+        'cache': '--sin-cache' not in sys.argv
+    }
+    
+    if '--encolar' in sys.argv:
+        logger.info(f"✓ Petición encolada: {encolar(opciones)}")
+        sys.exit(0)
+    
+    if '--streaming' in sys.argv:
+        IngestaStreaming(motor=motor).ejecutar_streaming()
+        sys.exit(0)
+    
+    if '--daemon' in sys.argv:
+        # El servicio mantiene la JVM salvo que todas las peticiones vayan a usar Arrow
+        servicio = ServicioWorkflow(ejecutar_peticion, trabajadores=min(len(FUENTES_DEFAULT), os.cpu_count() or 1),
+                                    spark=motor != 'arrow')
+        servicio.ejecutar_servicio()
+        sys.exit(0)
+    
+    workflow = WorkflowLIDL(**opciones)
     success = workflow.ejecutar_workflow_completo()
     
     sys.exit(0 if success else 1)
\ No newline at end of file
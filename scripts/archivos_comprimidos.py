@@ -0,0 +1,180 @@
+"""
+Archivos Comprimidos - Proyecto LIDL
+Lectura de fuentes .zip (uno o varios miembros), .gz y .zst como streams: un hilo
+descomprime por bloques mientras el parser consume, sin extraer nada a disco
+"""
+
+import os
+import io
+import gzip
+import queue
+import struct
+import zipfile
+import threading
+
+EXTENSIONES_COMPRIMIDAS = ('.zip', '.gz', '.zst')
+TAMANO_BLOQUE_DESCOMPRESION = 4 * 1024 * 1024  # bytes descomprimidos por bloque
+BLOQUES_EN_VUELO = 4  # bloques descomprimidos por adelantado (acota la memoria del stream)
+
+_FIN = object()
+
+
+def es_comprimido(ruta):
+    return ruta.lower().endswith(EXTENSIONES_COMPRIMIDAS)
+
+
+def _zstd():
+    """Módulo zstandard (dependencia opcional: solo hace falta para fuentes .zst)"""
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Leer archivos .zst requiere el paquete zstandard (pip install zstandard)")
+    return zstandard
+
+
+def miembros(ruta, extension=None):
+    """
+    Miembros de un .zip en orden (sin directorios), opcionalmente solo los de una extensión;
+    [None] para .gz y .zst, que tienen un único contenido
+    """
+    if not ruta.lower().endswith('.zip'):
+        return [None]
+    with zipfile.ZipFile(ruta) as archivo:
+        nombres = [info.filename for info in archivo.infolist() if not info.is_dir()]
+    if extension:
+        nombres = [nombre for nombre in nombres if nombre.lower().endswith(extension)]
+    return nombres
+
+
+def nombre_contenido(ruta):
+    """
+    Nombre del archivo que hay dentro: sin la extensión de compresión en .gz/.zst y el del
+    primer miembro en .zip (None si el zip está vacío). Sin comprimir, el propio nombre
+    """
+    nombre = os.path.basename(ruta)
+    if ruta.lower().endswith('.zip'):
+        nombres = miembros(ruta)
+        return os.path.basename(nombres[0]) if nombres else None
+    if es_comprimido(ruta):
+        return os.path.splitext(nombre)[0]
+    return nombre
+
+
+def tamano_descomprimido(ruta):
+    """
+    Bytes descomprimidos estimados sin descomprimir: tamaños del directorio central del zip,
+    ISIZE del gzip (módulo 4 GiB, solo del último miembro) y tamaño declarado en el frame zstd.
+    Si no se puede saber, el tamaño en disco
+    """
+    tamano = os.path.getsize(ruta)
+    minuscula = ruta.lower()
+    if minuscula.endswith('.zip'):
+        with zipfile.ZipFile(ruta) as archivo:
+            return sum(info.file_size for info in archivo.infolist())
+    if minuscula.endswith('.gz') and tamano >= 4:
+        with open(ruta, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            return max(struct.unpack('<I', f.read(4))[0], tamano)
+    if minuscula.endswith('.zst'):
+        try:
+            with open(ruta, 'rb') as f:
+                declarado = _zstd().frame_content_size(f.read(18))
+            if declarado > 0:
+                return declarado
+        except Exception:
+            pass
+    return tamano
+
+
+def _bloques(ruta, nombres):
+    """Bloques descomprimidos de los miembros dados, uno tras otro"""
+    minuscula = ruta.lower()
+    if minuscula.endswith('.zip'):
+        with zipfile.ZipFile(ruta) as archivo:
+            for nombre in nombres:
+                with archivo.open(nombre) as miembro:
+                    yield from iter(lambda: miembro.read(TAMANO_BLOQUE_DESCOMPRESION), b'')
+    elif minuscula.endswith('.gz'):
+        # gzip lee también los .gz con varios miembros concatenados
+        with gzip.open(ruta, 'rb') as contenido:
+            yield from iter(lambda: contenido.read(TAMANO_BLOQUE_DESCOMPRESION), b'')
+    elif minuscula.endswith('.zst'):
+        with open(ruta, 'rb') as f:
+            with _zstd().ZstdDecompressor().stream_reader(f, read_across_frames=True) as contenido:
+                yield from iter(lambda: contenido.read(TAMANO_BLOQUE_DESCOMPRESION), b'')
+    else:
+        with open(ruta, 'rb') as f:
+            yield from iter(lambda: f.read(TAMANO_BLOQUE_DESCOMPRESION), b'')
+
+
+class StreamDescompresion(io.RawIOBase):
+    """
+    Stream de solo lectura cuyo contenido descomprime un hilo en segundo plano. zlib y zstd
+    liberan el GIL al descomprimir, así que la descompresión se solapa con el parseo. La cola
+    acotada frena al hilo si el parser va más lento. Los errores del hilo se relanzan al leer
+    """
+    
+    def __init__(self, ruta, nombres):
+        self._cola = queue.Queue(maxsize=BLOQUES_EN_VUELO)
+        self._detener = threading.Event()
+        self._actual = memoryview(b'')
+        self._terminado = False
+        self._hilo = threading.Thread(target=self._descomprimir, args=(ruta, nombres), daemon=True)
+        self._hilo.start()
+    
+    def _poner(self, elemento):
+        while not self._detener.is_set():
+            try:
+                self._cola.put(elemento, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _descomprimir(self, ruta, nombres):
+        try:
+            for bloque in _bloques(ruta, nombres):
+                if not self._poner(bloque):
+                    return
+            self._poner(_FIN)
+        except BaseException as e:
+            self._poner(e)
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, destino):
+        while not self._actual:
+            if self._terminado:
+                return 0
+            elemento = self._cola.get()
+            if elemento is _FIN:
+                self._terminado = True
+                return 0
+            if isinstance(elemento, BaseException):
+                self._terminado = True
+                raise elemento
+            self._actual = memoryview(elemento)
+        n = min(len(destino), len(self._actual))
+        destino[:n] = self._actual[:n]
+        self._actual = self._actual[n:]
+        return n
+    
+    def close(self):
+        """Parar el hilo aunque no se haya leído todo (p.ej. solo la cabecera de un dump)"""
+        if not self.closed:
+            self._detener.set()
+            self._hilo.join()
+        super().close()
+
+
+def abrir(ruta, miembro=None):
+    """Stream binario con buffer de un archivo (o de un miembro de un .zip), descomprimido al vuelo"""
+    nombres = [miembro] if miembro is not None else miembros(ruta)
+    return io.BufferedReader(StreamDescompresion(ruta, nombres), buffer_size=TAMANO_BLOQUE_DESCOMPRESION)
+
+
+def abrir_concatenado(ruta, extension=None):
+    """Stream con el contenido de todos los miembros (de una extensión) uno tras otro"""
+    return io.BufferedReader(StreamDescompresion(ruta, miembros(ruta, extension)),
+                             buffer_size=TAMANO_BLOQUE_DESCOMPRESION)
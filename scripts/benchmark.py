@@ -0,0 +1,395 @@
+"""
+Benchmark del Pipeline - Proyecto LIDL
+Ejecuta Bronze, Silver, Gold y sus sub-pasos sobre datos sintéticos a varias escalas y
+registra throughput, CPU, memoria pico y tiempos de jobs Spark en un archivo JSON lines
+para comparar versiones del código
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import subprocess
+import urllib.request
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pandas as pd
+
+from datos_sinteticos import GeneradorDatos
+from ingesta_bronze import IngestaBronze, ESQUEMA_EXTRA, ESQUEMA_INFO, ESQUEMA_CLIENTES, COLUMNAS_EXTRA
+from validacion import MotorValidacion
+from esquemas_bronze import ESQUEMA_BRONZE_INFO
+from limpieza_silver import LimpiezaSilver
+from capa_gold import CapaGold
+from cubos_gold import CubosGold
+from reglas_silver import TABLAS_SILVER
+from observabilidad import MuestreadorRSS, Trazador, obtener_logger, tamano_ruta
+
+logger = obtener_logger('benchmark')
+
+ESCALAS_DEFAULT = [10_000, 100_000, 1_000_000]
+DIRECTORIO_BENCHMARK = '.benchmark'
+RESULTADOS_DEFAULT = 'benchmarks/resultados.jsonl'
+
+# parse_sql_inserts carga el dump entero en pandas: por encima de esto se omite
+LIMITE_PARSE_EN_MEMORIA = 2_000_000
+TOLERANCIA_REGRESION = 0.10    # un paso es regresión si tarda más de un 10% que la base
+
+_VALIDACION = {'extra': ESQUEMA_EXTRA, 'info': ESQUEMA_INFO, 'clientes': ESQUEMA_CLIENTES}
+
+
+def _rss_pico_historico(quien=resource.RUSAGE_SELF):
+    """ru_maxrss en bytes (Linux lo da en KB, macOS en bytes)"""
+    pico = resource.getrusage(quien).ru_maxrss
+    return pico if sys.platform == 'darwin' else pico * 1024
+
+
+def _version_codigo():
+    """Commit actual (con -dirty si hay cambios sin commitear); None fuera de un repo git"""
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _entorno():
+    versiones = {'python': platform.python_version(), 'pyarrow': pa.__version__, 'pandas': pd.__version__}
+    try:
+        import pyspark
+        versiones['pyspark'] = pyspark.__version__
+    except ImportError:
+        versiones['pyspark'] = None
+    return {**versiones, 'plataforma': platform.platform(), 'cpus': os.cpu_count()}
+
+
+class TiemposSpark:
+    """
+    Tiempos de los jobs Spark de un paso: los jobs se etiquetan con un job group por paso
+    y sus duraciones se leen del API REST de la UI de Spark (/api/v1/applications/.../jobs).
+    Sin UI solo se cuentan los jobs vía statusTracker
+    """
+    
+    def __init__(self, spark):
+        self.spark = spark
+    
+    def iniciar(self, paso):
+        self.spark.sparkContext.setJobGroup(paso, f"benchmark: {paso}")
+    
+    def _jobs_rest(self, grupo):
+        sc = self.spark.sparkContext
+        if not sc.uiWebUrl:
+            return None
+        url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/jobs"
+        try:
+            with urllib.request.urlopen(url, timeout=10) as respuesta:
+                jobs = json.load(respuesta)
+        except (OSError, ValueError):
+            return None
+        return [job for job in jobs if job.get('jobGroup') == grupo]
+    
+    @staticmethod
+    def _segundos(job):
+        formato = '%Y-%m-%dT%H:%M:%S.%f%Z'
+        if 'completionTime' not in job or 'submissionTime' not in job:
+            return None
+        fin = datetime.strptime(job['completionTime'], formato)
+        inicio = datetime.strptime(job['submissionTime'], formato)
+        return (fin - inicio).total_seconds()
+    
+    def finalizar(self, paso):
+        """{jobs, etapas, segundos_jobs, job_mas_lento} de los jobs del paso"""
+        sc = self.spark.sparkContext
+        sc.setLocalProperty('spark.jobGroup.id', None)
+        sc.setLocalProperty('spark.job.description', None)
+        jobs = self._jobs_rest(paso)
+        if jobs is None:
+            return {'jobs': len(sc.statusTracker().getJobIdsForGroup(paso))}
+        
+        duraciones = [s for s in (self._segundos(job) for job in jobs) if s is not None]
+        return {
+            'jobs': len(jobs),
+            'etapas': sum(len(job.get('stageIds', [])) for job in jobs),
+            'segundos_jobs': round(sum(duraciones), 3),
+            'job_mas_lento': round(max(duraciones), 3) if duraciones else None
+        }
+
+
+class BenchmarkPipeline:
+    """
+    Por cada escala genera (o reutiliza) los datos sintéticos en .benchmark/<filas>-<sucios>-<semilla>/
+    y mide cada paso por separado:
+    - parse_sql_inserts (solo hasta LIMITE_PARSE_EN_MEMORIA filas)
+    - validacion_<fuente>: MotorValidacion sobre el texto original (solo el tiempo de validar)
+    - bronze_<fuente>: IngestaBronze.ingestar_fuente a disco (incluye escribir los part files), sin cache
+    - bronze_cierre: estadísticas y estado de la ingesta (y la persistencia pendiente, si la hay)
+    - silver_<fuente>: LimpiezaSilver.limpiar_tabla (completo)
+    - gold y cubos
+    Cada paso registra segundos, CPU (proceso + hijos), filas y bytes por segundo, RSS pico
+    del proceso y, con Spark, los tiempos de sus jobs. El RSS pico de los procesos hijos
+    (workers de rangos) solo existe como máximo de toda la vida del proceso, así que va una
+    vez por ejecución (rss_pico_hijos_mb) y no por paso. Una ejecución = una línea JSON
+    """
+    
+    def __init__(self, escalas=None, proporcion_sucios=0.05, semilla=42, motor='auto',
+                 directorio=DIRECTORIO_BENCHMARK, resultados_file=RESULTADOS_DEFAULT):
+        self.escalas = escalas or list(ESCALAS_DEFAULT)
+        self.proporcion_sucios = proporcion_sucios
+        self.semilla = semilla
+        self.motor = motor
+        self.directorio = directorio
+        self.resultados_file = resultados_file
+        self.spark = None
+    
+    def _medir(self, pasos, paso, funcion, filas=None, bytes_entrada=None):
+        """
+        Ejecutar funcion() midiendo el paso. funcion puede retornar {'filas': n, 'segundos': s,
+        ...}: 'segundos' reemplaza al tiempo total (p.ej. solo el tiempo de validar) y el
+        resto de claves se añade a la medición
+        """
+        spark = TiemposSpark(self.spark) if self.spark is not None else None
+        if spark:
+            spark.iniciar(paso)
+        uso_antes = resource.getrusage(resource.RUSAGE_SELF)
+        hijos_antes = resource.getrusage(resource.RUSAGE_CHILDREN)
+        with MuestreadorRSS() as muestreador:
+            inicio = time.perf_counter()
+            resultado = funcion() or {}
+            segundos = time.perf_counter() - inicio
+        uso = resource.getrusage(resource.RUSAGE_SELF)
+        hijos = resource.getrusage(resource.RUSAGE_CHILDREN)
+        
+        segundos = resultado.pop('segundos', segundos)
+        filas = resultado.pop('filas', filas)
+        medicion = {
+            'paso': paso,
+            'filas': filas,
+            'segundos': round(segundos, 4),
+            'cpu_segundos': round(
+                (uso.ru_utime + uso.ru_stime - uso_antes.ru_utime - uso_antes.ru_stime)
+                + (hijos.ru_utime + hijos.ru_stime - hijos_antes.ru_utime - hijos_antes.ru_stime), 4
+            ),
+            'filas_por_segundo': round(filas / segundos) if filas and segundos else None,
+            'mb_por_segundo': round(bytes_entrada / 1024 / 1024 / segundos, 2) if bytes_entrada and segundos else None,
+            'rss_pico_mb': round(muestreador.pico / 1024 / 1024, 1)
+        }
+        if spark:
+            medicion['spark'] = spark.finalizar(paso)
+        medicion.update(resultado)
+        pasos.append(medicion)
+        logger.info(f"  {paso}: {medicion['segundos']:.2f}s, {medicion['filas_por_segundo'] or '-'} filas/s, "
+                     f"RSS pico {medicion['rss_pico_mb']} MB")
+        return medicion
+    
+    def _datos(self, filas, pasos):
+        """Rutas de las fuentes sintéticas de la escala (se generan una sola vez)"""
+        directorio = os.path.join(self.directorio, f"{filas}-{self.proporcion_sucios}-{self.semilla}", 'fuentes')
+        generador = GeneradorDatos(filas, self.proporcion_sucios, self.semilla)
+        rutas = {fuente: os.path.join(directorio, archivo) for fuente, archivo in
+                 (('extra', 'clientes_extra.txt'), ('info', 'clientes_info.csv'), ('clientes', 'clientes.sql'))}
+        descripcion_file = os.path.join(directorio, 'generacion.json')
+        if os.path.exists(descripcion_file):
+            with open(descripcion_file) as f:
+                return rutas, json.load(f)['inyectados']
+        self._medir(pasos, 'generar', lambda: generador.generar(directorio) and None, filas=3 * filas)
+        return rutas, generador.inyectados
+    
+    def _validar_fuente(self, fuente, ruta, ingesta):
+        """Validar la fuente lote a lote sobre el texto original; solo se cronometra validar()"""
+        motor = MotorValidacion(_VALIDACION[fuente])
+        if fuente == 'clientes':
+            lotes = ingesta.iterar_lotes_sql(ruta)
+        else:
+            # Todo como texto, igual que lo recibe MotorValidacion en la ingesta
+            nombres = COLUMNAS_EXTRA if fuente == 'extra' else None
+            lector = pa_csv.open_csv(
+                ruta,
+                read_options=pa_csv.ReadOptions(column_names=nombres, block_size=16 * 1024 * 1024),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={c: pa.string() for c in (nombres or ESQUEMA_BRONZE_INFO)},
+                    strings_can_be_null=True
+                )
+            )
+            lotes = iter(lector.read_next_batch, None)
+        segundos, filas, invalidos = 0.0, 0, {}
+        for lote in lotes:
+            inicio = time.perf_counter()
+            resultado = motor.validar(lote)
+            segundos += time.perf_counter() - inicio
+            filas += lote.num_rows
+            for campo, conteo in resultado.conteos.items():
+                invalidos[campo] = invalidos.get(campo, 0) + conteo
+        return {'filas': filas, 'segundos': segundos, 'invalidos': invalidos}
+    
+    def ejecutar_escala(self, filas):
+        """Medir todos los pasos sobre `filas` filas por fuente. Retorna el registro de la ejecución"""
+        logger.info(f"\n=== Benchmark: {filas:,} filas por fuente, motor {self.motor} ===")
+        pasos = []
+        rutas, inyectados = self._datos(filas, pasos)
+        trabajo = os.path.join(self.directorio, f"{filas}-{self.proporcion_sucios}-{self.semilla}", 'salida')
+        shutil.rmtree(trabajo, ignore_errors=True)
+        bronze_path, silver_path, gold_path = (os.path.join(trabajo, capa, 'ventas') for capa in ('bronze', 'silver', 'gold'))
+        
+        # Los spans de los pasos quedan con la salida de la escala, no en logs/metricas.jsonl
+        trazador = Trazador(jsonl_file=os.path.join(trabajo, 'metricas.jsonl'), prometheus_file=None)
+        # Bronze a disco: cada part file se escribe dentro de ingestar_fuente y su tiempo cuenta
+        # en bronze_<fuente> (en memoria la escritura iría a un hilo de fondo fuera de la medida)
+        ingesta = IngestaBronze(output_path=bronze_path, en_memoria=False, trazador=trazador)
+        for fuente, ruta in rutas.items():
+            ingesta.registrar_fuente(fuente, ingesta.fuentes[fuente][0], ruta)
+        
+        if filas <= LIMITE_PARSE_EN_MEMORIA:
+            self._medir(pasos, 'parse_sql_inserts', lambda: {'filas': len(ingesta.parse_sql_inserts(rutas['clientes']))},
+                        bytes_entrada=tamano_ruta(rutas['clientes']))
+        for fuente, ruta in rutas.items():
+            self._medir(pasos, f'validacion_{fuente}', lambda: self._validar_fuente(fuente, ruta, ingesta),
+                        bytes_entrada=tamano_ruta(ruta))
+        
+        resultados = {}
+        for fuente, ruta in rutas.items():
+            self._medir(pasos, f'bronze_{fuente}',
+                        lambda: {'filas': resultados.setdefault(fuente, ingesta.ingestar_fuente(fuente)).count_rows()},
+                        bytes_entrada=tamano_ruta(ruta))
+        self._medir(pasos, 'bronze_cierre', lambda: self._cerrar_bronze(ingesta, resultados))
+        
+        limpieza = LimpiezaSilver(input_path=bronze_path, output_path=silver_path, motor=self.motor,
+                                  trazador=trazador)
+        limpieza.iniciar(full_refresh=True, tamano_estimado=tamano_ruta(bronze_path))
+        self.spark = limpieza.spark
+        try:
+            for fuente, especificacion in TABLAS_SILVER.items():
+                entrada = os.path.join(bronze_path, f"{especificacion['tabla']}_bronze.parquet")
+                self._medir(pasos, f'silver_{fuente}', lambda: self._silver(limpieza, fuente),
+                            bytes_entrada=tamano_ruta(entrada))
+            gold = CapaGold(input_path=silver_path, output_path=gold_path,
+                            motor='spark' if limpieza.spark else 'arrow', spark=limpieza.spark)
+            self._medir(pasos, 'gold', lambda: {'filas': gold.ejecutar_gold()['registros']},
+                        bytes_entrada=tamano_ruta(silver_path))
+            cubos = CubosGold(input_path=silver_path, output_path=gold_path)
+            self._medir(pasos, 'cubos', lambda: cubos.actualizar(full_refresh=True) and None)
+        finally:
+            limpieza.detener()
+            self.spark = None
+        
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'version': _version_codigo(),
+            'entorno': _entorno(),
+            'configuracion': {
+                'filas': filas,
+                'proporcion_sucios': self.proporcion_sucios,
+                'semilla': self.semilla,
+                'motor': self.motor
+            },
+            'inyectados': inyectados,
+            'pasos': pasos,
+            # Máximo de toda la vida del proceso (incluye escalas anteriores de la misma ejecución)
+            'rss_pico_hijos_mb': round(_rss_pico_historico(resource.RUSAGE_CHILDREN) / 1024 / 1024, 1)
+        }
+    
+    def _cerrar_bronze(self, ingesta, resultados):
+        """finalizar_ingesta esperando la escritura en segundo plano, si la hay, para que cuente en el paso"""
+        ingesta.finalizar_ingesta(resultados)
+        if ingesta.persistencia is not None:
+            ingesta.persistencia.result()
+    
+    def _silver(self, limpieza, fuente):
+        stats = limpieza.limpiar_tabla(fuente, full_refresh=True)
+        return {'filas': stats['registros_entrada'], 'filas_salida': stats['registros_salida'],
+                'descartes': stats['descartes'], 'motor': stats['motor']}
+    
+    def ejecutar(self):
+        """Medir todas las escalas y añadir una línea por escala a resultados_file"""
+        os.makedirs(os.path.dirname(self.resultados_file) or '.', exist_ok=True)
+        registros = []
+        for filas in self.escalas:
+            registro = self.ejecutar_escala(filas)
+            with open(self.resultados_file, 'a') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            registros.append(registro)
+        logger.info(f"✓ Resultados en {self.resultados_file}")
+        return registros
+
+
+def cargar_resultados(resultados_file=RESULTADOS_DEFAULT):
+    """Registros de ejecución guardados (uno por línea)"""
+    if not os.path.exists(resultados_file):
+        return []
+    with open(resultados_file) as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def comparar(resultados_file=RESULTADOS_DEFAULT, base=None, actual=None, tolerancia=TOLERANCIA_REGRESION):
+    """
+    Comparar paso a paso dos ejecuciones con la misma configuración (filas, sucios, semilla,
+    motor). base/actual: versiones (git describe); por defecto las dos últimas ejecuciones de
+    la configuración de la última línea. Retorna [{paso, base, actual, variacion, regresion}]
+    """
+    registros = cargar_resultados(resultados_file)
+    if actual is not None:
+        candidatos = [r for r in registros if r['version'] == actual]
+    else:
+        candidatos = registros
+    if not candidatos:
+        raise ValueError(f"Sin ejecuciones para comparar en {resultados_file}")
+    ultimo = candidatos[-1]
+    
+    misma_configuracion = [
+        r for r in registros[:registros.index(ultimo)] if r['configuracion'] == ultimo['configuracion']
+    ]
+    if base is not None:
+        misma_configuracion = [r for r in misma_configuracion if r['version'] == base]
+    if not misma_configuracion:
+        raise ValueError("Sin ejecución base con la misma configuración")
+    anterior = misma_configuracion[-1]
+    
+    tiempos_base = {p['paso']: p['segundos'] for p in anterior['pasos']}
+    comparacion = []
+    for paso in ultimo['pasos']:
+        if paso['paso'] not in tiempos_base or not tiempos_base[paso['paso']]:
+            continue
+        variacion = paso['segundos'] / tiempos_base[paso['paso']] - 1
+        comparacion.append({
+            'paso': paso['paso'],
+            'base': tiempos_base[paso['paso']],
+            'actual': paso['segundos'],
+            'variacion': round(variacion, 4),
+            'regresion': variacion > tolerancia
+        })
+    
+    logger.info(f"=== {anterior['version']} -> {ultimo['version']} "
+                 f"({ultimo['configuracion']['filas']:,} filas, motor {ultimo['configuracion']['motor']}) ===")
+    for fila in comparacion:
+        marca = '⚠️ ' if fila['regresion'] else '✓'
+        logger.info(f"  {marca} {fila['paso']}: {fila['base']:.2f}s -> {fila['actual']:.2f}s ({fila['variacion']:+.1%})")
+    return comparacion
+
+
+if __name__ == "__main__":
+    os.makedirs('logs', exist_ok=True)
+    
+    # --filas=10000,100000: escalas (filas por fuente)
+    # --sucios=0.05 --semilla=42 --motor=auto|spark|arrow --salida=benchmarks/resultados.jsonl
+    # --comparar[=base,actual]: comparar ejecuciones ya guardadas en lugar de medir
+    argumentos = dict(
+        (arg[2:].split('=', 1) + [''])[:2] for arg in sys.argv[1:] if arg.startswith('--')
+    )
+    salida = argumentos.get('salida', RESULTADOS_DEFAULT)
+    if 'comparar' in argumentos:
+        versiones = (argumentos['comparar'].split(',') + [None, None])[:2] if argumentos['comparar'] else [None, None]
+        regresiones = [c for c in comparar(salida, *versiones) if c['regresion']]
+        sys.exit(1 if regresiones else 0)
+    
+    BenchmarkPipeline(
+        escalas=[int(f) for f in argumentos['filas'].split(',')] if argumentos.get('filas') else None,
+        proporcion_sucios=float(argumentos.get('sucios', 0.05)),
+        semilla=int(argumentos.get('semilla', 42)),
+        motor=argumentos.get('motor', 'auto'),
+        resultados_file=salida
+    ).ejecutar()
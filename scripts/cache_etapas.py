@@ -0,0 +1,249 @@
+"""
+Cache de Etapas - Proyecto LIDL
+Cache direccionada por contenido: cada salida (dataset Bronze o Silver de una tabla) se
+guarda bajo la huella de sus entradas + configuración + versión del código, para saltar
+o restaurar el trabajo cuando nada de eso cambió
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+
+from observabilidad import obtener_logger
+
+logger = obtener_logger('cache_etapas')
+
+DIRECTORIO_CACHE = '.cache/etapas'
+TAMANO_MAXIMO_CACHE = 2 * 1024 * 1024 * 1024  # bytes en disco antes de desalojar (LRU)
+VERSIONES_POR_SALIDA = 3  # versiones antiguas que se conservan por cada salida
+
+TAMANO_BLOQUE_HASH = 8 * 1024 * 1024
+_DIRECTORIO_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+
+def _enlazar_arbol(origen, destino):
+    """Copiar un directorio con hard links (los part files no se modifican nunca in situ)"""
+    def enlazar(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    shutil.copytree(origen, destino, copy_function=enlazar)
+
+
+def _firma_arbol(ruta):
+    """Firma barata de un directorio (nombres, tamaños y mtime) para detectar cambios externos"""
+    h = hashlib.sha256()
+    for raiz, _, archivos in sorted(os.walk(ruta)):
+        for archivo in sorted(archivos):
+            completo = os.path.join(raiz, archivo)
+            info = os.stat(completo)
+            h.update(f"{os.path.relpath(completo, ruta)}:{info.st_size}:{info.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+def _tamano_arbol(ruta):
+    return sum(
+        os.path.getsize(os.path.join(raiz, archivo))
+        for raiz, _, archivos in os.walk(ruta) for archivo in archivos
+    )
+
+
+class CacheEtapas:
+    """
+    Índice (indice.json) con:
+    - entradas: {etapa/clave: {salida, bytes, creado, ultimo_acceso, metadatos}}
+    - actual:   {salida: {clave, firma}} versión que hay ahora en la ruta de salida (la firma
+                detecta si otra ejecución sin cache la modificó; None = aún persistiéndose)
+    - huellas:  {archivo: {tamano, mtime_ns, sha256}} para no rehashear archivos sin cambios
+    Las copias se hacen con hard links, así que una versión cacheada que sigue siendo la
+    salida actual no ocupa espacio adicional. Es segura entre hilos del mismo proceso.
+    """
+    
+    def __init__(self, directorio=DIRECTORIO_CACHE, tamano_maximo=TAMANO_MAXIMO_CACHE,
+                 versiones_por_salida=VERSIONES_POR_SALIDA):
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo
+        self.versiones_por_salida = versiones_por_salida
+        self.indice_file = os.path.join(directorio, 'indice.json')
+        self._lock = threading.Lock()
+        self.indice = self._cargar_indice()
+    
+    def __getstate__(self):
+        # Las instancias que la referencian se envían a procesos worker: el Lock no se serializa
+        estado = dict(self.__dict__)
+        del estado['_lock']
+        return estado
+    
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+    
+    def _cargar_indice(self):
+        if not os.path.exists(self.indice_file):
+            return {'entradas': {}, 'actual': {}, 'huellas': {}}
+        with open(self.indice_file) as f:
+            return json.load(f)
+    
+    def _guardar_indice(self):
+        """Persistir el índice (llamar con el lock tomado); escritura atómica por rename"""
+        os.makedirs(self.directorio, exist_ok=True)
+        self.indice['huellas'] = {
+            ruta: memo for ruta, memo in self.indice['huellas'].items() if os.path.exists(ruta)
+        }
+        temporal = f"{self.indice_file}.tmp"
+        with open(temporal, 'w') as f:
+            json.dump(self.indice, f, indent=2)
+        os.replace(temporal, self.indice_file)
+    
+    def huella_archivo(self, ruta):
+        """sha256 del contenido, memorizado mientras el tamaño y el mtime no cambien"""
+        info = os.stat(ruta)
+        memo = self.indice['huellas'].get(ruta)
+        if memo and memo['tamano'] == info.st_size and memo['mtime_ns'] == info.st_mtime_ns:
+            return memo['sha256']
+        
+        h = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+                h.update(bloque)
+        with self._lock:
+            self.indice['huellas'][ruta] = {
+                'tamano': info.st_size, 'mtime_ns': info.st_mtime_ns, 'sha256': h.hexdigest()
+            }
+        return h.hexdigest()
+    
+    def huella_directorio(self, ruta):
+        """Huella de un dataset: la versión cacheada actual si se conoce, si no el hash de sus archivos"""
+        actual = self.version_actual(ruta)
+        if actual:
+            return actual
+        h = hashlib.sha256()
+        for raiz, _, archivos in sorted(os.walk(ruta)):
+            for archivo in sorted(archivos):
+                completo = os.path.join(raiz, archivo)
+                h.update(os.path.relpath(completo, ruta).encode())
+                h.update(self.huella_archivo(completo).encode())
+        return h.hexdigest()
+    
+    def version_codigo(self, *modulos):
+        """Huella del código fuente de los módulos indicados (nombres de archivo en scripts/)"""
+        return self.clave(*[self.huella_archivo(os.path.join(_DIRECTORIO_SCRIPTS, m)) for m in modulos])
+    
+    @staticmethod
+    def clave(*partes):
+        """Clave determinista a partir de valores serializables a JSON"""
+        return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()
+    
+    def _entrada(self, etapa, clave):
+        return f"{etapa}/{clave}"
+    
+    def version_actual(self, salida):
+        """Clave de la versión presente en `salida`, o None si no se conoce o fue modificada"""
+        actual = self.indice['actual'].get(salida)
+        if not actual or not os.path.isdir(salida):
+            return None
+        if actual['firma'] is not None and actual['firma'] != _firma_arbol(salida):
+            return None
+        return actual['clave']
+    
+    def buscar(self, etapa, clave):
+        """
+        Si la versión (etapa, clave) está cacheada, dejarla en su ruta de salida (sin tocar
+        nada si ya es la actual) y retornar sus metadatos. Retorna None si no está
+        """
+        entrada_id = self._entrada(etapa, clave)
+        with self._lock:
+            entrada = self.indice['entradas'].get(entrada_id)
+            ruta_entrada = os.path.join(self.directorio, entrada_id)
+            if entrada is None or not os.path.isdir(ruta_entrada):
+                return None
+            salida = entrada['salida']
+            
+            if self.version_actual(salida) != clave:
+                if os.path.isdir(salida):
+                    shutil.rmtree(salida)
+                _enlazar_arbol(ruta_entrada, salida)
+                self.indice['actual'][salida] = {'clave': clave, 'firma': _firma_arbol(salida)}
+                logger.info(f"  ♻️  {salida}: restaurado desde cache ({clave[:12]})")
+            else:
+                logger.info(f"  ♻️  {salida}: sin cambios en entradas ni reglas ({clave[:12]})")
+            
+            entrada['ultimo_acceso'] = datetime.now().isoformat()
+            self._guardar_indice()
+            return entrada['metadatos']
+    
+    def marcar_actual(self, salida, clave):
+        """Registrar qué versión hay en `salida` antes de guardarla (p.ej. mientras se persiste)"""
+        with self._lock:
+            self.indice['actual'][salida] = {'clave': clave, 'firma': None}
+    
+    def guardar(self, etapa, clave, salida, metadatos=None):
+        """Guardar la salida recién producida como versión (etapa, clave) y desalojar si hace falta"""
+        entrada_id = self._entrada(etapa, clave)
+        ruta_entrada = os.path.join(self.directorio, entrada_id)
+        with self._lock:
+            if os.path.isdir(ruta_entrada):
+                shutil.rmtree(ruta_entrada)
+            os.makedirs(os.path.dirname(ruta_entrada), exist_ok=True)
+            _enlazar_arbol(salida, ruta_entrada)
+            
+            ahora = datetime.now().isoformat()
+            self.indice['entradas'][entrada_id] = {
+                'salida': salida,
+                'bytes': _tamano_arbol(ruta_entrada),
+                'creado': ahora,
+                'ultimo_acceso': ahora,
+                'metadatos': metadatos or {}
+            }
+            self.indice['actual'][salida] = {'clave': clave, 'firma': _firma_arbol(salida)}
+            self._desalojar()
+            self._guardar_indice()
+    
+    def reemplazar_actual(self, salida, clave):
+        """
+        La salida, que estaba en la versión `clave` (ver version_actual), se reescribió con el
+        mismo contenido lógico (p.ej. compactación): guardar los archivos nuevos bajo esa
+        versión para que un acierto no restaure los antiguos
+        """
+        with self._lock:
+            actual = self.indice['actual'].get(salida)
+            if not actual or actual['clave'] != clave:
+                return
+            for entrada_id, entrada in self.indice['entradas'].items():
+                if entrada['salida'] != salida or not entrada_id.endswith(f"/{actual['clave']}"):
+                    continue
+                ruta_entrada = os.path.join(self.directorio, entrada_id)
+                shutil.rmtree(ruta_entrada, ignore_errors=True)
+                _enlazar_arbol(salida, ruta_entrada)
+                entrada['bytes'] = _tamano_arbol(ruta_entrada)
+            actual['firma'] = _firma_arbol(salida)
+            self._guardar_indice()
+    
+    def _eliminar(self, entrada_id):
+        shutil.rmtree(os.path.join(self.directorio, entrada_id), ignore_errors=True)
+        del self.indice['entradas'][entrada_id]
+    
+    def _desalojar(self):
+        """LRU: limitar versiones por salida y el tamaño total (llamar con el lock tomado)"""
+        por_acceso = sorted(self.indice['entradas'].items(), key=lambda e: e[1]['ultimo_acceso'])
+        
+        versiones = {}
+        for entrada_id, entrada in reversed(por_acceso):
+            versiones.setdefault(entrada['salida'], []).append(entrada_id)
+        for salida, entradas in versiones.items():
+            for entrada_id in entradas[self.versiones_por_salida:]:
+                logger.info(f"  Cache: desalojada versión antigua de {salida}")
+                self._eliminar(entrada_id)
+        
+        total = sum(e['bytes'] for e in self.indice['entradas'].values())
+        for entrada_id, entrada in por_acceso:
+            if total <= self.tamano_maximo:
+                break
+            if entrada_id in self.indice['entradas']:
+                total -= entrada['bytes']
+                logger.info(f"  Cache: desalojada {entrada_id} ({entrada['bytes'] / 1024 / 1024:.1f} MB)")
+                self._eliminar(entrada_id)
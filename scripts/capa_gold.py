@@ -0,0 +1,223 @@
+"""
+Script de Capa Gold - Proyecto LIDL
+Tabla de clientes desnormalizada (clientes + info + extra) lista para consultas
+"""
+
+import os
+import json
+import shutil
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyspark.sql import Observation
+from pyspark.sql.functions import col, broadcast, current_timestamp, count, lit
+
+from limpieza_silver import UMBRAL_MOTOR_ARROW
+from reglas_silver import COLUMNA_PARTICION
+from layout_parquet import columnas_derivadas, reemplazar_particiones
+from sesion_spark import crear_sesion
+from observabilidad import obtener_logger
+
+logger = obtener_logger('capa_gold')
+
+# Una tabla Silver de hasta este tamaño se difunde a todos los executors (broadcast join);
+# por encima se usa sort-merge join para no saturar la memoria del driver
+UMBRAL_BROADCAST = 64 * 1024 * 1024
+
+# Tabla base y tablas que se le unen: {fuente: (tabla Silver, clave, clave en la base)}
+TABLA_BASE = ('clientes', 'codigo')
+UNIONES_GOLD = {
+    'info': ('clientes_info', 'codigo_cliente', 'codigo'),
+    'extra': ('clientes_extra', 'codigo', 'codigo')
+}
+
+# Layout físico: los filtros por comuna / tipo de servicio leen solo sus directorios
+# y dentro de cada archivo las filas van ordenadas por codigo (estadísticas min/max útiles)
+PARTICIONES_GOLD = ['comuna', 'tipo_servicio']
+ORDEN_GOLD = 'codigo'
+
+# Columnas técnicas de Silver que no pasan a Gold (incluidas las particiones derivadas del layout)
+_COLUMNAS_TECNICAS = ['processed_at', COLUMNA_PARTICION] + columnas_derivadas()
+
+
+def _tamano_directorio(ruta):
+    return sum(
+        os.path.getsize(os.path.join(raiz, archivo))
+        for raiz, _, archivos in os.walk(ruta) for archivo in archivos
+    )
+
+
+class CapaGold:
+    def __init__(self, input_path='silver/ventas', output_path='gold/ventas', motor='auto', spark=None,
+                 cache=None, sesion=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.motor = motor
+        # spark: sesión ya iniciada (p.ej. la de LimpiezaSilver); si no, se crea una si hace falta
+        self.spark = spark
+        # sesion: SparkSession de larga duración (modo servicio) a usar si el motor elegido es
+        # Spark; a diferencia de spark no fuerza el motor y tampoco se cierra
+        self.sesion = sesion
+        self._spark_propia = False
+        self.cache = cache
+        self.output_file = os.path.join(self.output_path, 'clientes_gold.parquet')
+    
+    def _ruta_silver(self, tabla):
+        return f"{self.input_path}/{tabla}_silver.parquet"
+    
+    def _tamanos(self):
+        """Bytes en disco de cada tabla Silver de entrada"""
+        tablas = [TABLA_BASE[0]] + [tabla for tabla, _, _ in UNIONES_GOLD.values()]
+        return {tabla: _tamano_directorio(self._ruta_silver(tabla)) for tabla in tablas}
+    
+    def _elegir_motor(self, tamanos):
+        if self.motor != 'auto':
+            return self.motor
+        if self.spark is not None:
+            return 'spark'
+        return 'arrow' if sum(tamanos.values()) < UMBRAL_MOTOR_ARROW else 'spark'
+    
+    def _clave_cache(self):
+        """Clave de cache: versión de las tres tablas Silver + layout + versión del código"""
+        return self.cache.clave(
+            'gold', self.output_file, UNIONES_GOLD, PARTICIONES_GOLD, ORDEN_GOLD,
+            *[self.cache.huella_directorio(self._ruta_silver(tabla)) for tabla in self._tamanos()],
+            self.cache.version_codigo('capa_gold.py', 'layout_parquet.py')
+        )
+    
+    def _construir_spark(self, tamanos):
+        """
+        Left join de clientes con info y extra. Cada unión elige broadcast o sort-merge según
+        el tamaño de la tabla que se une; se escribe una carpeta por (comuna, tipo_servicio)
+        con un archivo ordenado por codigo
+        """
+        if self.spark is None and self.sesion is not None:
+            self.spark = self.sesion
+        elif self.spark is None:
+            self.spark = crear_sesion("LIDL - Capa Gold")
+            self._spark_propia = True
+            logger.info("✓ Sesión Spark iniciada")
+        
+        tabla_base, _ = TABLA_BASE
+        df = self.spark.read.parquet(self._ruta_silver(tabla_base)).drop(*_COLUMNAS_TECNICAS)
+        estrategias = {}
+        for fuente, (tabla, clave, clave_base) in UNIONES_GOLD.items():
+            otra = self.spark.read.parquet(self._ruta_silver(tabla)).drop(*_COLUMNAS_TECNICAS)
+            if clave != clave_base:
+                otra = otra.withColumnRenamed(clave, clave_base)
+            if tamanos[tabla] <= UMBRAL_BROADCAST:
+                otra, estrategias[fuente] = broadcast(otra), 'broadcast'
+            else:
+                otra, estrategias[fuente] = otra.hint('merge'), 'sort-merge'
+            df = df.join(otra, on=clave_base, how='left')
+        
+        # Conteo observado dentro del propio job de escritura
+        observacion = Observation()
+        df = df.withColumn('processed_at', current_timestamp()) \
+            .observe(observacion, count(lit(1)).alias('registros'))
+        temporal = self._temporal()
+        try:
+            df.repartition(*[col(c) for c in PARTICIONES_GOLD]) \
+                .sortWithinPartitions(ORDEN_GOLD) \
+                .write.mode('overwrite') \
+                .partitionBy(*PARTICIONES_GOLD) \
+                .parquet(temporal)
+            reemplazar_particiones(self.output_file, temporal)
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+        
+        return observacion.get['registros'], estrategias
+    
+    def unir_arrow(self, rangos=None):
+        """
+        Left join de las tablas Silver con Arrow en proceso (hash join en memoria: el
+        equivalente a broadcast). rangos: leer solo esas particiones rango_codigo
+        """
+        filtro = ds.field(COLUMNA_PARTICION).isin(rangos) if rangos is not None else None
+    
+        def leer(tabla):
+            datos = ds.dataset(self._ruta_silver(tabla), format='parquet', partitioning='hive') \
+                .to_table(filter=filtro)
+            return datos.drop([c for c in _COLUMNAS_TECNICAS if c in datos.column_names])
+        
+        tabla_base, _ = TABLA_BASE
+        gold = leer(tabla_base)
+        estrategias = {}
+        for fuente, (tabla, clave, clave_base) in UNIONES_GOLD.items():
+            gold = gold.join(leer(tabla), keys=clave_base, right_keys=clave, join_type='left outer')
+            estrategias[fuente] = 'hash (en memoria)'
+        return gold, estrategias
+    
+    def _construir_arrow(self):
+        """Mismo resultado que _construir_spark con Arrow en proceso"""
+        gold, estrategias = self.unir_arrow()
+        gold = gold.sort_by(ORDEN_GOLD).append_column(
+            'processed_at', pa.array([datetime.now(timezone.utc)] * gold.num_rows, pa.timestamp('us', tz='UTC'))
+        )
+        # Sin hilos para que cada archivo conserve el orden por codigo
+        temporal = self._temporal()
+        try:
+            ds.write_dataset(
+                gold, temporal, format='parquet', use_threads=False,
+                partitioning=ds.partitioning(gold.select(PARTICIONES_GOLD).schema, flavor='hive')
+            )
+            reemplazar_particiones(self.output_file, temporal)
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+        return gold.num_rows, estrategias
+    
+    def _temporal(self):
+        """
+        Directorio oculto dentro de la tabla donde se escribe la Gold nueva: la anterior se
+        reemplaza solo cuando la escritura terminó (reemplazar_particiones)
+        """
+        return os.path.join(self.output_file, f".escribiendo-{datetime.now():%Y%m%d%H%M%S%f}")
+    
+    def ejecutar_gold(self):
+        """Construir la tabla Gold de clientes y guardar gold_stats.json"""
+        os.makedirs(self.output_path, exist_ok=True)
+        logger.info("=== Iniciando Capa Gold ===")
+        
+        clave = self._clave_cache() if self.cache else None
+        metadatos = self.cache.buscar('gold', clave) if clave else None
+        if metadatos is not None:
+            stats = dict(metadatos['stats'], modo='cache')
+        else:
+            tamanos = self._tamanos()
+            motor = self._elegir_motor(tamanos)
+            try:
+                if motor == 'spark':
+                    registros, estrategias = self._construir_spark(tamanos)
+                else:
+                    registros, estrategias = self._construir_arrow()
+            finally:
+                if self._spark_propia:
+                    self.spark.stop()
+                    self.spark = None
+                    logger.info("✓ Sesión Spark cerrada")
+            
+            stats = {
+                'timestamp': datetime.now().isoformat(),
+                'registros': registros,
+                'uniones': estrategias,
+                'particiones': PARTICIONES_GOLD,
+                'orden': ORDEN_GOLD,
+                'motor': motor,
+                'modo': 'completo',
+                'salida': self.output_file
+            }
+            if clave:
+                self.cache.guardar('gold', clave, self.output_file, {'stats': stats})
+        
+        with open(os.path.join(self.output_path, 'gold_stats.json'), 'w') as f:
+            json.dump(stats, f, indent=2)
+        
+        logger.info(f"✓ clientes_gold: {stats['registros']} registros, uniones {stats['uniones']}")
+        return stats
+
+
+if __name__ == "__main__":
+    import sys
+    gold = CapaGold(motor=sys.argv[1] if len(sys.argv) > 1 else 'auto')
+    stats = gold.ejecutar_gold()
@@ -0,0 +1,100 @@
+"""
+Compactación Silver - Proyecto LIDL
+Une los archivos pequeños de cada partición Silver (escrituras incrementales, tareas
+Spark) en archivos del tamaño objetivo del layout, ordenados y con sus estadísticas
+"""
+
+import os
+import math
+import shutil
+from datetime import datetime
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from layout_parquet import layout_de_ruta, ordenar, opciones_dataset
+from reglas_silver import TABLAS_SILVER
+from observabilidad import obtener_logger
+
+logger = obtener_logger('compactacion')
+
+
+class CompactacionSilver:
+    """
+    Una partición (directorio hoja) se compacta si tiene más archivos de los que
+    necesitan sus filas según filas_por_archivo. Los archivos nuevos se escriben en un
+    directorio oculto de la partición (ignorado por Spark y Arrow) y se mueven a su sitio
+    antes de borrar los antiguos
+    """
+    
+    def __init__(self, output_path='silver/ventas', cache=None):
+        self.output_path = output_path
+        # cache: CacheEtapas opcional; la versión cacheada pasa a ser la compactada
+        self.cache = cache
+    
+    def _particiones(self, output_file):
+        """Directorios hoja con sus part files: {directorio: [archivos .parquet]}"""
+        particiones = {}
+        for raiz, directorios, archivos in os.walk(output_file):
+            directorios[:] = [d for d in directorios if not d.startswith(('.', '_'))]
+            partes = sorted(a for a in archivos if a.endswith('.parquet'))
+            if partes:
+                particiones[raiz] = [os.path.join(raiz, a) for a in partes]
+        return particiones
+    
+    def _compactar_particion(self, directorio, archivos, layout):
+        """Reescribir una partición como archivos del tamaño objetivo. Retorna cuántos quedaron"""
+        tabla = ordenar(ds.dataset(archivos, format='parquet').to_table(), layout)
+        temporal = os.path.join(directorio, f".compactando-{datetime.now():%Y%m%d%H%M%S}")
+        ds.write_dataset(
+            tabla, temporal, use_threads=False,
+            basename_template=f"part-{datetime.now():%Y%m%d%H%M%S}-c{{i}}.parquet",
+            **opciones_dataset(layout, tabla.schema)
+        )
+        nuevos = sorted(os.listdir(temporal))
+        for archivo in nuevos:
+            os.replace(os.path.join(temporal, archivo), os.path.join(directorio, archivo))
+        shutil.rmtree(temporal)
+        for archivo in archivos:
+            os.remove(archivo)
+        return len(nuevos)
+    
+    def compactar_tabla(self, tabla):
+        """Compactar una tabla Silver (nombre base). Retorna stats de la tabla"""
+        output_file = f"{self.output_path}/{tabla}_silver.parquet"
+        layout = layout_de_ruta('silver', output_file)
+        stats = {'particiones': 0, 'compactadas': 0, 'archivos_antes': 0, 'archivos_despues': 0}
+        if not os.path.isdir(output_file):
+            return stats
+        
+        # Versión cacheada vigente antes de tocar archivos (None si se desconoce o fue modificada)
+        version = self.cache.version_actual(output_file) if self.cache else None
+        for directorio, archivos in self._particiones(output_file).items():
+            filas = sum(pq.ParquetFile(a).metadata.num_rows for a in archivos)
+            objetivo = max(1, math.ceil(filas / layout['filas_por_archivo']))
+            stats['particiones'] += 1
+            stats['archivos_antes'] += len(archivos)
+            if len(archivos) <= objetivo:
+                stats['archivos_despues'] += len(archivos)
+                continue
+            stats['archivos_despues'] += self._compactar_particion(directorio, archivos, layout)
+            stats['compactadas'] += 1
+        
+        if stats['compactadas']:
+            if version:
+                self.cache.reemplazar_actual(output_file, version)
+            logger.info(f"  {tabla}_silver: {stats['compactadas']} particiones compactadas, "
+                         f"{stats['archivos_antes']} -> {stats['archivos_despues']} archivos")
+        return stats
+    
+    def compactar(self, tablas=None):
+        """Compactar las tablas indicadas (por defecto todas las de TABLAS_SILVER)"""
+        logger.info("=== Compactación Silver ===")
+        tablas = tablas or [especificacion['tabla'] for especificacion in TABLAS_SILVER.values()]
+        stats = {tabla: self.compactar_tabla(tabla) for tabla in tablas}
+        logger.info("✓ Compactación completada")
+        return stats
+
+
+if __name__ == "__main__":
+    CompactacionSilver().compactar()
@@ -0,0 +1,287 @@
+"""
+Cubos de Agregados Gold - Proyecto LIDL
+Agregados precalculados (conteos, sumas, min/max y distintos aproximados) por las
+segmentaciones de clientes más consultadas, mantenidos de forma incremental
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from capa_gold import CapaGold, TABLA_BASE, UNIONES_GOLD
+from reglas_silver import COLUMNA_PARTICION, TAMANO_RANGO_CODIGO
+from observabilidad import obtener_logger
+
+logger = obtener_logger('cubos_gold')
+
+# Medidas numéricas y columnas sobre las que se cuentan distintos aproximados
+MEDIDAS_CUBO = ['promedio_compras', 'tiempo_permanencia_min']
+DISTINTOS_CUBO = ['rut']
+
+# Cuboides materializados: {nombre: dimensiones}. Una consulta se responde desde el
+# cuboide más pequeño que contiene sus dimensiones, sumando las celdas sobrantes
+CUBOIDES = {
+    'total': [],
+    'tipo_cliente': ['tipo_cliente'],
+    'tarjeta_beneficios': ['tarjeta_beneficios'],
+    'tipo_alimentacion': ['tipo_alimentacion'],
+    'tipo_servicio': ['tipo_servicio'],
+    'comuna': ['comuna'],
+    'segmento': ['tipo_cliente', 'tarjeta_beneficios', 'tipo_alimentacion'],
+    'comuna_servicio': ['comuna', 'tipo_servicio']
+}
+
+# HyperLogLog: 2^PRECISION_HLL registros de 1 byte por celda (error típico ~1.04 / sqrt(2^p))
+PRECISION_HLL = 10
+
+# Rangos de codigo que se recalculan por lectura (acota la memoria en cargas completas)
+RANGOS_POR_LOTE = 16
+
+
+def _hll_registros(valores, grupos, num_grupos, precision=PRECISION_HLL):
+    """Registros HLL (num_grupos x 2^p, uint8) de los valores no nulos de cada grupo"""
+    registros = np.zeros((num_grupos, 1 << precision), dtype=np.uint8)
+    validos = ~pd.isna(valores)
+    if not validos.any():
+        return registros
+    hashes = pd.util.hash_array(np.asarray(valores[validos], dtype=object)).astype(np.uint64)
+    
+    bits_resto = 64 - precision
+    indices = (hashes >> np.uint64(bits_resto)).astype(np.int64)
+    resto = hashes & np.uint64((1 << bits_resto) - 1)
+    # Posición del primer 1 en los bits restantes (rho); resto 0 -> bits_resto + 1
+    rho = np.full(len(resto), bits_resto + 1, dtype=np.uint8)
+    no_cero = resto > 0
+    log2 = np.floor(np.log2(resto[no_cero].astype(np.float64))).astype(np.int64)
+    rho[no_cero] = np.clip(bits_resto - log2, 1, bits_resto)
+    
+    np.maximum.at(registros, (grupos[validos], indices), rho)
+    return registros
+
+
+def _hll_estimar(registros):
+    """Estimación de cardinalidad de un vector de registros HLL (con corrección para rangos pequeños)"""
+    m = len(registros)
+    alfa = 0.7213 / (1 + 1.079 / m)
+    estimacion = alfa * m * m / np.sum(np.power(2.0, -registros.astype(np.float64)))
+    vacios = int(np.count_nonzero(registros == 0))
+    if estimacion <= 2.5 * m and vacios:
+        estimacion = m * np.log(m / vacios)
+    return int(round(estimacion))
+
+
+def _hll_unir(serie):
+    """Máximo elemento a elemento de los registros serializados de varias celdas"""
+    return np.maximum.reduce([np.frombuffer(b, dtype=np.uint8) for b in serie]).tobytes()
+
+
+class CubosGold:
+    """
+    Un Parquet por cuboide en gold/ventas/cubos/ con una celda por (rango_codigo, dimensiones).
+    Todas las medidas son combinables (sumas, mínimos, máximos y registros HLL), así que:
+    - en cada ejecución solo se recalculan los rangos de codigo cuyas particiones Silver
+      cambiaron (en una carga incremental, típicamente los últimos) y se reemplazan sus celdas;
+    - las consultas agregan las celdas de todos los rangos sin volver a leer Silver.
+    """
+    
+    def __init__(self, input_path='silver/ventas', output_path='gold/ventas', cuboides=None):
+        self.input_path = input_path
+        self.cuboides = cuboides or CUBOIDES
+        self.output_dir = os.path.join(output_path, 'cubos')
+        self.estado_file = os.path.join(self.output_dir, 'cubos_estado.json')
+        self.gold = CapaGold(input_path=input_path, output_path=output_path)
+    
+    def _ruta_cuboide(self, nombre):
+        return os.path.join(self.output_dir, f"{nombre}.parquet")
+    
+    def _configuracion(self):
+        """Lo que invalida todas las celdas si cambia"""
+        return hashlib.sha256(json.dumps(
+            [self.cuboides, MEDIDAS_CUBO, DISTINTOS_CUBO, PRECISION_HLL, TAMANO_RANGO_CODIGO, UNIONES_GOLD],
+            sort_keys=True
+        ).encode()).hexdigest()
+    
+    def _firmas_rangos(self):
+        """{rango: firma} a partir de nombres, tamaños y mtime de las particiones Silver de las tres tablas"""
+        tablas = [TABLA_BASE[0]] + [tabla for tabla, _, _ in UNIONES_GOLD.values()]
+        firmas = {}
+        for tabla in tablas:
+            ruta = self.gold._ruta_silver(tabla)
+            if not os.path.isdir(ruta):
+                continue
+            for particion in sorted(os.listdir(ruta)):
+                # Las claves nulas (__HIVE_DEFAULT_PARTITION__) no se unen a ningún cliente en Gold
+                valor = particion.split('=', 1)[1] if particion.startswith(f"{COLUMNA_PARTICION}=") else ''
+                if not valor.lstrip('-').isdigit():
+                    continue
+                rango = int(valor)
+                h = firmas.setdefault(rango, hashlib.sha256())
+                directorio = os.path.join(ruta, particion)
+                for raiz, _, archivos in sorted(os.walk(directorio)):
+                    for archivo in sorted(archivos):
+                        completo = os.path.join(raiz, archivo)
+                        info = os.stat(completo)
+                        relativo = os.path.relpath(completo, directorio)
+                        h.update(f"{tabla}/{relativo}:{info.st_size}:{info.st_mtime_ns};".encode())
+        return {rango: h.hexdigest() for rango, h in firmas.items()}
+    
+    def _cargar_estado(self):
+        if not os.path.exists(self.estado_file):
+            return {'configuracion': None, 'rangos': {}}
+        with open(self.estado_file) as f:
+            return json.load(f)
+    
+    def _agregar(self, tabla, dimensiones):
+        """Celdas de un cuboide para las filas dadas: una por (rango_codigo, dimensiones)"""
+        claves = [COLUMNA_PARTICION] + dimensiones
+        agregaciones = [('codigo', 'count', pc.CountOptions(mode='all'))]
+        for medida in MEDIDAS_CUBO:
+            agregaciones += [(medida, 'count'), (medida, 'sum'), (medida, 'min'), (medida, 'max')]
+        # Identificador de celda por fila (los nulos de las dimensiones forman su propia celda)
+        grupos = tabla.select(claves).to_pandas().groupby(claves, dropna=False, sort=False).ngroup().to_numpy()
+        celdas = tabla.append_column('_celda', pa.array(grupos)) \
+            .group_by(claves + ['_celda']).aggregate(agregaciones)
+        celdas = celdas.rename_columns([
+            {'codigo_count': 'registros'}.get(c, c) for c in celdas.column_names
+        ])
+        
+        # Distintos aproximados: registros HLL por celda, en el mismo orden que las celdas
+        orden = celdas.column('_celda').to_numpy()
+        for columna in DISTINTOS_CUBO:
+            registros = _hll_registros(tabla.column(columna).to_numpy(zero_copy_only=False), grupos,
+                                       int(grupos.max()) + 1 if len(grupos) else 0)
+            celdas = celdas.append_column(
+                f"hll_{columna}", pa.array([fila.tobytes() for fila in registros[orden]], pa.binary())
+            )
+        return celdas.drop(['_celda'])
+    
+    def _recalcular(self, rangos):
+        """Celdas nuevas de cada cuboide para los rangos indicados, leyendo Silver por lotes de rangos"""
+        nuevas = {nombre: [] for nombre in self.cuboides}
+        for i in range(0, len(rangos), RANGOS_POR_LOTE):
+            lote = rangos[i:i + RANGOS_POR_LOTE]
+            tabla, _ = self.gold.unir_arrow(rangos=lote)
+            rango = pc.cast(pc.floor(pc.divide(pc.cast(tabla.column('codigo'), pa.float64()),
+                                               TAMANO_RANGO_CODIGO)), pa.int32())
+            tabla = tabla.append_column(COLUMNA_PARTICION, rango)
+            for nombre, dimensiones in self.cuboides.items():
+                nuevas[nombre].append(self._agregar(tabla, dimensiones))
+        return {nombre: pa.concat_tables(partes) for nombre, partes in nuevas.items() if partes}
+    
+    def actualizar(self, full_refresh=False):
+        """
+        Actualizar los cuboides: recalcular los rangos nuevos o modificados en Silver, quitar
+        los que desaparecieron y conservar el resto de las celdas. Guarda cubos_estado.json
+        """
+        logger.info("=== Actualizando cubos de agregados ===")
+        os.makedirs(self.output_dir, exist_ok=True)
+        estado = self._cargar_estado()
+        configuracion = self._configuracion()
+        completo = full_refresh or estado['configuracion'] != configuracion \
+            or not all(os.path.exists(self._ruta_cuboide(n)) for n in self.cuboides)
+        
+        anteriores = {} if completo else {int(r): f for r, f in estado['rangos'].items()}
+        firmas = self._firmas_rangos()
+        cambiados = sorted(r for r, f in firmas.items() if anteriores.get(r) != f)
+        eliminados = sorted(set(anteriores) - set(firmas))
+        
+        if not cambiados and not eliminados:
+            logger.info("  Cubos al día: ningún rango de codigo cambió en Silver")
+            modo = 'sin cambios'
+        else:
+            nuevas = self._recalcular(cambiados) if cambiados else {}
+            reemplazar = pa.array(cambiados + eliminados, pa.int32())
+            for nombre in self.cuboides:
+                partes = []
+                if not completo:
+                    actuales = pq.read_table(self._ruta_cuboide(nombre))
+                    partes.append(actuales.filter(
+                        pc.invert(pc.is_in(actuales.column(COLUMNA_PARTICION), value_set=reemplazar))
+                    ))
+                if nombre in nuevas:
+                    partes.append(nuevas[nombre])
+                cuboide = pa.concat_tables(partes) if partes else pa.table({})
+                # Escritura atómica: una consulta concurrente ve el cuboide anterior o el nuevo
+                temporal = f"{self._ruta_cuboide(nombre)}.tmp"
+                pq.write_table(cuboide, temporal)
+                os.replace(temporal, self._ruta_cuboide(nombre))
+            modo = 'completo' if completo else 'incremental'
+            logger.info(f"  Cubos ({modo}): {len(cambiados)} rangos recalculados, {len(eliminados)} eliminados")
+        
+        estado = {
+            'configuracion': configuracion,
+            'rangos': {str(r): f for r, f in firmas.items()},
+            'actualizado': datetime.now().isoformat(),
+            'modo': modo,
+            'rangos_recalculados': cambiados,
+            'rangos_eliminados': eliminados
+        }
+        with open(self.estado_file, 'w') as f:
+            json.dump(estado, f, indent=2)
+        
+        logger.info(f"✓ Cubos en: {self.output_dir}")
+        return estado
+    
+    def _elegir_cuboide(self, dimensiones):
+        """El cuboide con menos dimensiones que contiene todas las pedidas"""
+        candidatos = [
+            (len(dims), nombre) for nombre, dims in self.cuboides.items() if set(dimensiones) <= set(dims)
+        ]
+        if not candidatos:
+            raise ValueError(f"Ningún cuboide contiene las dimensiones {sorted(dimensiones)}; "
+                             f"agregarlas a CUBOIDES")
+        return min(candidatos)[1]
+    
+    def consultar(self, agrupar_por=(), filtros=None):
+        """
+        Responder una segmentación desde los cubos. Ejemplo:
+            consultar(['tipo_cliente'], {'tarjeta_beneficios': 'SI'})
+        Retorna un DataFrame con registros, promedio/min/max de cada medida y distintos
+        aproximados por cada combinación de agrupar_por
+        """
+        agrupar_por = list(agrupar_por)
+        filtros = filtros or {}
+        nombre = self._elegir_cuboide(agrupar_por + list(filtros))
+        celdas = pq.read_table(self._ruta_cuboide(nombre)).to_pandas()
+        for columna, valor in filtros.items():
+            valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+            celdas = celdas[celdas[columna].isin(valores)]
+        
+        agregaciones = {'registros': 'sum'}
+        for medida in MEDIDAS_CUBO:
+            agregaciones.update({
+                f"{medida}_count": 'sum', f"{medida}_sum": 'sum', f"{medida}_min": 'min', f"{medida}_max": 'max'
+            })
+        for columna in DISTINTOS_CUBO:
+            agregaciones[f"hll_{columna}"] = _hll_unir
+        
+        if celdas.empty:
+            return pd.DataFrame(columns=agrupar_por + ['registros'])
+        if agrupar_por:
+            resultado = celdas.groupby(agrupar_por, dropna=False).agg(agregaciones).reset_index()
+        else:
+            resultado = celdas.agg(agregaciones).to_frame().T
+        
+        for medida in MEDIDAS_CUBO:
+            resultado[f"promedio_{medida}"] = resultado[f"{medida}_sum"] / resultado[f"{medida}_count"]
+            resultado = resultado.rename(columns={f"{medida}_min": f"min_{medida}", f"{medida}_max": f"max_{medida}"})
+            resultado = resultado.drop(columns=[f"{medida}_sum", f"{medida}_count"])
+        for columna in DISTINTOS_CUBO:
+            resultado[f"distintos_{columna}"] = resultado.pop(f"hll_{columna}").map(
+                lambda b: _hll_estimar(np.frombuffer(b, dtype=np.uint8))
+            )
+        return resultado
+
+
+if __name__ == "__main__":
+    import sys
+    cubos = CubosGold()
+    cubos.actualizar(full_refresh='--full-refresh' in sys.argv)
+    print(cubos.consultar(['tipo_cliente']).to_string(index=False))
@@ -0,0 +1,259 @@
+"""
+Datos Sintéticos - Proyecto LIDL
+Genera clientes.sql, clientes_info.csv y clientes_extra.txt con el formato de las fuentes
+reales, a cualquier escala (10K a 100M filas) y con una proporción controlada de valores
+sucios que disparan las reglas de validación Bronze y de limpieza Silver
+"""
+
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+from indice_claves import digito_verificador
+from observabilidad import obtener_logger
+
+logger = obtener_logger('datos_sinteticos')
+
+FILAS_POR_BLOQUE = 500_000  # filas generadas y escritas por iteración (memoria acotada)
+
+NOMBRES = ['Felipe', 'Javiera', 'Catalina', 'Daniel', 'Matías', 'Sofía', 'Benjamín', 'Antonia',
+           'Tomás', 'Isidora', 'Vicente', 'Martina', 'José Tomás', 'María José', 'Agustín', 'Florencia']
+APELLIDOS = ['Fuentes', 'Torres', 'Vargas', 'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez',
+             'Soto', 'Contreras', 'Silva', 'Martínez', "O'Ryan", 'Sepúlveda', 'Morales', 'Núñez']
+COMUNAS = ['Vitacura', 'Providencia', 'Conchalí', 'Las Condes', 'Ñuñoa', 'Maipú',
+           'La Florida', 'Puente Alto', 'Santiago', 'Recoleta']
+RELIGIONES = ['Atea', 'Católica', 'Evangélica', 'Testigos de Jehová', 'Agnóstica', 'Mormona']
+TIPOS_SERVICIO = ['APP', 'LOCAL', 'AMBOS']
+TIPOS_ALIMENTACION = ['normal', 'vegetariana', 'vegana', 'No Aplica']
+
+# Fallas que se inyectan en las filas sucias, por fuente. Cada una dispara una regla de
+# ESQUEMA_* (validación Bronze) y/o de TABLAS_SILVER (normalización o descarte)
+FALLAS = {
+    'extra': [
+        'codigo_no_entero',         # validación codigo, descarte nulo_codigo
+        'tipo_servicio_invalido',   # validación tipo_servicio
+        'tipo_servicio_minusculas', # validación tipo_servicio, Silver pasa a mayúsculas
+        'codigo_unico_invalido',    # validación codigo_unico (regex)
+        'codigo_unico_vacio',       # validación codigo_unico (vacío tras el trim)
+        'fecha_inexistente'         # validación fecha_afiliacion, Silver deja null
+    ],
+    'info': [
+        'codigo_no_entero',         # validación codigo_cliente
+        'tarjeta_alias',            # validación tarjeta_beneficios, Silver mapea a SI/NO
+        'tarjeta_invalida',         # validación tarjeta_beneficios, Silver deja NO
+        'tipo_cliente_fuera_rango', # validación y filtro tipo_cliente_rango
+        'promedio_negativo',        # validación y filtro promedio_compras_negativo
+        'permanencia_fuera_rango',  # validación y filtro tiempo_permanencia_rango
+        'alimentacion_vacia'        # Silver rellena 'No Aplica'
+    ],
+    'clientes': [
+        'codigo_nulo',              # validación codigo, descarte nulo_codigo
+        'rut_malformado',           # validación rut (regex)
+        'rut_nulo',                 # validación rut, descarte nulo_rut
+        'fecha_inexistente',        # validación fecha_nacimiento, Silver deja null
+        'nombre_espacios',          # Silver colapsa espacios
+        'nombre_nulo',              # descarte nulo_nombre
+        'comuna_nula'               # Silver rellena 'Sin Comuna'
+    ]
+}
+
+ARCHIVOS = {'extra': 'clientes_extra.txt', 'info': 'clientes_info.csv', 'clientes': 'clientes.sql'}
+
+CREATE_TABLE_CLIENTES = """CREATE TABLE clientes (
+codigo INT,
+nombre VARCHAR(50),
+apellido VARCHAR(50),
+comuna VARCHAR(50),
+rut VARCHAR(20),
+fecha_nacimiento DATE,
+religion VARCHAR(50)
+);
+
+"""
+
+
+def _fechas(rng, n, desde, hasta):
+    """n fechas aleatorias 'YYYY-MM-DD' entre desde y hasta"""
+    inicio = np.datetime64(desde, 'D')
+    dias = (np.datetime64(hasta, 'D') - inicio).astype(int)
+    return (inicio + rng.integers(0, dias, n)).astype(str).astype(object)
+
+
+def _sql(valores):
+    """Literal SQL de un array de strings (None -> NULL, comillas escapadas)"""
+    return np.array(
+        ['NULL' if v is None else "'" + v.replace("'", "''") + "'" for v in valores], dtype=object
+    )
+
+
+class GeneradorDatos:
+    """
+    Las tres fuentes comparten los códigos 1..filas. Cada fila es sucia con probabilidad
+    proporcion_sucios y recibe una falla de FALLAS elegida al azar; inyectados guarda
+    cuántas se generaron de cada una para contrastarlas con las stats de Bronze y Silver.
+    La generación es determinista para una misma semilla
+    """
+    
+    def __init__(self, filas, proporcion_sucios=0.05, semilla=42, filas_por_bloque=FILAS_POR_BLOQUE):
+        if not 0 <= proporcion_sucios <= 1:
+            raise ValueError(f"proporcion_sucios debe estar entre 0 y 1: {proporcion_sucios}")
+        self.filas = filas
+        self.proporcion_sucios = proporcion_sucios
+        self.semilla = semilla
+        self.filas_por_bloque = filas_por_bloque
+        self.inyectados = {fuente: dict.fromkeys(fallas, 0) for fuente, fallas in FALLAS.items()}
+    
+    def _bloques(self, fuente):
+        """Producir (rng, códigos) por bloque, con una semilla distinta por fuente y bloque"""
+        desplazamiento = list(FALLAS).index(fuente)
+        for numero, inicio in enumerate(range(0, self.filas, self.filas_por_bloque)):
+            fin = min(inicio + self.filas_por_bloque, self.filas)
+            rng = np.random.default_rng([self.semilla, desplazamiento, numero])
+            yield rng, np.arange(inicio + 1, fin + 1)
+    
+    def _sucias(self, rng, fuente, n):
+        """{falla: índices de las filas del bloque que la reciben}"""
+        fallas = FALLAS[fuente]
+        sucias = np.flatnonzero(rng.random(n) < self.proporcion_sucios)
+        asignadas = rng.integers(0, len(fallas), len(sucias))
+        indices = {}
+        for i, falla in enumerate(fallas):
+            indices[falla] = sucias[asignadas == i]
+            self.inyectados[fuente][falla] += len(indices[falla])
+        return indices
+    
+    def generar_extra(self, ruta):
+        """clientes_extra.txt: 'codigo, tipo_servicio, codigo_unico, fecha_afiliacion' sin cabecera"""
+        letras = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+        with open(ruta, 'w', encoding='utf-8') as f:
+            for rng, codigos in self._bloques('extra'):
+                n = len(codigos)
+                codigo = codigos.astype(str).astype(object)
+                servicio = rng.choice(TIPOS_SERVICIO, n).astype(object)
+                unico = pd.Series(rng.choice(letras, (n, 4)).astype(object).sum(axis=1)) \
+                    + pd.Series(rng.integers(0, 100, n)).map('{:02d}'.format)
+                unico = unico.to_numpy(dtype=object)
+                fecha = _fechas(rng, n, '2020-01-01', '2026-01-01')
+                
+                sucias = self._sucias(rng, 'extra', n)
+                codigo[sucias['codigo_no_entero']] = 'X' + codigo[sucias['codigo_no_entero']]
+                servicio[sucias['tipo_servicio_invalido']] = 'WEB'
+                servicio[sucias['tipo_servicio_minusculas']] = np.char.lower(
+                    servicio[sucias['tipo_servicio_minusculas']].astype(str)
+                )
+                unico[sucias['codigo_unico_invalido']] = 'AB1'
+                unico[sucias['codigo_unico_vacio']] = ''
+                fecha[sucias['fecha_inexistente']] = '2024-02-30'
+                
+                f.write(''.join(
+                    f"{c}, {s}, {u}, {d}\n" for c, s, u, d in zip(codigo, servicio, unico, fecha)
+                ))
+    
+    def generar_info(self, ruta):
+        """clientes_info.csv con cabecera"""
+        primero = True
+        with open(ruta, 'w', encoding='utf-8', newline='') as f:
+            for rng, codigos in self._bloques('info'):
+                n = len(codigos)
+                bloque = pd.DataFrame({
+                    'codigo_cliente': codigos.astype(str).astype(object),
+                    'tarjeta_beneficios': rng.choice(['SI', 'NO'], n).astype(object),
+                    'tipo_cliente': rng.integers(1, 6, n).astype(str).astype(object),
+                    'promedio_compras': rng.integers(1_000, 1_000_000, n).astype(str).astype(object),
+                    'tipo_alimentacion': rng.choice(TIPOS_ALIMENTACION, n).astype(object),
+                    'tiempo_permanencia_min': rng.integers(5, 121, n).astype(str).astype(object)
+                })
+                
+                sucias = self._sucias(rng, 'info', n)
+                columna = bloque.columns.get_loc
+                bloque.iloc[sucias['codigo_no_entero'], columna('codigo_cliente')] = 'sin-codigo'
+                bloque.iloc[sucias['tarjeta_alias'], columna('tarjeta_beneficios')] = \
+                    rng.choice(['YES', 'Y', '1', 'N', '0'], len(sucias['tarjeta_alias']))
+                bloque.iloc[sucias['tarjeta_invalida'], columna('tarjeta_beneficios')] = 'QUIZAS'
+                bloque.iloc[sucias['tipo_cliente_fuera_rango'], columna('tipo_cliente')] = \
+                    rng.choice(['0', '9'], len(sucias['tipo_cliente_fuera_rango']))
+                bloque.iloc[sucias['promedio_negativo'], columna('promedio_compras')] = '-15000'
+                bloque.iloc[sucias['permanencia_fuera_rango'], columna('tiempo_permanencia_min')] = '150'
+                bloque.iloc[sucias['alimentacion_vacia'], columna('tipo_alimentacion')] = None
+                
+                bloque.to_csv(f, header=primero, index=False)
+                primero = False
+    
+    def generar_clientes(self, ruta):
+        """clientes.sql: CREATE TABLE + un INSERT por fila (comillas escapadas con '')"""
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(CREATE_TABLE_CLIENTES)
+            for rng, codigos in self._bloques('clientes'):
+                n = len(codigos)
+                codigo = codigos.astype(str).astype(object)
+                nombre = rng.choice(NOMBRES, n).astype(object)
+                apellido = rng.choice(APELLIDOS, n).astype(object)
+                comuna = rng.choice(COMUNAS, n).astype(object)
+                cuerpos = rng.integers(1_000_000, 26_000_000, n)
+                # Un tercio de los RUT con puntos de miles (ambos formatos son válidos)
+                con_puntos = rng.random(n) < 1 / 3
+                cuerpo = np.array([
+                    f"{c:,}".replace(',', '.') if p else str(c) for c, p in zip(cuerpos, con_puntos)
+                ], dtype=object)
+                rut = cuerpo + '-' + digito_verificador(cuerpos).astype(object)
+                fecha = _fechas(rng, n, '1940-01-01', '2006-01-01')
+                religion = rng.choice(RELIGIONES, n).astype(object)
+                
+                sucias = self._sucias(rng, 'clientes', n)
+                codigo[sucias['codigo_nulo']] = 'NULL'
+                rut[sucias['rut_malformado']] = 'RUT' + cuerpo[sucias['rut_malformado']]
+                rut[sucias['rut_nulo']] = None
+                fecha[sucias['fecha_inexistente']] = '1990-13-45'
+                nombre[sucias['nombre_espacios']] = '  ' + np.char.replace(
+                    nombre[sucias['nombre_espacios']].astype(str), ' ', '   '
+                ).astype(object) + ' '
+                nombre[sucias['nombre_nulo']] = None
+                comuna[sucias['comuna_nula']] = None
+                
+                f.write(''.join(
+                    f"INSERT INTO clientes VALUES ({c}, {n_}, {a}, {co}, {r}, {d}, {re});\n"
+                    for c, n_, a, co, r, d, re in zip(
+                        codigo, _sql(nombre), _sql(apellido), _sql(comuna), _sql(rut), _sql(fecha), _sql(religion)
+                    )
+                ))
+    
+    def generar(self, directorio):
+        """
+        Escribir las tres fuentes en `directorio` y un generacion.json con la configuración y
+        las fallas inyectadas. Retorna {fuente: ruta}
+        """
+        os.makedirs(directorio, exist_ok=True)
+        logger.info(f"=== Generando {self.filas:,} filas por fuente en {directorio} "
+                     f"({self.proporcion_sucios:.1%} sucias, semilla {self.semilla}) ===")
+        rutas = {fuente: os.path.join(directorio, archivo) for fuente, archivo in ARCHIVOS.items()}
+        self.inyectados = {fuente: dict.fromkeys(fallas, 0) for fuente, fallas in FALLAS.items()}
+        for fuente, ruta in rutas.items():
+            getattr(self, f'generar_{fuente}')(ruta)
+            logger.info(f"✓ {ruta}: {os.path.getsize(ruta) / 1024 / 1024:.1f} MB, "
+                         f"{sum(self.inyectados[fuente].values()):,} filas sucias")
+        
+        with open(os.path.join(directorio, 'generacion.json'), 'w') as f:
+            json.dump(self.descripcion(), f, indent=2)
+        return rutas
+    
+    def descripcion(self):
+        """Configuración y fallas inyectadas (identifica un conjunto de datos generado)"""
+        return {
+            'filas': self.filas,
+            'proporcion_sucios': self.proporcion_sucios,
+            'semilla': self.semilla,
+            'inyectados': self.inyectados
+        }
+
+
+if __name__ == "__main__":
+    # --filas=N --sucios=0.05 --semilla=42 --directorio=datos_sinteticos
+    argumentos = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    generador = GeneradorDatos(
+        int(argumentos.get('filas', 10_000)),
+        proporcion_sucios=float(argumentos.get('sucios', 0.05)),
+        semilla=int(argumentos.get('semilla', 42))
+    )
+    generador.generar(argumentos.get('directorio', 'datos_sinteticos'))
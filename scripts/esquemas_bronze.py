@@ -0,0 +1,103 @@
+"""
+Esquemas Bronze - Proyecto LIDL
+Esquemas Arrow explícitos por fuente (claves enteras, fechas date32 y enums de baja
+cardinalidad como dictionary), aplicados al parsear con las mismas conversiones que Silver
+"""
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from motor_arrow import MotorArrow
+
+# Tipos lógicos (mismo vocabulario que las reglas de TABLAS_SILVER) -> tipo Arrow
+#   texto: string sin tocar (Silver hace trim y normaliza)
+#   enum:  string de baja cardinalidad, dictionary-encoded
+TIPOS_ARROW = {
+    'int': pa.int32(),
+    'double': pa.float64(),
+    'fecha': pa.date32(),
+    'texto': pa.string(),
+    'enum': pa.dictionary(pa.int32(), pa.string())
+}
+
+# Tipos del CREATE TABLE del dump SQL. BIGINT queda como texto: int32 (IntegerType de
+# Spark, el tipo de Silver) no lo representa sin perder valores
+TIPOS_SQL = {
+    'INT': 'int', 'INTEGER': 'int', 'SMALLINT': 'int', 'TINYINT': 'int', 'MEDIUMINT': 'int',
+    'DECIMAL': 'double', 'NUMERIC': 'double', 'FLOAT': 'double', 'DOUBLE': 'double', 'REAL': 'double',
+    'DATE': 'fecha'
+}
+
+# Columnas de texto del dump SQL que se guardan como enum
+ENUMS_SQL = {'clientes': ['comuna', 'religion']}
+
+# Esquemas de las fuentes sin DDL (TXT y CSV)
+ESQUEMA_BRONZE_EXTRA = {
+    'codigo': 'int',
+    'tipo_servicio': 'enum',
+    'codigo_unico': 'texto',
+    'fecha_afiliacion': 'fecha'
+}
+ESQUEMA_BRONZE_INFO = {
+    'codigo_cliente': 'int',
+    'tarjeta_beneficios': 'enum',
+    'tipo_cliente': 'int',
+    'promedio_compras': 'double',
+    'tipo_alimentacion': 'enum',
+    'tiempo_permanencia_min': 'int'
+}
+# Si el dump SQL no trae CREATE TABLE
+ESQUEMA_BRONZE_CLIENTES = {
+    'codigo': 'int',
+    'nombre': 'texto',
+    'apellido': 'texto',
+    'comuna': 'enum',
+    'rut': 'texto',
+    'fecha_nacimiento': 'fecha',
+    'religion': 'enum'
+}
+
+
+def tipo_sql(definicion, tabla, columna):
+    """Tipo lógico de una columna a partir de su definición en el CREATE TABLE ('codigo INT')"""
+    partes = definicion.split()
+    base = partes[1].split('(')[0].upper() if len(partes) > 1 else ''
+    tipo = TIPOS_SQL.get(base, 'texto')
+    if tipo == 'texto' and columna in ENUMS_SQL.get(tabla.lower(), []):
+        return 'enum'
+    return tipo
+
+
+def esquema_arrow(tipos):
+    """pa.Schema a partir de {columna: tipo lógico}"""
+    return pa.schema([(columna, TIPOS_ARROW[tipo]) for columna, tipo in tipos.items()])
+
+
+def tipar(tabla, tipos):
+    """
+    Convertir una tabla de strings recién parseada al esquema de la fuente. Los números y
+    fechas se convierten como en Silver (trim, cast no ANSI, to_date estricto): los valores
+    no convertibles quedan null (MotorValidacion ya los contó sobre el texto original)
+    """
+    motor = MotorArrow()
+    columnas = []
+    for nombre in tabla.column_names:
+        columna = tabla.column(nombre)
+        tipo = tipos.get(nombre, 'texto')
+        if tipo in ('int', 'double', 'fecha'):
+            columna = motor.compilar_columna(columna, {'tipo': tipo})
+        elif tipo == 'enum':
+            columna = pc.dictionary_encode(columna)
+        columnas.append(columna.cast(TIPOS_ARROW[tipo]))
+    return pa.Table.from_arrays(
+        columnas, schema=esquema_arrow({nombre: tipos.get(nombre, 'texto') for nombre in tabla.column_names})
+    )
+
+
+def sin_diccionarios(tabla):
+    """Decodificar las columnas dictionary (p.ej. para Spark, que no las admite vía Arrow)"""
+    schema = pa.schema([
+        campo.with_type(campo.type.value_type) if pa.types.is_dictionary(campo.type) else campo
+        for campo in tabla.schema
+    ])
+    return tabla.cast(schema)
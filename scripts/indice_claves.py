@@ -0,0 +1,224 @@
+"""
+Índice de Claves - Proyecto LIDL
+Validación vectorizada del dígito verificador del RUT e índice hash de las claves de
+cliente de las tablas Silver: RUT inválidos o duplicados, códigos duplicados y claves
+huérfanas entre tablas en una sola agregación, con una tabla de cuarentena
+"""
+
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from reglas_silver import TABLAS_SILVER
+from observabilidad import obtener_logger
+
+logger = obtener_logger('indice_claves')
+
+# RUT ya limpio en Silver (sin puntos ni guion): cuerpo de hasta 8 dígitos + dígito verificador
+_PATRON_RUT = r'^[0-9]{1,8}[0-9K]$'
+
+# Tabla que aporta el RUT y columna que lo contiene
+FUENTE_RUT = 'clientes'
+COLUMNA_RUT = 'rut'
+
+ESQUEMA_CUARENTENA = pa.schema([
+    ('motivo', pa.string()),      # rut_invalido | rut_duplicado | codigo_duplicado | clave_huerfana
+    ('tabla', pa.string()),       # tabla Silver donde está la fila o la clave
+    ('codigo', pa.int64()),       # código de cliente
+    ('valor', pa.string()),       # valor que dispara el motivo (RUT o código)
+    ('apariciones', pa.int64()),  # veces que aparece el valor en la tabla
+    ('detalle', pa.string())
+])
+
+
+def _resto_modulo_11(cuerpos):
+    """11 - (suma ponderada 2..7 de los dígitos, de derecha a izquierda, módulo 11)"""
+    suma = np.zeros(len(cuerpos), dtype=np.int64)
+    restante = np.asarray(cuerpos, dtype=np.int64).copy()
+    factor = 2
+    while restante.any():
+        suma += (restante % 10) * factor
+        restante //= 10
+        factor = 2 if factor == 7 else factor + 1
+    return 11 - suma % 11
+
+
+def digito_verificador(cuerpos):
+    """Dígito verificador del RUT (módulo 11) para un array de cuerpos numéricos"""
+    resto = _resto_modulo_11(cuerpos)
+    return np.where(resto == 11, '0', np.where(resto == 10, 'K', resto.astype(str)))
+
+
+def rut_valido(ruts):
+    """
+    Máscara booleana de RUT válidos para un array de strings sin puntos ni guion
+    ('12345678K'). Formato y dígito verificador se comprueban sobre la columna entera;
+    los nulos y los de cuerpo cero ('00', '000000000') no son válidos
+    """
+    if not isinstance(ruts, (pa.Array, pa.ChunkedArray)):
+        ruts = pa.array(ruts, type=pa.string())
+    texto = pc.utf8_upper(pc.utf8_trim_whitespace(ruts))
+    formato = np.asarray(pc.fill_null(pc.match_substring_regex(texto, _PATRON_RUT), False), dtype=bool)
+    
+    # Los RUT con formato inválido se evalúan como '00' y se descartan por la máscara de formato
+    texto = pc.if_else(formato, texto, '00')
+    cuerpos = np.asarray(pc.cast(pc.utf8_slice_codeunits(texto, 0, -1), pa.int64()))
+    digitos = pc.utf8_slice_codeunits(texto, -1, None)
+    # Mismo código que el resto módulo 11: 'K' -> 10 y '0' -> 11
+    declarado = np.asarray(pc.cast(pc.replace_substring(digitos, 'K', '10'), pa.int64()))
+    declarado = np.where(declarado == 0, 11, declarado)
+    # Un cuerpo 0 pasa el módulo 11 con dígito '0', pero no es un RUT
+    return formato & (cuerpos > 0) & (_resto_modulo_11(cuerpos) == declarado)
+
+
+class IndiceClaves:
+    """
+    Índice de las claves de cliente de las tablas Silver. Cada tabla aporta sus claves al
+    terminar de limpiarse (agregar) y construir() resuelve todo en una agregación hash sobre
+    las claves de todas las tablas juntas, sin joins entre pares de tablas:
+    - codigo_duplicado: código repetido dentro de una tabla
+    - clave_huerfana: código presente en unas tablas y ausente de otras
+    - rut_invalido / rut_duplicado: RUT de clientes con dígito verificador incorrecto o repetido
+    """
+    
+    def __init__(self, output_path='silver/ventas'):
+        self.output_path = output_path
+        self.cuarentena_file = os.path.join(output_path, 'cuarentena_claves.parquet')
+        self.claves = {}
+        self.ruts = None
+    
+    def agregar(self, fuente, output_file):
+        """Leer del Silver escrito solo la clave (y el RUT en clientes) de la tabla"""
+        especificacion = TABLAS_SILVER[fuente]
+        columnas = [especificacion['clave']] + ([COLUMNA_RUT] if fuente == FUENTE_RUT else [])
+        datos = ds.dataset(output_file, format='parquet', partitioning='hive').to_table(columns=columnas)
+        claves = pc.cast(datos.column(especificacion['clave']), pa.int64())
+        self.claves[fuente] = claves.combine_chunks() if claves.num_chunks != 1 else claves.chunk(0)
+        if fuente == FUENTE_RUT:
+            self.ruts = (self.claves[fuente], datos.column(COLUMNA_RUT).combine_chunks())
+    
+    def _pasada_codigos(self):
+        """
+        Una agregación hash por código sobre las claves de todas las tablas concatenadas:
+        columna por tabla con las apariciones del código en esa tabla
+        """
+        fuentes = list(self.claves)
+        partes = []
+        for i, fuente in enumerate(fuentes):
+            claves = self.claves[fuente]
+            # Los códigos nulos no se pueden cruzar: ya los cuenta la limpieza Silver
+            claves = claves.filter(pc.is_valid(claves))
+            unos, ceros = pa.array(np.ones(len(claves), dtype=np.int8)), pa.array(np.zeros(len(claves), dtype=np.int8))
+            partes.append(pa.table(
+                [claves] + [unos if j == i else ceros for j in range(len(fuentes))],
+                names=['codigo'] + fuentes
+            ))
+        return pa.concat_tables(partes).group_by('codigo').aggregate(
+            [(fuente, 'sum') for fuente in fuentes]
+        ), fuentes
+    
+    def _filas(self, motivo, tabla, codigos, valores, apariciones, detalle=None):
+        """Filas de cuarentena de un motivo (detalle: texto común o array por fila)"""
+        def columna(valores, tipo):
+            if isinstance(valores, (pa.Array, pa.ChunkedArray)):
+                return pc.cast(valores, tipo)
+            return pa.array(valores, type=tipo)
+        
+        n = len(codigos)
+        return pa.table({
+            'motivo': pa.array([motivo] * n, type=pa.string()),
+            'tabla': pa.array([tabla] * n, type=pa.string()),
+            'codigo': columna(codigos, pa.int64()),
+            'valor': columna(valores, pa.string()),
+            'apariciones': columna(apariciones, pa.int64()),
+            'detalle': detalle if isinstance(detalle, pa.Array) else pa.array([detalle] * n, type=pa.string())
+        }, schema=ESQUEMA_CUARENTENA)
+    
+    def _cuarentena_codigos(self, conteo):
+        """Filas de cuarentena y conteos de códigos duplicados y huérfanos"""
+        indice, fuentes = conteo
+        tablas = {fuente: TABLAS_SILVER[fuente]['tabla'] for fuente in fuentes}
+        codigos = indice.column('codigo')
+        apariciones = {fuente: np.asarray(indice.column(f'{fuente}_sum')) for fuente in fuentes}
+        presente = np.column_stack([apariciones[fuente] > 0 for fuente in fuentes])
+        
+        # Con una sola tabla indexada no hay con qué cruzar
+        huerfanos = np.flatnonzero(~presente.all(axis=1)) if len(fuentes) > 1 else np.array([], dtype=np.int64)
+        
+        # Tablas de las que falta cada código huérfano, como texto ('sin clientes_info, ...')
+        ausencias = np.full(len(huerfanos), '', dtype=object)
+        for i, fuente in enumerate(fuentes):
+            ausencias = np.where(presente[huerfanos, i], ausencias, ausencias + ', ' + tablas[fuente])
+        ausencias = pc.binary_join_element_wise(
+            'sin ', pc.utf8_slice_codeunits(pa.array(ausencias, type=pa.string()), 2), ''
+        )
+        
+        filas, conteos = [], {'codigo_duplicado': {}, 'clave_huerfana': {}}
+        for i, fuente in enumerate(fuentes):
+            duplicado = np.flatnonzero(apariciones[fuente] > 1)
+            conteos['codigo_duplicado'][tablas[fuente]] = len(duplicado)
+            filas.append(self._filas(
+                'codigo_duplicado', tablas[fuente], codigos.take(duplicado),
+                codigos.take(duplicado), apariciones[fuente][duplicado]
+            ))
+            huerfano = presente[huerfanos, i]
+            conteos['clave_huerfana'][tablas[fuente]] = int(huerfano.sum())
+            filas.append(self._filas(
+                'clave_huerfana', tablas[fuente], codigos.take(huerfanos[huerfano]),
+                codigos.take(huerfanos[huerfano]), apariciones[fuente][huerfanos[huerfano]], ausencias.filter(pa.array(huerfano))
+            ))
+        return filas, conteos
+    
+    def _cuarentena_ruts(self):
+        """Filas de cuarentena y conteos de RUT inválidos y duplicados en clientes"""
+        codigos, ruts = self.ruts
+        tabla = TABLAS_SILVER[FUENTE_RUT]['tabla']
+        
+        invalido = pa.array(~rut_valido(ruts) & np.asarray(ruts.is_valid()))
+        filas = [self._filas('rut_invalido', tabla, codigos.filter(invalido), ruts.filter(invalido),
+                             np.ones(pc.sum(invalido).as_py() or 0, dtype=np.int64), 'dígito verificador o formato incorrecto')]
+        
+        # RUT repetidos: agregación hash por RUT y luego las filas con alguno de esos RUT
+        repetidos = pa.table({COLUMNA_RUT: ruts}).group_by(COLUMNA_RUT).aggregate([(COLUMNA_RUT, 'count')])
+        repetidos = repetidos.filter(pc.greater(repetidos.column(f'{COLUMNA_RUT}_count'), 1))
+        duplicado = pc.fill_null(pc.is_in(ruts, value_set=repetidos.column(COLUMNA_RUT)), False)
+        posiciones = pc.index_in(ruts.filter(duplicado), value_set=repetidos.column(COLUMNA_RUT))
+        filas.append(self._filas('rut_duplicado', tabla, codigos.filter(duplicado), ruts.filter(duplicado),
+                                 repetidos.column(f'{COLUMNA_RUT}_count').take(posiciones)))
+        return filas, {'rut_invalido': pc.sum(invalido).as_py() or 0, 'rut_duplicado': repetidos.num_rows}
+    
+    def construir(self):
+        """
+        Resolver el índice con las tablas agregadas y escribir cuarentena_claves.parquet
+        (se reescribe en cada ejecución). Retorna los conteos por motivo
+        """
+        if not self.claves:
+            return {}
+        filas, conteos = self._cuarentena_codigos(self._pasada_codigos())
+        if self.ruts is not None:
+            filas_rut, conteos_rut = self._cuarentena_ruts()
+            filas += filas_rut
+            conteos.update(conteos_rut)
+        
+        cuarentena = pa.concat_tables(filas)
+        os.makedirs(self.output_path, exist_ok=True)
+        pq.write_table(cuarentena, self.cuarentena_file)
+        conteos.update({
+            'claves_indexadas': sum(len(claves) - claves.null_count for claves in self.claves.values()),
+            'filas_cuarentena': cuarentena.num_rows,
+            'salida': self.cuarentena_file
+        })
+        
+        logger.info(f"✓ Índice de claves: {conteos['claves_indexadas']} claves, "
+                    f"{cuarentena.num_rows} filas en cuarentena")
+        for motivo in ('codigo_duplicado', 'clave_huerfana'):
+            if any(conteos[motivo].values()):
+                logger.warning(f"  {motivo}: {conteos[motivo]}")
+        for motivo in ('rut_invalido', 'rut_duplicado'):
+            if conteos.get(motivo):
+                logger.warning(f"  {motivo}: {conteos[motivo]}")
+        return conteos
@@ -4,224 +4,1035 @@ Ingestar datos desde TXT, CSV y SQL a capa Bronze
 """
 
 import os
+import io
+import codecs
+import shutil
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import re
 from datetime import datetime
 import json
-import logging
-
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/ingesta_bronze.log'),
-        logging.StreamHandler()
-    ]
+import glob
+import hashlib
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from validacion import MotorValidacion, ResultadoValidacion
+from layout_parquet import layout_de_ruta, opciones_escritura, ordenar, escribir_tabla
+from esquemas_bronze import (
+    ESQUEMA_BRONZE_EXTRA, ESQUEMA_BRONZE_INFO, ESQUEMA_BRONZE_CLIENTES, tipo_sql, esquema_arrow, tipar
 )
+from archivos_comprimidos import es_comprimido, miembros, abrir, abrir_concatenado, tamano_descomprimido
+from observabilidad import Trazador, MuestreadorRSS, obtener_logger, cpu_proceso, bytes_escritos_desde
+
+logger = obtener_logger('ingesta_bronze')
+
+# Parámetros del parser SQL en streaming
+TAMANO_BLOQUE_LECTURA = 8 * 1024 * 1024  # caracteres leídos por iteración
+TAMANO_LOTE_SQL = 100_000  # filas por record batch de Arrow
+
+# Parseo intra-archivo: los archivos se cortan en rangos de bytes de este tamaño
+TAMANO_RANGO = 128 * 1024 * 1024
+
+# Ingesta incremental: bytes leídos del inicio y del final del tramo ya ingerido
+# para detectar si el archivo fue reescrito (en lugar de hashear todo el archivo)
+TAMANO_HUELLA = 64 * 1024
+
+# Fuentes comprimidas (.zip, .gz, .zst): se leen en streaming y cada bloque de este número
+# de filas es un part file (no se pueden cortar en rangos de bytes para varios procesos)
+FILAS_POR_PARTE_STREAM = 500_000
+
+# Protege stats y estado compartidos cuando varias fuentes se ingieren desde hilos
+# (a nivel de módulo: las instancias se envían a los workers de rangos y un Lock no se serializa)
+_LOCK_FUSION = threading.Lock()
+
+# Fuentes registradas por defecto: nombre -> (método de ingesta, archivo)
+FUENTES_DEFAULT = {
+    'extra': ('ingestar_txt', 'clientes_extra.txt'),
+    'info': ('ingestar_csv', 'clientes_info.csv'),
+    'clientes': ('ingestar_sql', 'clientes.sql')
+}
+
+# Dataset Bronze que escribe cada método de ingesta
+TABLAS_BRONZE = {
+    'ingestar_txt': 'clientes_extra_bronze.parquet',
+    'ingestar_csv': 'clientes_info_bronze.parquet',
+    'ingestar_sql': 'clientes_bronze.parquet'
+}
+# Miembros de un .zip que lee cada método (un zip puede traer las tres fuentes)
+EXTENSIONES_METODO = {'ingestar_txt': '.txt', 'ingestar_csv': '.csv', 'ingestar_sql': '.sql'}
+
+COLUMNAS_EXTRA = ['codigo', 'tipo_servicio', 'codigo_unico', 'fecha_afiliacion']
+
+# Esquemas de validación por fuente (ver validacion.MotorValidacion)
+ESQUEMA_EXTRA = {
+    'codigo': {'tipo': 'entero'},
+    'tipo_servicio': {'tipo': 'texto', 'valores': ['APP', 'LOCAL', 'AMBOS']},
+    'codigo_unico': {'tipo': 'texto', 'regex': r'^[A-Z]{4}\d{2}$'},
+    'fecha_afiliacion': {'tipo': 'fecha'}
+}
+ESQUEMA_INFO = {
+    'codigo_cliente': {'tipo': 'entero'},
+    'tarjeta_beneficios': {'tipo': 'texto', 'valores': ['SI', 'NO']},
+    'tipo_cliente': {'tipo': 'numero', 'min': 1, 'max': 5},
+    'promedio_compras': {'tipo': 'numero', 'min': 0},
+    'tiempo_permanencia_min': {'tipo': 'numero', 'min': 0, 'max': 120}
+}
+ESQUEMA_CLIENTES = {
+    'codigo': {'tipo': 'entero'},
+    'rut': {'tipo': 'texto', 'regex': r'^[\d.]{1,12}-[\dkK]$'},
+    'fecha_nacimiento': {'tipo': 'fecha'}
+}
+COLUMNAS_SQL_DEFAULT = ['codigo', 'nombre', 'apellido', 'comuna', 'rut', 'fecha_nacimiento', 'religion']
+
+# Sentencia INSERT completa: el ';' final solo cuenta fuera de comillas.
+# La alternancia no es ambigua para evitar backtracking catastrófico cuando
+# la sentencia queda cortada al final de un bloque.
+_SQL_INSERT_RE = re.compile(
+    r"INSERT\s+INTO\s+[`\"]?(\w+)[`\"]?\s+VALUES\s*((?:[^;']|'(?:[^'\\]|\\.)*')*);",
+    re.IGNORECASE | re.DOTALL
+)
+_SQL_CREATE_RE = re.compile(
+    r"CREATE\s+TABLE\s+[`\"]?(\w+)[`\"]?\s*\((.*?)\)\s*;",
+    re.IGNORECASE | re.DOTALL
+)
+# Tokens dentro de VALUES: string con escapes, NULL, literal sin comillas o fin de fila
+_SQL_VALOR_RE = re.compile(
+    r"'((?:[^'\\]|\\.|'')*)'|(NULL)\b|([^,()\s']+)|(\))",
+    re.IGNORECASE | re.DOTALL
+)
+_SQL_ESCAPE_RE = re.compile(r"\\(.)|''", re.DOTALL)
+_SQL_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+
+
+def _desescapar_sql(valor):
+    """Resolver escapes \\x y comillas dobladas '' de un string SQL"""
+    if '\\' not in valor and "''" not in valor:
+        return valor
+    return _SQL_ESCAPE_RE.sub(
+        lambda m: "'" if m.group(1) is None else _SQL_ESCAPES.get(m.group(1), m.group(1)),
+        valor
+    )
+
+
+def _tabla_texto(df):
+    """DataFrame leído con dtype=str a tabla Arrow de strings (columnas vacías incluidas)"""
+    return pa.Table.from_pandas(
+        df, schema=pa.schema([(c, pa.string()) for c in df.columns]), preserve_index=False
+    )
+
+
+def _dividir_columnas_sql(columns_def):
+    """Separar definición de columnas por comas de primer nivel (DECIMAL(10,2) no se corta)"""
+    columnas, nivel, actual = [], 0, []
+    for caracter in columns_def:
+        if caracter == '(':
+            nivel += 1
+        elif caracter == ')':
+            nivel -= 1
+        elif caracter == ',' and nivel == 0:
+            columnas.append(''.join(actual))
+            actual = []
+            continue
+        actual.append(caracter)
+    columnas.append(''.join(actual))
+    return [c.strip() for c in columnas if c.strip()]
+
+
+class EntregaBronze:
+    """
+    Lote recién ingerido de una tabla, entregado en memoria a Silver mientras se
+    persiste en Bronze en segundo plano (auditoría)
+    partes: {nombre del part file: pa.Table}
+    """
+    
+    def __init__(self, output_dir, partes):
+        self.output_dir = output_dir
+        self.partes = partes
+    
+    @property
+    def num_rows(self):
+        return sum(tabla.num_rows for tabla in self.partes.values())
+    
+    def persistir(self):
+        """Escribir los part files del lote en el dataset Bronze"""
+        layout = layout_de_ruta('bronze', self.output_dir)
+        for nombre, tabla in self.partes.items():
+            escribir_tabla(tabla, os.path.join(self.output_dir, nombre), layout)
+
 
 class IngestaBronze:
-    def __init__(self, output_path='bronze/ventas'):
+    def __init__(self, output_path='bronze/ventas', workers_por_archivo=None, tamano_rango=TAMANO_RANGO,
+                 incremental=False, en_memoria=False, cache=None, trazador=None, anexar=False):
         self.output_path = output_path
+        self.workers_por_archivo = workers_por_archivo or os.cpu_count() or 1
+        self.tamano_rango = tamano_rango
+        self.incremental = incremental
+        # en_memoria: las fuentes devuelven EntregaBronze y Bronze se escribe en segundo plano
+        self.en_memoria = en_memoria
+        # anexar: cada archivo es un lote nuevo completo del dataset existente (archivos delta
+        # del modo streaming); el estado incremental del archivo principal no se toca
+        self.anexar = anexar
+        # Escritura en segundo plano de las EntregaBronze: un hilo, un futuro por fuente
+        # (persistencias) y el del cierre que guarda el estado cuando todas terminan (persistencia)
+        self.escritor = None
+        self.persistencias = {}
+        self.persistencia = None
+        # cache: CacheEtapas opcional; las fuentes con el mismo contenido y código no se reingieren
+        self.cache = cache
+        self.pendientes_cache = []
+        # trazador: spans por fuente (ver observabilidad.Trazador)
+        self.trazador = trazador or Trazador()
+        # fuentes: {archivo: {registros, invalidos por campo, bytes_leidos}}
         self.stats = {
             'timestamp': datetime.now().isoformat(),
             'archivos_procesados': [],
             'registros_totales': 0,
-            'errores': []
+            'errores': [],
+            'fuentes': {}
         }
-        
+        self.fuentes = dict(FUENTES_DEFAULT)
+        self.estado_file = os.path.join(self.output_path, 'ingesta_estado.json')
+        self.estado = self._cargar_estado()
+        self.estado_nuevo = {}
+    
+    def registrar_fuente(self, nombre, metodo, filepath):
+        """
+        Registrar una fuente adicional de ingesta
+        metodo: nombre de un método ingestar_* o función de nivel de módulo f(ingesta, filepath)
+        """
+        self.fuentes[nombre] = (metodo, filepath)
+    
     def validar_campos_extra(self, df):
         """Validar campos del archivo clientes_extra.txt"""
-        validaciones = {
-            'codigo': lambda x: pd.to_numeric(x, errors='coerce').notna(),
-            'tipo_servicio': lambda x: x.astype(str).str.strip().isin(['APP', 'LOCAL', 'AMBOS']),
-            'codigo_unico': lambda x: x.astype(str).str.match(r'^[A-Z]{4}\d{2}$', na=False),
-            'fecha_afiliacion': lambda x: pd.to_datetime(x, errors='coerce').notna()
-        }
-        
-        errores = []
-        for campo, validacion in validaciones.items():
-            if campo in df.columns:
-                try:
-                    invalidos = ~validacion(df[campo])
-                    if invalidos.sum() > 0:
-                        errores.append(f"{campo}: {invalidos.sum()} registros inválidos")
-                        # Log algunos ejemplos de valores inválidos para debugging
-                        ejemplos = df[campo][invalidos].head(3).tolist()
-                        logging.debug(f"  Ejemplos de {campo} inválidos: {ejemplos}")
-                except Exception as e:
-                    errores.append(f"{campo}: Error en validación - {str(e)}")
-        
-        return errores
+        return MotorValidacion(ESQUEMA_EXTRA).validar(df).errores()
     
     def validar_campos_info(self, df):
         """Validar campos del archivo clientes_info.csv"""
-        validaciones = {
-            'codigo_cliente': lambda x: pd.to_numeric(x, errors='coerce').notna(),
-            'tarjeta_beneficios': lambda x: x.astype(str).str.strip().isin(['SI', 'NO']),
-            'tipo_cliente': lambda x: pd.to_numeric(x, errors='coerce').between(1, 5),
-            'promedio_compras': lambda x: pd.to_numeric(x, errors='coerce') >= 0,
-            'tiempo_permanencia_min': lambda x: pd.to_numeric(x, errors='coerce').between(0, 120)
-        }
+        return MotorValidacion(ESQUEMA_INFO).validar(df).errores()
+    
+    def calcular_rangos(self, filepath, es_sql=False, tamano_rango=None, inicio=0):
+        """
+        Dividir un archivo (desde el byte inicio) en rangos de bytes [inicio, fin) alineados
+        a fin de línea (TXT) o a fin de sentencia ';' (SQL), para parsearlos en procesos separados
+        """
+        tamano_rango = tamano_rango or self.tamano_rango
+        tamano = os.path.getsize(filepath)
+        num_rangos = max(1, -(-(tamano - inicio) // tamano_rango))
         
-        errores = []
-        for campo, validacion in validaciones.items():
-            if campo in df.columns:
-                try:
-                    invalidos = ~validacion(df[campo])
-                    if invalidos.sum() > 0:
-                        errores.append(f"{campo}: {invalidos.sum()} registros inválidos")
-                except Exception as e:
-                    errores.append(f"{campo}: Error en validación - {str(e)}")
+        cortes = [inicio]
+        with open(filepath, 'rb') as f:
+            for i in range(1, num_rangos):
+                posicion = inicio + i * (tamano - inicio) // num_rangos
+                corte = self._alinear_corte(f, posicion, es_sql, tamano)
+                if corte > cortes[-1]:
+                    cortes.append(corte)
+        if cortes[-1] < tamano:
+            cortes.append(tamano)
+        
+        return [(inicio, fin) for inicio, fin in zip(cortes, cortes[1:])]
+    
+    def _alinear_corte(self, f, posicion, es_sql, tamano):
+        """Mover un corte al inicio de la siguiente línea (SQL: tras una línea terminada en ';')"""
+        f.seek(posicion)
+        linea = f.readline()
+        while es_sql and linea and not linea.rstrip().endswith(b';'):
+            linea = f.readline()
+        return min(f.tell(), tamano)
+    
+    def _preparar_dataset(self, nombre):
+        """Crear (o vaciar) el directorio de dataset Parquet de una tabla Bronze"""
+        output_dir = os.path.join(self.output_path, nombre)
+        if os.path.isfile(output_dir):
+            os.remove(output_dir)
+        elif os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir)
+        return output_dir
+    
+    def ultimo_lote(self, nombre):
+        """Mayor lote con part files en el dataset Bronze de una tabla (-1 si no hay ninguno)"""
+        partes = glob.glob(os.path.join(self.output_path, nombre, 'part-*.parquet'))
+        return max((int(os.path.basename(parte).split('-')[1]) for parte in partes), default=-1)
+    
+    def descartar_lotes(self, nombre, posteriores_a):
+        """Borrar los part files de los lotes > posteriores_a (lote a medias tras un fallo)"""
+        partes = glob.glob(os.path.join(self.output_path, nombre, 'part-*.parquet'))
+        for parte in partes:
+            if int(os.path.basename(parte).split('-')[1]) > posteriores_a:
+                os.remove(parte)
+    
+    def _archivo_parte(self, output_dir, lote, indice):
+        """Ruta del part file de un rango dentro del dataset (lote 0 = carga completa)"""
+        return os.path.join(output_dir, f"part-{lote:05d}-{indice:05d}.parquet")
+    
+    def _procesar_rangos(self, funcion, filepath, rangos, output_dir, lote, *args):
+        """
+        Ejecutar funcion(filepath, inicio, fin, part_file, *args) sobre cada rango,
+        en un pool de procesos cuando hay más de un rango
+        """
+        tareas = [
+            (filepath, inicio, fin, self._archivo_parte(output_dir, lote, i)) + args
+            for i, (inicio, fin) in enumerate(rangos)
+        ]
+        if len(tareas) <= 1:
+            return [funcion(*tarea) for tarea in tareas]
+        
+        workers = min(len(tareas), self.workers_por_archivo)
+        logger.info(f"  {filepath}: {len(tareas)} rangos en {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = [pool.submit(funcion, *tarea) for tarea in tareas]
+            return [futuro.result() for futuro in futuros]
+    
+    def _cargar_estado(self):
+        """Leer el estado incremental por tabla (offset, tamaño, mtime, huella, max codigo)"""
+        if not os.path.exists(self.estado_file):
+            return {}
+        with open(self.estado_file) as f:
+            return json.load(f)
+    
+    def _huella(self, filepath, hasta):
+        """Hash del inicio y del final del tramo [0, hasta) ya ingerido"""
+        h = hashlib.sha256(str(hasta).encode())
+        with open(filepath, 'rb') as f:
+            h.update(f.read(min(TAMANO_HUELLA, hasta)))
+            f.seek(max(0, hasta - TAMANO_HUELLA))
+            h.update(f.read(min(TAMANO_HUELLA, hasta)))
+        return h.hexdigest()
+    
+    def _preparar_ingesta(self, nombre, filepath, esquema=None):
+        """
+        Decidir cómo ingerir una tabla. Retorna (output_dir, inicio, lote):
+        inicio=0 recarga completa, inicio>0 solo la cola nueva, inicio=None sin cambios
+        esquema: pa.Schema con el que se escribirán las partes; si el dataset existente tiene
+        otro (p.ej. el Bronze de texto anterior a los esquemas tipados) se recarga completo
+        """
+        output_dir = os.path.join(self.output_path, nombre)
+        estado = self.estado.get(nombre)
+        
+        if self.anexar and os.path.isdir(output_dir):
+            actual = ds.dataset(output_dir, format='parquet').schema
+            if esquema is not None and not actual.remove_metadata().equals(esquema):
+                raise ValueError(f"{filepath}: el esquema no coincide con el Bronze existente, se requiere una carga completa")
+            lote = self.ultimo_lote(nombre) + 1
+            logger.info(f"  {filepath}: anexado como lote {lote}")
+            return output_dir, 0, lote
+        
+        if self.incremental and estado and esquema is not None and os.path.isdir(output_dir):
+            actual = ds.dataset(output_dir, format='parquet').schema
+            if not actual.remove_metadata().equals(esquema):
+                logger.info(f"  {filepath}: el esquema Bronze cambió, recarga completa")
+                estado = None
+        
+        if self.incremental and estado and estado['archivo'] == filepath and os.path.isdir(output_dir):
+            tamano = os.path.getsize(filepath)
+            offset = estado['offset']
+            
+            # Mismo tamaño y mtime: no hace falta ni leer la huella
+            sin_cambios = tamano == offset and os.path.getmtime(filepath) == estado['mtime']
+            if sin_cambios or (tamano >= offset and self._huella(filepath, offset) == estado['huella']):
+                if tamano == offset:
+                    logger.info(f"  {filepath}: sin cambios desde la última ingesta")
+                    return output_dir, None, estado['lotes']
+                # En un comprimido los bytes añadidos no se pueden leer por separado
+                if not es_comprimido(filepath):
+                    lote = estado['lotes'] + 1
+                    logger.info(f"  {filepath}: incremental desde byte {offset} (lote {lote})")
+                    return output_dir, offset, lote
+            
+            logger.info(f"  {filepath}: archivo reescrito, recarga completa")
+        
+        return self._preparar_dataset(nombre), 0, 0
+    
+    def _registrar_estado(self, nombre, filepath, output_dir, lote, columna_codigo, offset, tablas=None):
+        """
+        Guardar el byte hasta el que se ingirió el archivo y el mayor codigo visto
+        tablas: tablas del lote en memoria (modo en_memoria, los part files aún no están escritos)
+        """
+        max_previo = self.estado.get(nombre, {}).get('max_codigo') if lote > 0 else None
+        inicio = self.estado.get(nombre, {}).get('offset', 0) if lote > 0 and not self.anexar else 0
+        self.stats['fuentes'].setdefault(filepath, {})['bytes_leidos'] = offset - inicio
+        
+        if tablas is None:
+            partes = glob.glob(os.path.join(output_dir, f"part-{lote:05d}-*.parquet"))
+            tablas = [ds.dataset(partes, format='parquet').to_table(columns=[columna_codigo])] if partes else []
+        tablas = [tabla for tabla in tablas if tabla is not None]
+        max_codigo = max_previo
+        if tablas:
+            codigos = pd.to_numeric(
+                pd.concat([tabla.column(columna_codigo).to_pandas() for tabla in tablas], ignore_index=True),
+                errors='coerce'
+            )
+            if max_previo is not None:
+                repetidos = int((codigos <= max_previo).sum())
+                if repetidos:
+                    logger.warning(f"  {filepath}: {repetidos} registros nuevos con {columna_codigo} <= {max_previo}")
+            if codigos.notna().any():
+                max_nuevo = int(codigos.max())
+                max_codigo = max_nuevo if max_previo is None else max(max_previo, max_nuevo)
+        
+        if self.anexar:
+            # El offset y la huella siguen siendo los del archivo principal de la fuente;
+            # anexados invalida la cache de esa fuente (su dataset ya no es solo el archivo)
+            previo = self.estado.get(nombre, {'archivo': None, 'offset': 0})
+            self.estado_nuevo[nombre] = dict(
+                previo, max_codigo=max_codigo, lotes=max(lote, previo.get('lotes', 0)),
+                anexados=previo.get('anexados', 0) + 1
+            )
+            return
+        
+        self.estado_nuevo[nombre] = {
+            'archivo': filepath,
+            'offset': offset,
+            'tamano': os.path.getsize(filepath),
+            'mtime': os.path.getmtime(filepath),
+            'huella': self._huella(filepath, offset),
+            'max_codigo': max_codigo,
+            'lotes': lote
+        }
+    
+    def _sin_cambios(self, filepath, output_dir):
+        """Resultado de una fuente que no cambió desde la última ingesta"""
+        self.stats['archivos_procesados'].append(filepath)
+        self._registrar_fuente(filepath, 0, ResultadoValidacion())
+        return ds.dataset(output_dir, format='parquet')
+    
+    def _registrar_fuente(self, filepath, registros, validacion):
+        """Registros e inválidos por campo de la fuente en stats['fuentes']"""
+        fuente = self.stats['fuentes'].setdefault(filepath, {})
+        fuente['registros'] = registros
+        fuente['invalidos'] = dict(validacion.conteos)
+    
+    def _resultado(self, output_dir, lote, tablas):
+        """Dataset Bronze ya escrito o, en modo en_memoria, EntregaBronze con las tablas del lote"""
+        if not self.en_memoria:
+            return ds.dataset(output_dir, format='parquet')
+        return EntregaBronze(output_dir, {
+            os.path.basename(self._archivo_parte(output_dir, lote, i)): tabla
+            for i, tabla in enumerate(tablas) if tabla is not None
+        })
+    
+    def _abrir_binario(self, filepath, extension):
+        """Archivo fuente en binario; los comprimidos se descomprimen en streaming (miembros de la extensión)"""
+        if es_comprimido(filepath):
+            return abrir_concatenado(filepath, extension)
+        return open(filepath, 'rb')
+    
+    def iterar_sentencias_sql(self, sql_file, tabla='clientes', tamano_bloque=TAMANO_BLOQUE_LECTURA,
+                              inicio=0, fin=None, columnas=None):
+        """
+        Leer el dump SQL por bloques y producir (columnas, sentencia) por cada INSERT.
+        La memoria queda acotada por el tamaño de bloque, no por el tamaño del archivo.
+        inicio/fin: rango de bytes a leer (columnas debe venir dado si el rango no
+        contiene el CREATE TABLE)
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        pendiente = None if fin is None else fin - inicio
+        buffer = ''
+        with self._abrir_binario(sql_file, '.sql') as f:
+            if inicio:
+                f.seek(inicio)
+            while True:
+                leer = tamano_bloque if pendiente is None else min(tamano_bloque, pendiente)
+                bloque = f.read(leer) if leer > 0 else b''
+                if pendiente is not None:
+                    pendiente -= len(bloque)
+                buffer += decoder.decode(bloque, final=not bloque)
+                ultimo = 0
+                for match in _SQL_INSERT_RE.finditer(buffer):
+                    if columnas is None:
+                        columnas = self._columnas_create_table(buffer[:match.start()], tabla)
+                    ultimo = match.end()
+                    if match.group(1).lower() == tabla.lower():
+                        yield columnas, match.group(2)
+                buffer = buffer[ultimo:]
+                if not bloque:
+                    break
+    
+    def columnas_sql(self, sql_file, tabla='clientes', tamano_bloque=TAMANO_BLOQUE_LECTURA):
+        """Leer las columnas del CREATE TABLE al inicio del dump"""
+        return list(self.tipos_sql(sql_file, tabla, tamano_bloque))
+    
+    def tipos_sql(self, sql_file, tabla='clientes', tamano_bloque=TAMANO_BLOQUE_LECTURA):
+        """
+        Esquema Bronze del dump según los tipos de su CREATE TABLE: {columna: tipo lógico}
+        (ver esquemas_bronze). Sin CREATE TABLE se usa ESQUEMA_BRONZE_CLIENTES
+        """
+        with io.TextIOWrapper(self._abrir_binario(sql_file, '.sql'), encoding='utf-8') as f:
+            cabecera = f.read(tamano_bloque)
+        primer_insert = _SQL_INSERT_RE.search(cabecera)
+        definiciones = self._definiciones_create_table(
+            cabecera[:primer_insert.start()] if primer_insert else cabecera, tabla
+        )
+        if definiciones is None:
+            return dict(ESQUEMA_BRONZE_CLIENTES)
+        return {
+            definicion.split()[0].strip('`"'): tipo_sql(definicion, tabla, definicion.split()[0].strip('`"'))
+            for definicion in definiciones
+        }
+    
+    def _definiciones_create_table(self, texto, tabla):
+        """Definiciones de columna del CREATE TABLE de la tabla ('codigo INT', ...) o None"""
+        for match in _SQL_CREATE_RE.finditer(texto):
+            if match.group(1).lower() == tabla.lower():
+                return _dividir_columnas_sql(match.group(2))
+        return None
+    
+    def _columnas_create_table(self, texto, tabla):
+        """Extraer nombres de columnas del CREATE TABLE (o columnas por defecto)"""
+        definiciones = self._definiciones_create_table(texto, tabla)
+        if definiciones is None:
+            return list(COLUMNAS_SQL_DEFAULT)
+        return [definicion.split()[0].strip('`"') for definicion in definiciones]
+    
+    def iterar_lotes_sql(self, sql_file, tabla='clientes', tamano_lote=TAMANO_LOTE_SQL,
+                         inicio=0, fin=None, columnas=None):
+        """Producir record batches de Arrow de tamaño fijo a partir del dump SQL"""
+        filas = []
+        sentencias = self.iterar_sentencias_sql(sql_file, tabla, inicio=inicio, fin=fin, columnas=columnas)
+        for columnas, valores in sentencias:
+            # Un INSERT puede traer varias filas: VALUES (...),(...)
+            fila = []
+            for m in _SQL_VALOR_RE.finditer(valores):
+                texto, nulo, literal, cierre = m.groups()
+                if cierre:
+                    if len(fila) != len(columnas):
+                        raise ValueError(
+                            f"Fila con {len(fila)} valores, se esperaban {len(columnas)}: {fila[:3]}..."
+                        )
+                    filas.append(fila)
+                    fila = []
+                elif texto is not None:
+                    fila.append(_desescapar_sql(texto))
+                elif nulo:
+                    fila.append(None)
+                else:
+                    fila.append(literal)
+            
+            if len(filas) >= tamano_lote:
+                yield self._lote_sql(filas, columnas)
+                filas = []
         
-        return errores
+        if filas:
+            yield self._lote_sql(filas, columnas)
+    
+    def _lote_sql(self, filas, columnas):
+        """Construir un RecordBatch (todas las columnas como string, igual que Bronze)"""
+        arrays = [pa.array([fila[i] for fila in filas], type=pa.string()) for i in range(len(columnas))]
+        return pa.RecordBatch.from_arrays(arrays, names=columnas)
+    
+    def escribir_sql_parquet(self, sql_file, output_file, tabla='clientes', tamano_lote=TAMANO_LOTE_SQL,
+                             inicio=0, fin=None, columnas=None, al_escribir=None, tipos=None):
+        """
+        Volcar el dump SQL (o un rango de bytes) a Parquet lote a lote. Retorna el número de registros
+        al_escribir: función opcional llamada con cada record batch de texto (p.ej. validación)
+        tipos: esquema Bronze {columna: tipo lógico}; por defecto el del CREATE TABLE del dump
+        Cada lote se escribe tipado y ordenado según el layout Bronze de la tabla
+        """
+        tipos = tipos or self.tipos_sql(sql_file, tabla)
+        layout = layout_de_ruta('bronze', os.path.dirname(output_file))
+        writer = None
+        registros = 0
+        try:
+            for lote in self.iterar_lotes_sql(sql_file, tabla, tamano_lote, inicio, fin, columnas):
+                tipado = ordenar(tipar(pa.Table.from_batches([lote]), tipos), layout)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_file, tipado.schema, **opciones_escritura(layout, tipado.schema))
+                writer.write_table(tipado, row_group_size=layout['filas_por_row_group'])
+                registros += lote.num_rows
+                if al_escribir is not None:
+                    al_escribir(lote)
+        finally:
+            if writer is not None:
+                writer.close()
+        return registros
     
     def parse_sql_inserts(self, sql_file):
-        """Parsear archivo SQL con INSERT statements"""
-        with open(sql_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Extraer CREATE TABLE
-        create_match = re.search(r'CREATE TABLE clientes \((.*?)\);', content, re.DOTALL)
-        if create_match:
-            columns_def = create_match.group(1)
-            columns = [col.strip().split()[0] for col in columns_def.split(',')]
-        else:
-            columns = ['codigo', 'nombre', 'apellido', 'comuna', 'rut', 'fecha_nacimiento', 'religion']
+        """Parsear archivo SQL con INSERT statements (en memoria, para archivos pequeños)"""
+        tipos = self.tipos_sql(sql_file)
+        lotes = list(self.iterar_lotes_sql(sql_file))
+        if not lotes:
+            return esquema_arrow(tipos).empty_table().to_pandas()
+        return tipar(pa.Table.from_batches(lotes), tipos).to_pandas()
+    
+    def _escribir_rango_sql(self, sql_file, inicio, fin, part_file, tipos):
+        """
+        Worker: parsear, validar (sobre el texto) y tipar un rango del dump SQL a un part file
+        (o a memoria en modo en_memoria). Retorna (registros, ResultadoValidacion, tabla o None)
+        tipos: esquema Bronze {columna: tipo lógico} leído del CREATE TABLE
+        """
+        motor = MotorValidacion(ESQUEMA_CLIENTES)
+        columnas = list(tipos)
+        if self.en_memoria:
+            lotes = list(self.iterar_lotes_sql(sql_file, inicio=inicio, fin=fin, columnas=columnas))
+            validacion = ResultadoValidacion.combinar([motor.validar(lote) for lote in lotes])
+            tabla = tipar(pa.Table.from_batches(lotes), tipos) if lotes else None
+            return (tabla.num_rows if tabla else 0), validacion, tabla
         
-        # Extraer INSERT statements
-        insert_pattern = r"INSERT INTO clientes VALUES \((.*?)\);"
-        inserts = re.findall(insert_pattern, content)
+        validaciones = []
+        registros = self.escribir_sql_parquet(
+            sql_file, part_file, inicio=inicio, fin=fin, columnas=columnas, tipos=tipos,
+            al_escribir=lambda lote: validaciones.append(motor.validar(lote))
+        )
+        return registros, ResultadoValidacion.combinar(validaciones), None
+    
+    def _salida_parte(self, tabla, part_file, registros, validacion):
+        """Escribir una parte tipada (o conservarla en memoria en modo en_memoria). Retorna (registros, validación, tabla o None)"""
+        if self.en_memoria:
+            return registros, validacion, tabla
+        escribir_tabla(tabla, part_file, layout_de_ruta('bronze', os.path.dirname(part_file)))
+        return registros, validacion, None
+    
+    def _escribir_stream_tabular(self, filepath, output_dir, lote, extension, esquema_validacion,
+                                 esquema_bronze, **opciones_csv):
+        """
+        Parsear un TXT/CSV comprimido miembro a miembro mientras un hilo lo descomprime, en
+        bloques de FILAS_POR_PARTE_STREAM filas (una parte por bloque). Retorna la lista de
+        (registros, ResultadoValidacion, tabla o None) como _procesar_rangos
+        """
+        nombres = miembros(filepath, extension)
+        if not nombres:
+            raise ValueError(f"{filepath} no contiene archivos {extension}")
+        logger.info(f"  {filepath}: descompresión en streaming ({len(nombres)} miembro(s))")
         
-        data = []
-        for insert in inserts:
-            # Limpiar y separar valores
-            values = re.findall(r"'([^']*)'|(\d+(?:-\d+)?(?:-[K\d])?)", insert)
-            row = [v[0] if v[0] else v[1] for v in values]
-            data.append(row)
+        resultados = []
+        for nombre in nombres:
+            with abrir(filepath, nombre) as stream:
+                try:
+                    bloques = pd.read_csv(stream, dtype=str, chunksize=FILAS_POR_PARTE_STREAM, **opciones_csv)
+                except pd.errors.EmptyDataError:
+                    continue
+                for df in bloques:
+                    validacion = MotorValidacion(esquema_validacion).validar(df)
+                    tabla = tipar(_tabla_texto(df), esquema_bronze)
+                    part_file = self._archivo_parte(output_dir, lote, len(resultados))
+                    resultados.append(self._salida_parte(tabla, part_file, len(df), validacion))
+        return resultados
+    
+    def _escribir_rango_txt(self, filepath, inicio, fin, part_file):
+        """
+        Worker: parsear y validar un rango del TXT a un part file (o a memoria en modo
+        en_memoria). Retorna (registros, ResultadoValidacion, tabla en memoria o None)
+        """
+        with open(filepath, 'rb') as f:
+            f.seek(inicio)
+            contenido = f.read(fin - inicio)
+        if not contenido.strip():
+            return 0, ResultadoValidacion(), None
         
-        df = pd.DataFrame(data, columns=columns)
-        return df
+        # Se lee como texto para validar los valores originales y luego se tipa
+        df = pd.read_csv(io.BytesIO(contenido), header=None, names=COLUMNAS_EXTRA, dtype=str)
+        validacion = MotorValidacion(ESQUEMA_EXTRA).validar(df)
+        tabla = tipar(_tabla_texto(df), ESQUEMA_BRONZE_EXTRA)
+        return self._salida_parte(tabla, part_file, len(df), validacion)
     
     def ingestar_txt(self, filepath='clientes_extra.txt'):
         """Ingestar archivo TXT"""
         try:
-            logging.info(f"Ingiriendo {filepath}...")
+            logger.info(f"Ingiriendo {filepath}...")
+            
+            # Parsear por rangos de líneas (en paralelo si el archivo es grande)
+            output_dir, inicio, lote = self._preparar_ingesta(
+                TABLAS_BRONZE['ingestar_txt'], filepath, esquema_arrow(ESQUEMA_BRONZE_EXTRA)
+            )
+            if inicio is None:
+                return self._sin_cambios(filepath, output_dir)
+            if es_comprimido(filepath):
+                resultados = self._escribir_stream_tabular(
+                    filepath, output_dir, lote, EXTENSIONES_METODO['ingestar_txt'], ESQUEMA_EXTRA,
+                    ESQUEMA_BRONZE_EXTRA, header=None, names=COLUMNAS_EXTRA
+                )
+                offset = os.path.getsize(filepath)
+            else:
+                rangos = self.calcular_rangos(filepath, inicio=inicio)
+                resultados = self._procesar_rangos(self._escribir_rango_txt, filepath, rangos, output_dir, lote)
+                offset = rangos[-1][1] if rangos else inicio
             
-            # Leer archivo CSV (el TXT es formato CSV)
-            df = pd.read_csv(filepath, header=None, names=[
-                'codigo', 'tipo_servicio', 'codigo_unico', 'fecha_afiliacion'
-            ])
+            registros = sum(n for n, _, _ in resultados)
             
             # Validar campos
-            errores = self.validar_campos_extra(df)
+            validacion = ResultadoValidacion.combinar([v for _, v, _ in resultados])
+            errores = validacion.errores()
             if errores:
-                logging.warning(f"Validaciones fallidas en {filepath}: {errores}")
+                logger.warning(f"Validaciones fallidas en {filepath}: {errores}")
                 self.stats['errores'].extend(errores)
             
-            # Guardar en Bronze
-            output_file = os.path.join(self.output_path, 'clientes_extra_bronze.parquet')
-            df.to_parquet(output_file, index=False)
+            tablas = [t for _, _, t in resultados] if self.en_memoria else None
+            self._registrar_estado(
+                TABLAS_BRONZE['ingestar_txt'], filepath, output_dir, lote, 'codigo', offset, tablas
+            )
             
-            logging.info(f"✓ {filepath} ingresado: {len(df)} registros")
+            logger.info(f"✓ {filepath} ingresado: {registros} registros")
             self.stats['archivos_procesados'].append(filepath)
-            self.stats['registros_totales'] += len(df)
-            
-            return df
+            self.stats['registros_totales'] += registros
+            self._registrar_fuente(filepath, registros, validacion)
             
+            return self._resultado(output_dir, lote, tablas)
+        
         except Exception as e:
             error_msg = f"Error ingiriendo {filepath}: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             self.stats['errores'].append(error_msg)
             return None
     
     def ingestar_csv(self, filepath='clientes_info.csv'):
         """Ingestar archivo CSV"""
         try:
-            logging.info(f"Ingiriendo {filepath}...")
+            logger.info(f"Ingiriendo {filepath}...")
+            
+            output_dir, inicio, lote = self._preparar_ingesta(
+                TABLAS_BRONZE['ingestar_csv'], filepath, esquema_arrow(ESQUEMA_BRONZE_INFO)
+            )
+            if inicio is None:
+                return self._sin_cambios(filepath, output_dir)
             
-            # Leer archivo CSV
-            df = pd.read_csv(filepath)
+            # Leer archivo CSV como texto (en modo incremental solo la cola)
+            offset = os.path.getsize(filepath)
+            if es_comprimido(filepath):
+                resultados = self._escribir_stream_tabular(
+                    filepath, output_dir, lote, EXTENSIONES_METODO['ingestar_csv'], ESQUEMA_INFO, ESQUEMA_BRONZE_INFO
+                )
+            else:
+                if inicio == 0:
+                    df = pd.read_csv(filepath, dtype=str)
+                else:
+                    columnas = pd.read_csv(filepath, nrows=0).columns.tolist()
+                    with open(filepath, 'rb') as f:
+                        f.seek(inicio)
+                        contenido = f.read()
+                    offset = inicio + len(contenido)
+                    if contenido.strip():
+                        df = pd.read_csv(io.BytesIO(contenido), header=None, names=columnas, dtype=str)
+                    else:
+                        df = pd.DataFrame(columns=columnas)
+                
+                # Guardar en Bronze (o entregar en memoria)
+                # (un único part: el CSV puede tener campos entre comillas con saltos de línea)
+                resultados = [self._salida_parte(
+                    tipar(_tabla_texto(df), ESQUEMA_BRONZE_INFO), self._archivo_parte(output_dir, lote, 0),
+                    len(df), MotorValidacion(ESQUEMA_INFO).validar(df)
+                )]
+            registros = sum(n for n, _, _ in resultados)
             
             # Validar campos
-            errores = self.validar_campos_info(df)
+            validacion = ResultadoValidacion.combinar([v for _, v, _ in resultados])
+            errores = validacion.errores()
             if errores:
-                logging.warning(f"Validaciones fallidas en {filepath}: {errores}")
+                logger.warning(f"Validaciones fallidas en {filepath}: {errores}")
                 self.stats['errores'].extend(errores)
             
-            # Guardar en Bronze
-            output_file = os.path.join(self.output_path, 'clientes_info_bronze.parquet')
-            df.to_parquet(output_file, index=False)
+            tablas = [t for _, _, t in resultados] if self.en_memoria else None
+            self._registrar_estado(
+                TABLAS_BRONZE['ingestar_csv'], filepath, output_dir, lote, 'codigo_cliente', offset, tablas
+            )
             
-            logging.info(f"✓ {filepath} ingresado: {len(df)} registros")
+            logger.info(f"✓ {filepath} ingresado: {registros} registros")
             self.stats['archivos_procesados'].append(filepath)
-            self.stats['registros_totales'] += len(df)
-            
-            return df
+            self.stats['registros_totales'] += registros
+            self._registrar_fuente(filepath, registros, validacion)
             
+            return self._resultado(output_dir, lote, tablas)
+        
         except Exception as e:
             error_msg = f"Error ingiriendo {filepath}: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             self.stats['errores'].append(error_msg)
             return None
     
     def ingestar_sql(self, filepath='clientes.sql'):
         """Ingestar archivo SQL"""
         try:
-            logging.info(f"Ingiriendo {filepath}...")
+            logger.info(f"Ingiriendo {filepath}...")
             
-            # Parsear SQL
-            df = self.parse_sql_inserts(filepath)
+            # Parsear SQL en streaming directo a Parquet, un part file por rango
+            tipos = self.tipos_sql(filepath)
+            output_dir, inicio, lote = self._preparar_ingesta(
+                TABLAS_BRONZE['ingestar_sql'], filepath, esquema_arrow(tipos)
+            )
+            if inicio is None:
+                return self._sin_cambios(filepath, output_dir)
+            # Un comprimido se parsea entero en un solo stream (fin=None: hasta el final)
+            if es_comprimido(filepath):
+                logger.info(f"  {filepath}: descompresión en streaming")
+                rangos = [(0, None)]
+            else:
+                rangos = self.calcular_rangos(filepath, es_sql=True, inicio=inicio)
+            resultados = self._procesar_rangos(
+                self._escribir_rango_sql, filepath, rangos, output_dir, lote, tipos
+            )
+            registros = sum(n for n, _, _ in resultados)
             
             # Validaciones básicas
-            if df.empty:
+            if registros == 0 and inicio == 0:
                 raise ValueError("No se pudieron extraer datos del SQL")
+            validacion = ResultadoValidacion.combinar([v for _, v, _ in resultados])
+            errores = validacion.errores()
+            if errores:
+                logger.warning(f"Validaciones fallidas en {filepath}: {errores}")
+                self.stats['errores'].extend(errores)
+            offset = os.path.getsize(filepath) if es_comprimido(filepath) else (rangos[-1][1] if rangos else inicio)
+            tablas = [t for _, _, t in resultados] if self.en_memoria else None
+            self._registrar_estado(TABLAS_BRONZE['ingestar_sql'], filepath, output_dir, lote, 'codigo', offset, tablas)
             
-            # Guardar en Bronze
-            output_file = os.path.join(self.output_path, 'clientes_bronze.parquet')
-            df.to_parquet(output_file, index=False)
+            # Referencia perezosa al Parquet (no se carga el dump completo en memoria)
+            # salvo en modo en_memoria, donde el lote ya parseado se entrega a Silver
+            df = self._resultado(output_dir, lote, tablas)
             
-            logging.info(f"✓ {filepath} ingresado: {len(df)} registros")
+            logger.info(f"✓ {filepath} ingresado: {registros} registros")
             self.stats['archivos_procesados'].append(filepath)
-            self.stats['registros_totales'] += len(df)
+            self.stats['registros_totales'] += registros
+            self._registrar_fuente(filepath, registros, validacion)
             
             return df
-            
+        
         except Exception as e:
             error_msg = f"Error ingiriendo {filepath}: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             self.stats['errores'].append(error_msg)
             return None
     
-    def ejecutar_ingesta(self):
-        """Ejecutar proceso completo de ingesta"""
-        logging.info("=== Iniciando Ingesta Bronze Layer ===")
+    def _ingestar_fuente(self, metodo, filepath):
+        """Ejecutar la ingesta de una fuente registrada"""
+        if isinstance(metodo, str):
+            return getattr(self, metodo)(filepath)
+        return metodo(self, filepath)
+    
+    def _fusionar_stats(self, stats):
+        """Acumular las estadísticas de una fuente ingerida en otro proceso"""
+        self.stats['archivos_procesados'].extend(stats['archivos_procesados'])
+        self.stats['registros_totales'] += stats['registros_totales']
+        self.stats['errores'].extend(stats['errores'])
+        self.stats['fuentes'].update(stats.get('fuentes', {}))
+    
+    def _guardar_estado(self):
+        """Persistir el estado incremental junto a ingesta_stats.json"""
+        if not self.estado_nuevo:
+            return
+        self.estado.update(self.estado_nuevo)
+        with open(self.estado_file, 'w') as f:
+            json.dump(self.estado, f, indent=2)
+    
+    def tamano_fuentes(self):
+        """Bytes totales (descomprimidos) de los archivos fuente registrados (estimación previa del volumen)"""
+        return sum(
+            tamano_descomprimido(filepath) if es_comprimido(filepath) else os.path.getsize(filepath)
+            for _, filepath in self.fuentes.values() if os.path.exists(filepath)
+        )
+    
+    def _clave_cache(self, nombre):
+        """Clave de cache de una fuente: contenido del archivo + lotes anexados + método + versión del código"""
+        metodo, filepath = self.fuentes[nombre]
+        if self.cache is None or not isinstance(metodo, str) or not os.path.exists(filepath):
+            return None
+        return self.cache.clave(
+            'bronze', nombre, metodo, self.output_path, self.cache.huella_archivo(filepath),
+            self.estado.get(TABLAS_BRONZE.get(metodo), {}).get('anexados', 0),
+            self.cache.version_codigo(
+                'ingesta_bronze.py', 'validacion.py', 'layout_parquet.py', 'esquemas_bronze.py', 'motor_arrow.py'
+            )
+        )
+    
+    def _desde_cache(self, nombre, clave):
+        """Resultado de una fuente ya ingerida con la misma clave (None si no está en cache)"""
+        metadatos = self.cache.buscar('bronze', clave) if clave else None
+        if metadatos is None:
+            return None
+        with _LOCK_FUSION:
+            self.stats['archivos_procesados'].append(self.fuentes[nombre][1])
+            self.estado_nuevo[metadatos['tabla']] = metadatos['estado']
+        return ds.dataset(metadatos['salida'], format='parquet')
+    
+    def _guardar_en_cache(self, clave, estado):
+        """Registrar la salida recién ingerida (tras persistirla, en modo en_memoria)"""
+        if not clave or not estado:
+            return
+        tabla, entrada = next(iter(estado.items()))
+        salida = os.path.join(self.output_path, tabla)
+        metadatos = {'tabla': tabla, 'salida': salida, 'estado': entrada}
+        if self.en_memoria:
+            self.cache.marcar_actual(salida, clave)
+            self.pendientes_cache.append((clave, salida, metadatos))
+        else:
+            self.cache.guardar('bronze', clave, salida, metadatos)
+    
+    def _ingestar(self, nombre, pool=None):
+        """
+        Ingestar una fuente registrada con estado propio (en el pool de procesos si se da) y
+        acumular sus estadísticas. Se puede llamar desde varios hilos a la vez. Retorna None si falla
+        Cada fuente es un span 'bronze' con la CPU y el RSS pico medidos en el proceso que la ingiere
+        """
+        metodo, filepath = self.fuentes[nombre]
+        os.makedirs(self.output_path, exist_ok=True)
+        with self.trazador.span('bronze', tabla=nombre, archivo=filepath) as span:
+            inicio = time.time()
+            try:
+                clave = self._clave_cache(nombre)
+                resultado = self._desde_cache(nombre, clave)
+                if resultado is not None:
+                    span.etiquetar(modo='cache')
+                    return resultado
+                
+                argumentos = (self.output_path, self.workers_por_archivo, self.tamano_rango,
+                              self.incremental, self.en_memoria, self.anexar, metodo, filepath)
+                if pool is not None:
+                    resultado, stats, estado, recursos = pool.submit(_ingestar_fuente_aislada, *argumentos).result()
+                else:
+                    resultado, stats, estado, recursos = _ingestar_fuente_aislada(*argumentos)
+            except Exception as e:
+                # Un worker caído no debe afectar al resto de fuentes
+                error_msg = f"Error ingiriendo {filepath}: {str(e)}"
+                logger.error(error_msg)
+                with _LOCK_FUSION:
+                    self.stats['errores'].append(error_msg)
+                span.fallar(e)
+                return None
+            
+            with _LOCK_FUSION:
+                self._fusionar_stats(stats)
+                self.estado_nuevo.update(estado)
+            if resultado is None:
+                span.fallar(stats['errores'][-1] if stats['errores'] else 'sin resultado')
+            else:
+                self._guardar_en_cache(clave, estado)
+            
+            fuente = stats['fuentes'].get(filepath, {})
+            span.etiquetar(modo='en_memoria' if self.en_memoria else 'disco')
+            span.registrar(
+                filas_entrada=fuente.get('registros'), filas_salida=fuente.get('registros'),
+                invalidos=fuente.get('invalidos'), bytes_leidos=fuente.get('bytes_leidos'),
+                bytes_escritos=sum(
+                    bytes_escritos_desde(os.path.join(self.output_path, tabla), inicio) for tabla in estado
+                ),
+                **recursos
+            )
+            return resultado
+    
+    def ingestar_fuente(self, nombre, pool=None):
+        """
+        Ingestar una fuente (ver _ingestar). Lanza excepción si falla, para que el llamador pueda
+        reintentar. En modo en_memoria su Bronze empieza a escribirse en cuanto termina
+        """
+        resultado = self._ingestar(nombre, pool)
+        if resultado is None:
+            raise Exception(f"Error en ingesta de {self.fuentes[nombre][1]}")
+        return self.persistir_fuente(nombre, resultado)
+    
+    def persistir_fuente(self, nombre, resultado):
+        """
+        Encolar la escritura en segundo plano del lote en memoria de una fuente (una vez por
+        fuente; los resultados que no son EntregaBronze ya están en disco). Retorna el resultado
+        """
+        # Las fuentes terminan en hilos distintos del planificador
+        with _LOCK_FUSION:
+            if isinstance(resultado, EntregaBronze) and nombre not in self.persistencias:
+                if self.escritor is None:
+                    self.escritor = ThreadPoolExecutor(max_workers=1)
+                self.persistencias[nombre] = self.escritor.submit(self._persistir, nombre, resultado)
+        return resultado
+    
+    def _ingestar_en_paralelo(self, max_workers=None):
+        """Ingestar las fuentes registradas en un pool de procesos (un hilo por fuente espera su resultado)"""
+        max_workers = max_workers or min(len(self.fuentes), os.cpu_count() or 1)
+        logger.info(f"Modo paralelo: {len(self.fuentes)} fuentes, {max_workers} workers")
+        
+        with ProcessPoolExecutor(max_workers=max_workers) as pool, \
+                ThreadPoolExecutor(max_workers=len(self.fuentes)) as hilos:
+            futuros = {nombre: hilos.submit(self._ingestar, nombre, pool) for nombre in self.fuentes}
+            return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+    
+    def ejecutar_ingesta(self, paralelo=False, max_workers=None):
+        """
+        Ejecutar proceso completo de ingesta
+        paralelo: ingestar las fuentes en procesos independientes (max_workers por defecto
+                  = número de fuentes, acotado por los cores disponibles)
+        """
+        logger.info("=== Iniciando Ingesta Bronze Layer ===")
         
         # Crear directorio de salida
         os.makedirs(self.output_path, exist_ok=True)
         os.makedirs('logs', exist_ok=True)
         
         # Ingestar archivos
-        df_extra = self.ingestar_txt()
-        df_info = self.ingestar_csv()
-        df_clientes = self.ingestar_sql()
+        if paralelo:
+            resultados = self._ingestar_en_paralelo(max_workers)
+        else:
+            resultados = {nombre: self._ingestar(nombre) for nombre in self.fuentes}
         
-        # Guardar estadísticas
+        # Guardar estadísticas y estado
+        self.finalizar_ingesta(resultados)
+        return resultados
+    
+    def finalizar_ingesta(self, resultados):
+        """Guardar ingesta_stats.json y el estado incremental (tras persistir Bronze en modo en_memoria)"""
+        os.makedirs(self.output_path, exist_ok=True)
+        # Las fuentes terminan en cualquier orden: ordenar por registro para que el archivo sea determinista
+        orden = [filepath for _, filepath in self.fuentes.values()]
+        self.stats['archivos_procesados'].sort(key=lambda f: orden.index(f) if f in orden else len(orden))
+        self.stats['fuentes'] = dict(sorted(
+            self.stats['fuentes'].items(), key=lambda f: orden.index(f[0]) if f[0] in orden else len(orden)
+        ))
         stats_file = os.path.join(self.output_path, 'ingesta_stats.json')
         with open(stats_file, 'w') as f:
             json.dump(self.stats, f, indent=2)
         
-        logging.info(f"\n=== Resumen de Ingesta ===")
-        logging.info(f"Archivos procesados: {len(self.stats['archivos_procesados'])}")
-        logging.info(f"Registros totales: {self.stats['registros_totales']}")
-        logging.info(f"Errores: {len(self.stats['errores'])}")
+        # En modo en_memoria el estado se guarda cuando los part files ya están escritos. Las
+        # fuentes ingeridas con ingestar_fuente ya se están escribiendo; el cierre va detrás en la
+        # cola del mismo hilo
+        if self.en_memoria:
+            for nombre, resultado in resultados.items():
+                self.persistir_fuente(nombre, resultado)
+            if self.escritor is None:
+                self.escritor = ThreadPoolExecutor(max_workers=1)
+            self.persistencia = self.escritor.submit(self._cerrar_persistencia)
+            self.escritor.shutdown(wait=False)
+            self.escritor = None
+        else:
+            self._guardar_estado()
         
-        return {
-            'extra': df_extra,
-            'info': df_info,
-            'clientes': df_clientes
-        }
+        logger.info(f"\n=== Resumen de Ingesta ===")
+        logger.info(f"Archivos procesados: {len(self.stats['archivos_procesados'])}")
+        logger.info(f"Registros totales: {self.stats['registros_totales']}")
+        logger.info(f"Errores: {len(self.stats['errores'])}")
+    
+    def _persistir(self, nombre, entrega):
+        """Escribir en segundo plano el lote entregado en memoria de una fuente"""
+        with self.trazador.span('bronze_persistencia', tabla=nombre) as span:
+            inicio = time.time()
+            entrega.persistir()
+            span.registrar(filas_salida=entrega.num_rows,
+                           bytes_escritos=bytes_escritos_desde(entrega.output_dir, inicio))
+        return len(entrega.partes)
+    
+    def _cerrar_persistencia(self):
+        """Tras escribir todos los lotes: estado incremental y entradas de cache (propaga errores de escritura)"""
+        partes = sum(futuro.result() for futuro in self.persistencias.values())
+        self._guardar_estado()
+        for clave, salida, metadatos in self.pendientes_cache:
+            self.cache.guardar('bronze', clave, salida, metadatos)
+        self.pendientes_cache = []
+        logger.info(f"✓ Bronze persistido: {partes} part files")
+    
+    def esperar_persistencia(self):
+        """Bloquear hasta que Bronze esté escrito en disco (propaga errores de la escritura)"""
+        if self.persistencia is not None:
+            self.persistencia.result()
+
 
+def _ingestar_fuente_aislada(output_path, workers_por_archivo, tamano_rango, incremental, en_memoria, anexar,
+                             metodo, filepath):
+    """
+    Worker del pool: ingesta una fuente con estadísticas y estado propios y los devuelve al proceso
+    padre, junto con la CPU y el RSS pico del proceso (y sus workers de rangos) durante la ingesta
+    """
+    ingesta = IngestaBronze(output_path, workers_por_archivo, tamano_rango, incremental, en_memoria,
+                            anexar=anexar)
+    cpu_inicio = cpu_proceso()
+    with MuestreadorRSS() as muestreador:
+        resultado = ingesta._ingestar_fuente(metodo, filepath)
+    recursos = {'cpu_segundos': round(cpu_proceso() - cpu_inicio, 4), 'rss_pico_bytes': muestreador.pico}
+    return resultado, ingesta.stats, ingesta.estado_nuevo, recursos
 
 if __name__ == "__main__":
     ingesta = IngestaBronze()
@@ -0,0 +1,308 @@
+"""
+Ingesta Streaming - Proyecto LIDL
+Vigila un directorio de aterrizaje (landing) y anexa cada archivo delta nuevo a Bronze como
+un lote, con un manifiesto de archivos procesados para ingerir cada uno exactamente una vez,
+y limpia en Silver solo las partes nuevas
+"""
+
+import os
+import json
+import shutil
+import signal
+import hashlib
+import fnmatch
+import threading
+from datetime import datetime
+
+from ingesta_bronze import IngestaBronze, TABLAS_BRONZE
+from archivos_comprimidos import miembros, nombre_contenido, tamano_descomprimido
+from limpieza_silver import LimpiezaSilver
+from reglas_silver import TABLAS_SILVER
+from observabilidad import Trazador, obtener_logger
+
+logger = obtener_logger('ingesta_streaming')
+
+DIRECTORIO_LANDING = 'landing'
+INTERVALO_SONDEO = 5.0  # segundos entre revisiones del landing
+ESPERA_ESTABLE = 2.0  # segundos sin modificarse antes de dar un archivo por completo
+TAMANO_BLOQUE_HASH = 8 * 1024 * 1024
+
+# Ruteo por patrón de nombre (fnmatch, sin distinguir mayúsculas): gana el primero que coincide.
+# Los comprimidos se rutean por su contenido: clientes_info_0101.csv.gz o un .zip con CSVs -> info
+RUTAS_LANDING = [
+    ('clientes_extra*.txt', 'extra', 'ingestar_txt'),
+    ('clientes_info*.csv', 'info', 'ingestar_csv'),
+    ('clientes*.sql', 'clientes', 'ingestar_sql')
+]
+
+# Subdirectorios del landing adonde se mueven los archivos ya tratados
+PROCESADOS = 'procesados'
+RECHAZADOS = 'rechazados'
+
+# Los archivos que se están copiando al landing deben llegar con otro nombre y renombrarse
+_EXTENSIONES_TEMPORALES = ('.tmp', '.part', '.crdownload')
+
+METRICAS_PROMETHEUS_STREAMING = 'logs/metricas_streaming.prom'
+
+
+def rutear(nombre):
+    """(fuente, método de ingesta) de un archivo según RUTAS_LANDING, o None si no coincide"""
+    for patron, fuente, metodo in RUTAS_LANDING:
+        if fnmatch.fnmatch(nombre.lower(), patron):
+            return fuente, metodo
+    return None
+
+
+def rutear_archivo(ruta):
+    """
+    Ruteo de un archivo del landing. Un .zip solo si todos sus miembros van a la misma fuente;
+    un miembro que no coincide por sí mismo se rutea con el nombre del zip (ventas_0101.zip con
+    parte1.csv cuenta como ventas_0101.csv)
+    """
+    if ruta.lower().endswith('.zip'):
+        base = os.path.splitext(os.path.basename(ruta))[0]
+        ruteos = {
+            rutear(os.path.basename(miembro)) or rutear(base + os.path.splitext(miembro)[1])
+            for miembro in miembros(ruta)
+        }
+        return ruteos.pop() if len(ruteos) == 1 else None
+    return rutear(nombre_contenido(ruta))
+
+
+def huella_contenido(ruta):
+    """SHA-256 del contenido: el mismo archivo con otro nombre no se ingiere dos veces"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class IngestaStreaming:
+    """
+    Cada ciclo toma los archivos estables del landing, anexa cada uno a su dataset Bronze
+    como un lote y limpia en Silver (merge incremental) las tablas que recibieron datos.
+    Manifiesto (bronze/ventas/streaming_manifiesto.json): {huella: entrada} con estado
+      pendiente:  el lote se está escribiendo; si el proceso muere se borran sus partes
+                  (lote > lote_previo) y el archivo, que sigue en el landing, se reintenta
+      bronze:     lote escrito y archivo movido a procesados; falta Silver
+      completado: Silver limpió el lote
+    """
+    
+    def __init__(self, landing=DIRECTORIO_LANDING, bronze_path='bronze/ventas', silver_path='silver/ventas',
+                 intervalo=INTERVALO_SONDEO, espera_estable=ESPERA_ESTABLE, motor='auto', sesion=None):
+        self.landing = landing
+        self.bronze_path = bronze_path
+        self.silver_path = silver_path
+        self.intervalo = intervalo
+        self.espera_estable = espera_estable
+        self.motor = motor
+        # sesion: SparkSession de larga duración (ver servicio_workflow) si Silver usa Spark
+        self.sesion = sesion
+        self.manifiesto_file = os.path.join(self.bronze_path, 'streaming_manifiesto.json')
+        self.manifiesto = self._cargar_manifiesto()
+        self._detener = threading.Event()
+    
+    def _cargar_manifiesto(self):
+        if not os.path.exists(self.manifiesto_file):
+            return {}
+        with open(self.manifiesto_file) as f:
+            return json.load(f)
+    
+    def _guardar_manifiesto(self):
+        """Escritura atómica: un corte a mitad nunca deja el manifiesto corrupto"""
+        os.makedirs(self.bronze_path, exist_ok=True)
+        temporal = f"{self.manifiesto_file}.tmp"
+        with open(temporal, 'w') as f:
+            json.dump(self.manifiesto, f, indent=2)
+        os.replace(temporal, self.manifiesto_file)
+    
+    def _mover(self, ruta, destino):
+        """Mover un archivo del landing a <landing>/<destino>/<fecha>/"""
+        directorio = os.path.join(self.landing, destino, datetime.now().strftime('%Y-%m-%d'))
+        os.makedirs(directorio, exist_ok=True)
+        shutil.move(ruta, os.path.join(directorio, os.path.basename(ruta)))
+    
+    def recuperar(self):
+        """Deshacer los lotes que quedaron a medias (entradas 'pendiente') de una ejecución caída"""
+        ingesta = IngestaBronze(output_path=self.bronze_path)
+        for huella, entrada in list(self.manifiesto.items()):
+            if entrada['estado'] != 'pendiente':
+                continue
+            logger.warning(f"  {entrada['archivo']}: lote interrumpido, se descarta y se reintenta")
+            ingesta.descartar_lotes(entrada['tabla'], entrada['lote_previo'])
+            del self.manifiesto[huella]
+        self._guardar_manifiesto()
+    
+    def archivos_nuevos(self):
+        """
+        Archivos completos del landing, en orden de llegada (mtime), con su ruteo. Los que no
+        coinciden con ningún patrón se mueven a rechazados
+        """
+        if not os.path.isdir(self.landing):
+            return []
+        ahora = datetime.now().timestamp()
+        nuevos = []
+        for nombre in os.listdir(self.landing):
+            ruta = os.path.join(self.landing, nombre)
+            if not os.path.isfile(ruta) or nombre.startswith('.') or nombre.endswith(_EXTENSIONES_TEMPORALES):
+                continue
+            if ahora - os.path.getmtime(ruta) < self.espera_estable:
+                continue
+            try:
+                ruteo = rutear_archivo(ruta)
+            except Exception as e:
+                logger.warning(f"  {nombre}: no se puede leer ({e})")
+                ruteo = None
+            if ruteo is None:
+                logger.warning(f"  {nombre}: sin ruta (ningún patrón coincide o el zip mezcla fuentes), se mueve a {RECHAZADOS}/")
+                self._mover(ruta, RECHAZADOS)
+                continue
+            nuevos.append((ruta, *ruteo))
+        return sorted(nuevos, key=lambda nuevo: (os.path.getmtime(nuevo[0]), nuevo[0]))
+    
+    def _ingestar_archivo(self, ingesta, ruta, fuente, metodo):
+        """
+        Anexar un archivo a Bronze. Retorna la entrada del manifiesto, o None si el archivo ya
+        se había ingerido (mismo contenido) o falló
+        """
+        nombre = os.path.basename(ruta)
+        huella = huella_contenido(ruta)
+        previa = self.manifiesto.get(huella)
+        if previa is not None:
+            logger.info(f"  {nombre}: ya ingerido como {previa['archivo']} (lote {previa.get('lote')}), se omite")
+            self._mover(ruta, PROCESADOS)
+            return None
+        
+        # La entrada se registra antes de escribir: si el proceso muere, recuperar() sabe qué borrar
+        tabla = TABLAS_BRONZE[metodo]
+        entrada = {
+            'archivo': nombre,
+            'fuente': fuente,
+            'tabla': tabla,
+            'lote_previo': ingesta.ultimo_lote(tabla),
+            'estado': 'pendiente',
+            'recibido': datetime.now().isoformat()
+        }
+        self.manifiesto[huella] = entrada
+        self._guardar_manifiesto()
+        
+        try:
+            ingesta.registrar_fuente(fuente, metodo, ruta)
+            ingesta.ingestar_fuente(fuente)
+            ingesta._guardar_estado()
+        except Exception as e:
+            logger.error(f"❌ {nombre}: {e}; se mueve a {RECHAZADOS}/")
+            ingesta.descartar_lotes(tabla, entrada['lote_previo'])
+            del self.manifiesto[huella]
+            self._guardar_manifiesto()
+            self._mover(ruta, RECHAZADOS)
+            return None
+        
+        fuente_stats = ingesta.stats['fuentes'].get(ruta, {})
+        entrada.update({
+            'estado': 'bronze',
+            'lote': ingesta.ultimo_lote(tabla),
+            'registros': fuente_stats.get('registros', 0),
+            'invalidos': fuente_stats.get('invalidos', {}),
+            'ingerido': datetime.now().isoformat()
+        })
+        self._guardar_manifiesto()
+        self._mover(ruta, PROCESADOS)
+        return entrada
+    
+    def _limpiar(self, fuentes, trazador, tamano_estimado):
+        """Merge en Silver de las partes nuevas de cada fuente; las que fallen se reintentan en el siguiente ciclo"""
+        limpieza = LimpiezaSilver(input_path=self.bronze_path, output_path=self.silver_path, incremental=True,
+                                  motor=self.motor, trazador=trazador, sesion=self.sesion)
+        limpieza.iniciar(tamano_estimado=tamano_estimado)
+        try:
+            for fuente in fuentes:
+                try:
+                    stats = limpieza.limpiar_tabla(fuente)
+                except Exception as e:
+                    logger.error(f"❌ Silver {fuente}: {e} (se reintenta en el siguiente ciclo)")
+                    continue
+                for entrada in self.manifiesto.values():
+                    if entrada['fuente'] == fuente and entrada['estado'] == 'bronze':
+                        entrada.update({
+                            'estado': 'completado',
+                            'limpiado': datetime.now().isoformat(),
+                            'silver': {'modo': stats.get('modo'), 'descartes': stats.get('descartes', {})}
+                        })
+                self._guardar_manifiesto()
+        finally:
+            limpieza.detener()
+    
+    def procesar_ciclo(self):
+        """
+        Un micro-lote: ingerir los archivos nuevos y limpiar en Silver las fuentes con lotes
+        sin limpiar (los de este ciclo y los de ciclos cuyo Silver falló). Retorna el resumen
+        del ciclo, o None si no había nada que hacer
+        """
+        nuevos = self.archivos_nuevos()
+        pendientes = any(entrada['estado'] == 'bronze' for entrada in self.manifiesto.values())
+        if not nuevos and not pendientes:
+            return None
+        
+        trazador = Trazador(prometheus_file=METRICAS_PROMETHEUS_STREAMING)
+        try:
+            with trazador.span('streaming', archivos=len(nuevos)) as span:
+                # Antes de ingerir: después los archivos ya están en procesados/
+                tamano = sum(tamano_descomprimido(ruta) for ruta, _, _ in nuevos)
+                ingesta = IngestaBronze(output_path=self.bronze_path, anexar=True, trazador=trazador)
+                ingeridos = [
+                    entrada for entrada in (self._ingestar_archivo(ingesta, *nuevo) for nuevo in nuevos)
+                    if entrada is not None
+                ]
+                
+                fuentes = {entrada['fuente'] for entrada in self.manifiesto.values() if entrada['estado'] == 'bronze'}
+                if fuentes:
+                    self._limpiar([fuente for fuente in TABLAS_SILVER if fuente in fuentes], trazador, tamano)
+                
+                resumen = {
+                    'archivos': len(nuevos),
+                    'ingeridos': len(ingeridos),
+                    'registros': sum(entrada['registros'] for entrada in ingeridos),
+                    'completados': sum(entrada['estado'] == 'completado' for entrada in ingeridos),
+                    'pendientes_silver': sorted(
+                        {e['fuente'] for e in self.manifiesto.values() if e['estado'] == 'bronze'}
+                    )
+                }
+                span.registrar(filas_salida=resumen['registros'], archivos_ingeridos=resumen['ingeridos'])
+        finally:
+            trazador.exportar()
+        
+        logger.info(
+            f"✓ Ciclo streaming: {resumen['ingeridos']}/{resumen['archivos']} archivos, "
+            f"{resumen['registros']} registros"
+        )
+        return resumen
+    
+    def detener(self, *_):
+        """Terminar tras el ciclo en curso (también con SIGTERM / SIGINT)"""
+        logger.info("🛑 Parada solicitada: se termina el ciclo en curso")
+        self._detener.set()
+    
+    def ejecutar_streaming(self, max_ciclos=None):
+        """Revisar el landing cada `intervalo` segundos hasta detener() (o max_ciclos ciclos con trabajo)"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.detener)
+            signal.signal(signal.SIGINT, self.detener)
+        
+        os.makedirs(self.landing, exist_ok=True)
+        logger.info("="*60)
+        logger.info(f"📡 INGESTA STREAMING LIDL - vigilando {self.landing}/")
+        logger.info("="*60)
+        self.recuperar()
+        
+        ciclos = 0
+        while not self._detener.is_set():
+            if max_ciclos is not None and ciclos >= max_ciclos:
+                break
+            if self.procesar_ciclo() is not None:
+                ciclos += 1
+                continue
+            self._detener.wait(self.intervalo)
+        logger.info(f"✓ Streaming detenido ({ciclos} ciclos con archivos)")
+        return ciclos
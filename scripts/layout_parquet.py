@@ -0,0 +1,178 @@
+"""
+Layout Parquet - Proyecto LIDL
+Disposición física de los archivos Bronze y Silver (particiones, orden, tamaño de
+archivos y row groups, diccionario y compresión), común a pyarrow y Spark
+"""
+
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Valores por defecto de cualquier tabla. Por tabla (nombre base, p.ej. 'clientes_info'):
+#   particiones:         {columna: ('anio', columna_origen)} particiones derivadas; solo Silver,
+#                        debajo de rango_codigo (Bronze conserva sus part files por lote)
+#   orden:               columnas por las que se ordenan las filas de cada archivo (min/max
+#                        por row group útiles para saltar datos al filtrar)
+#   filas_por_archivo:   máximo de filas por archivo; también el criterio de compactación
+#   filas_por_row_group: filas por row group (pyarrow)
+#   mb_por_row_group:    tamaño de row group en MB (Spark/parquet-mr lo mide en bytes)
+#   diccionario:         columnas con dictionary encoding; el resto va en plain
+#   compresion:          'zstd' | 'snappy' | 'gzip' | 'lz4' | 'none'
+LAYOUT_DEFAULT = {
+    'particiones': {},
+    'orden': [],
+    'filas_por_archivo': 5_000_000,
+    'filas_por_row_group': 256_000,
+    'mb_por_row_group': 64,
+    'diccionario': [],
+    'compresion': 'zstd'
+}
+
+LAYOUT_BRONZE = {
+    'clientes': {'orden': ['codigo'], 'diccionario': ['comuna', 'religion']},
+    'clientes_info': {'orden': ['codigo_cliente'], 'diccionario': ['tarjeta_beneficios', 'tipo_cliente']},
+    'clientes_extra': {'orden': ['codigo'], 'diccionario': ['tipo_servicio']}
+}
+
+LAYOUT_SILVER = {
+    'clientes': {'orden': ['codigo'], 'diccionario': ['comuna', 'religion']},
+    'clientes_info': {
+        'orden': ['codigo_cliente'],
+        'diccionario': ['tarjeta_beneficios', 'tipo_cliente', 'tipo_alimentacion']
+    },
+    'clientes_extra': {
+        'particiones': {'anio_afiliacion': ('anio', 'fecha_afiliacion')},
+        'orden': ['codigo'],
+        'diccionario': ['tipo_servicio']
+    }
+}
+
+_LAYOUTS = {'bronze': LAYOUT_BRONZE, 'silver': LAYOUT_SILVER}
+
+
+def obtener_layout(capa, tabla):
+    """Layout completo de una tabla ('bronze' | 'silver'): el de la tabla sobre LAYOUT_DEFAULT"""
+    return {**LAYOUT_DEFAULT, **_LAYOUTS[capa].get(tabla, {})}
+
+
+def layout_de_ruta(capa, ruta):
+    """Layout a partir de la ruta del dataset (.../clientes_info_bronze.parquet)"""
+    tabla = os.path.basename(os.path.normpath(ruta)).replace(f'_{capa}.parquet', '')
+    return obtener_layout(capa, tabla)
+
+
+def columnas_derivadas():
+    """Columnas de partición derivadas de cualquier tabla Silver (no son datos de negocio)"""
+    return sorted({c for layout in LAYOUT_SILVER.values() for c in layout.get('particiones', {})})
+
+
+def _compresion(layout):
+    return None if layout['compresion'] == 'none' else layout['compresion']
+
+
+def opciones_escritura(layout, schema):
+    """kwargs para pq.write_table / pq.ParquetWriter"""
+    return {
+        'compression': _compresion(layout),
+        'use_dictionary': [c for c in layout['diccionario'] if c in schema.names]
+    }
+
+
+def opciones_dataset(layout, schema):
+    """kwargs para ds.write_dataset (formato, archivos y row groups)"""
+    filas_grupo = min(layout['filas_por_row_group'], layout['filas_por_archivo'])
+    return {
+        'format': 'parquet',
+        'file_options': ds.ParquetFileFormat().make_write_options(**opciones_escritura(layout, schema)),
+        'max_rows_per_file': layout['filas_por_archivo'],
+        'max_rows_per_group': filas_grupo,
+        'min_rows_per_group': filas_grupo
+    }
+
+
+def opciones_spark(layout, columnas):
+    """Opciones del writer Parquet de Spark (diccionario por columna vía parquet-mr)"""
+    opciones = {
+        'compression': layout['compresion'],
+        'maxRecordsPerFile': str(layout['filas_por_archivo']),
+        'parquet.block.size': str(layout['mb_por_row_group'] * 1024 * 1024),
+        'parquet.enable.dictionary': 'false'
+    }
+    for columna in layout['diccionario']:
+        if columna in columnas:
+            opciones[f'parquet.enable.dictionary#{columna}'] = 'true'
+    return opciones
+
+
+def ordenar(tabla, layout):
+    """Ordenar las filas por las columnas 'orden' presentes (orden estable)"""
+    claves = [(c, 'ascending') for c in layout['orden'] if c in tabla.column_names]
+    return tabla.sort_by(claves) if claves and tabla.num_rows else tabla
+
+
+def agregar_derivadas(tabla, layout):
+    """Añadir las columnas de partición derivadas (anio = year(origen), int32 como en Spark)"""
+    for columna, (funcion, origen) in layout['particiones'].items():
+        if funcion != 'anio':
+            raise ValueError(f"Partición derivada desconocida: {funcion}")
+        tabla = tabla.append_column(columna, pc.cast(pc.year(tabla.column(origen)), pa.int32()))
+    return tabla
+
+
+def escribir_tabla(tabla, archivo, layout):
+    """Escribir un único archivo Parquet con el orden, row groups y codificación del layout"""
+    tabla = ordenar(tabla, layout)
+    pq.write_table(
+        tabla, archivo, row_group_size=layout['filas_por_row_group'], **opciones_escritura(layout, tabla.schema)
+    )
+
+
+def _part_files(directorio):
+    """Part files Parquet bajo `directorio`, sin entrar en directorios ocultos ('.', '_')"""
+    archivos = []
+    for raiz, directorios, nombres in os.walk(directorio):
+        directorios[:] = [d for d in directorios if not d.startswith(('.', '_'))]
+        archivos += [os.path.join(raiz, n) for n in nombres if n.endswith('.parquet')]
+    return archivos
+
+
+def reemplazar_particiones(output_file, temporal, particiones=None):
+    """
+    Llevar a output_file las particiones escritas en `temporal` (directorio oculto dentro de
+    la tabla, con el mismo particionado hive) y solo después borrar los archivos anteriores
+    de las particiones de primer nivel reemplazadas ('rango_codigo=3'; todas si particiones
+    es None). Si la escritura falla antes de llegar aquí la tabla queda intacta, y un corte a
+    mitad del reemplazo deja archivos de más, nunca de menos
+    """
+    if particiones is None:
+        # Carga completa: todos los archivos de datos, también los del primer nivel que deja
+        # una tabla escrita sin particionar (el layout anterior de Silver)
+        anteriores = _part_files(output_file)
+    else:
+        anteriores = []
+        for entrada in particiones:
+            ruta = os.path.join(output_file, entrada)
+            if os.path.isdir(ruta):
+                anteriores += _part_files(ruta)
+    
+    nuevos = set()
+    for archivo in _part_files(temporal):
+        destino = os.path.join(output_file, os.path.relpath(archivo, temporal))
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(archivo, destino)
+        nuevos.add(destino)
+    for archivo in anteriores:
+        if archivo not in nuevos:
+            os.remove(archivo)
+    
+    # Particiones que quedaron sin archivos (filas que cambiaron de partición derivada)
+    directorios = []
+    for raiz, subdirectorios, _ in os.walk(output_file):
+        subdirectorios[:] = [d for d in subdirectorios if not d.startswith(('.', '_'))]
+        directorios += [os.path.join(raiz, d) for d in subdirectorios]
+    for directorio in reversed(directorios):
+        if not os.listdir(directorio):
+            os.rmdir(directorio)
@@ -3,258 +3,521 @@ Script de Limpieza Silver Layer - Proyecto LIDL
 Procesar datos de Bronze a Silver con PySpark
 """
 
-from pyspark.sql import SparkSession
+from pyspark.sql import Observation
 from pyspark.sql.functions import (
     col, trim, upper, lower, regexp_replace, 
-    to_date, when, coalesce, lit, current_timestamp
+    to_date, when, coalesce, lit, current_timestamp,
+    floor, row_number, count, year, sum as spark_sum
 )
 from pyspark.sql.types import IntegerType, DoubleType
-import logging
+from pyspark.sql.pandas.types import from_arrow_schema
+from pyspark.sql.window import Window
+import pyarrow as pa
+import os
+import glob
+import shutil
+import json
+import time
+import threading
 from datetime import datetime
+from functools import reduce
+from motor_arrow import MotorArrow
+from indice_claves import IndiceClaves
+from reglas_silver import TABLAS_SILVER, COLUMNA_PARTICION, TAMANO_RANGO_CODIGO, reglas_descarte
+from layout_parquet import LAYOUT_SILVER, layout_de_ruta, opciones_spark, reemplazar_particiones
+from esquemas_bronze import sin_diccionarios
+from sesion_spark import crear_sesion
+from observabilidad import Trazador, obtener_logger, tamano_ruta, bytes_escritos_desde
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/limpieza_silver.log'),
-        logging.StreamHandler()
-    ]
-)
+logger = obtener_logger('limpieza_silver')
+
+# Con motor='auto', si el Bronze a procesar pesa menos que esto se limpia con
+# MotorArrow en el propio proceso (sin arrancar la JVM ni pagar la planificación de Spark)
+UMBRAL_MOTOR_ARROW = 512 * 1024 * 1024
+MOTORES = ('auto', 'spark', 'arrow')
+
+# Orden de Bronze de cada fila del delta (parte, fila dentro de la parte): en un merge, entre
+# filas nuevas con la misma clave gana la primera, igual que en MotorArrow
+COLUMNAS_ORDEN_BRONZE = ['_parte_bronze', '_fila_bronze']
+
+# Funciones de las particiones derivadas del layout (ver layout_parquet)
+_DERIVADAS_SPARK = {'anio': lambda c: year(c).cast(IntegerType())}
 
 class LimpiezaSilver:
-    def __init__(self, input_path='bronze/ventas', output_path='silver/ventas'):
+    def __init__(self, input_path='bronze/ventas', output_path='silver/ventas', incremental=False, motor='auto',
+                 cache=None, trazador=None, sesion=None, indice_claves=False):
+        if motor not in MOTORES:
+            raise ValueError(f"Motor desconocido: {motor} (opciones: {', '.join(MOTORES)})")
         self.input_path = input_path
         self.output_path = output_path
+        self.incremental = incremental
+        self.motor = motor
+        # cache: CacheEtapas opcional; tablas con el mismo Bronze, reglas y código no se relimpian
+        self.cache = cache
+        # trazador: un span 'silver' por tabla (ver observabilidad.Trazador)
+        self.trazador = trazador or Trazador()
+        # sesion: SparkSession de larga duración (modo servicio); se usa si el motor es Spark
+        # y no se cierra en detener()
+        self.sesion = sesion
+        # indice_claves: cada tabla limpiada aporta sus claves a un IndiceClaves (RUT y códigos
+        # duplicados, claves huérfanas) que construir_indice resuelve cuando están todas
+        self.indice_claves = indice_claves
+        self.indice = None
         self.spark = None
-        
+        self.motor_arrow = None
+        self.bronze = {}
+        self.stats = {}
+        # Varias tablas pueden limpiarse a la vez desde el planificador DAG
+        self._lock = threading.Lock()
+        self.estado_file = os.path.join(self.output_path, 'limpieza_estado.json')
+        self.estado = {}
+    
     def iniciar_spark(self):
-        """Inicializar sesión Spark"""
-        self.spark = SparkSession.builder \
-            .appName("LIDL - Limpieza Silver") \
-            .config("spark.sql.adaptive.enabled", "true") \
-            .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
-            .config("spark.sql.legacy.timeParserPolicy", "CORRECTED") \
-            .getOrCreate()
-        
-        logging.info("✓ Sesión Spark iniciada")
-        
-    def normalizar_texto(self, df, columnas):
-        """Normalizar texto: trim, upper case para códigos, proper case para nombres"""
-        for col_name in columnas:
-            if col_name in df.columns:
-                # Si es código o tipo, UPPER
-                if 'codigo' in col_name.lower() or 'tipo' in col_name.lower():
-                    df = df.withColumn(col_name, upper(trim(col(col_name))))
-                # Si es nombre, apellido, comuna: proper case
-                elif any(x in col_name.lower() for x in ['nombre', 'apellido', 'comuna']):
-                    df = df.withColumn(
-                        col_name,
-                        regexp_replace(trim(col(col_name)), r'\s+', ' ')
-                    )
-                else:
-                    df = df.withColumn(col_name, trim(col(col_name)))
+        """Inicializar sesión Spark (o tomar la sesión compartida del modo servicio)"""
+        if self.sesion is not None:
+            self.spark = self.sesion
+            logger.info("✓ Sesión Spark compartida reutilizada")
+            return
+        self.spark = crear_sesion("LIDL - Limpieza Silver")
+        
+        logger.info("✓ Sesión Spark iniciada")
+    
+    def compilar_columna(self, nombre, regla, tipo_origen=None):
+        """
+        Compilar la regla de una columna a una única expresión Spark
+        tipo_origen: tipo de la columna en Bronze (df.dtypes); las ya tipadas no se reconvierten
+        """
+        expr = col(nombre)
+        tipo = regla.get('tipo', 'texto')
+        if tipo == 'int':
+            expr = expr.cast(IntegerType())
+        elif tipo == 'double':
+            expr = expr.cast(DoubleType())
+        elif tipo == 'fecha':
+            if tipo_origen != 'date':
+                expr = to_date(trim(expr), regla.get('formato', 'yyyy-MM-dd'))
+        else:
+            expr = trim(expr)
+        
+        if regla.get('espacios'):
+            expr = regexp_replace(expr, r'\s+', ' ')
+        if regla.get('caso') == 'upper':
+            expr = upper(expr)
+        elif regla.get('caso') == 'lower':
+            expr = lower(expr)
+        if 'reemplazar' in regla:
+            expr = regexp_replace(expr, *regla['reemplazar'])
+        if 'mapa' in regla:
+            mapeo = None
+            for destino, origenes in regla['mapa'].items():
+                mapeo = when(expr.isin(origenes), destino) if mapeo is None \
+                    else mapeo.when(expr.isin(origenes), destino)
+            expr = mapeo.otherwise(lit(regla['otro']) if 'otro' in regla else expr)
+        if 'nulo' in regla:
+            expr = coalesce(expr, lit(regla['nulo']))
+        
+        return expr.alias(nombre)
+    
+    def compilar_descarte(self, regla):
+        """Condición que deben cumplir las filas para no ser descartadas"""
+        columna = col(regla['columna'])
+        if regla.get('requerido'):
+            return columna.isNotNull()
+        if 'min' in regla and 'max' in regla:
+            return columna.between(regla['min'], regla['max'])
+        if 'min' in regla:
+            return columna >= regla['min']
+        return columna <= regla['max']
+    
+    def compilar_plan(self, df, especificacion):
+        """
+        Compilar la especificación de una tabla a un único select (todas las columnas +
+        processed_at) y las condiciones de descarte que _aplicar_filtros combina en un filter
+        """
+        columnas = especificacion['columnas']
+        tipos = dict(df.dtypes)
+        proyeccion = [
+            self.compilar_columna(c, columnas[c], tipos[c]) if c in columnas else col(c)
+            for c in df.columns
+        ]
+        df = df.select(*proyeccion, current_timestamp().alias('processed_at'))
+        
+        descartes = {
+            nombre: self.compilar_descarte(regla)
+            for nombre, regla in reglas_descarte(especificacion).items()
+        }
+        return df, descartes
+    
+    def _cargar_estado(self):
+        """Leer las partes de Bronze ya procesadas por tabla (watermark de Silver)"""
+        if not os.path.exists(self.estado_file):
+            return {}
+        with open(self.estado_file) as f:
+            return json.load(f)
+    
+    def _guardar_estado(self):
+        """Persistir el watermark de Silver"""
+        with open(self.estado_file, 'w') as f:
+            json.dump(self.estado, f, indent=2)
+    
+    def _partes_bronze(self, tabla):
+        """Listar los part files del dataset Bronze de una tabla"""
+        ruta = f"{self.input_path}/{tabla}_bronze.parquet"
+        return sorted(os.path.basename(p) for p in glob.glob(f"{ruta}/part-*.parquet"))
+    
+    def _plan_lectura(self, tabla, full_refresh=False, entrega=None):
+        """
+        Decidir qué leer de Bronze. En modo incremental solo las partes nuevas desde el
+        último watermark. Retorna (rutas, partes, es_merge); rutas vacío si no hay partes nuevas
+        entrega: EntregaBronze con partes aún no escritas en disco (cuentan como existentes)
+        """
+        ruta = f"{self.input_path}/{tabla}_bronze.parquet"
+        partes = self._partes_bronze(tabla)
+        if entrega is not None:
+            partes = sorted(set(partes) | set(entrega.partes))
+        procesadas = set(self.estado.get(tabla, {}).get('partes_bronze', []))
+        silver_existe = os.path.isdir(f"{self.output_path}/{tabla}_silver.parquet")
+        
+        # Merge solo si Bronze no fue recargado (todas las partes procesadas siguen ahí)
+        es_merge = bool(self.incremental and not full_refresh and silver_existe
+                        and procesadas and procesadas.issubset(partes))
+        nuevas = [p for p in partes if p not in procesadas] if es_merge else partes
+        return [f"{ruta}/{p}" for p in nuevas], partes, es_merge
+    
+    def _separar_lectura(self, rutas, entrega=None):
+        """Separar las partes a leer en (rutas en disco, tablas entregadas en memoria)"""
+        en_memoria = entrega.partes if entrega is not None else {}
+        disco = [ruta for ruta in rutas if os.path.basename(ruta) not in en_memoria]
+        tablas = [en_memoria[os.path.basename(ruta)] for ruta in rutas if os.path.basename(ruta) in en_memoria]
+        return disco, tablas
+    
+    def _elegir_motor(self, full_refresh=False, tamano_estimado=None):
+        """
+        Motor para esta ejecución: el pedido, o en 'auto' según el tamaño del Bronze a leer
+        tamano_estimado: bytes a usar cuando Bronze aún no existe (p.ej. tamaño de las fuentes
+                         al iniciar Silver antes de que termine la ingesta)
+        """
+        if self.motor != 'auto':
+            return self.motor
+        total = tamano_estimado or 0
+        if tamano_estimado is None:
+            for fuente, especificacion in TABLAS_SILVER.items():
+                entrega = self.bronze.get(fuente)
+                rutas = self._plan_lectura(especificacion['tabla'], full_refresh, entrega)[0]
+                disco, tablas = self._separar_lectura(rutas, entrega)
+                total += sum(os.path.getsize(ruta) for ruta in disco) + sum(tabla.nbytes for tabla in tablas)
+        motor = 'arrow' if total < UMBRAL_MOTOR_ARROW else 'spark'
+        logger.info(f"  Motor automático: {motor} ({total / 1024 / 1024:.1f} MB a procesar)")
+        return motor
+    
+    def _stats_sin_cambios(self, tabla):
+        """Estadísticas de una tabla sin partes nuevas en Bronze"""
+        return {
+            'registros_entrada': 0,
+            'registros_salida': 0,
+            'descartes': {},
+            'modo': 'sin cambios',
+            'salida': f"{self.output_path}/{tabla}_silver.parquet"
+        }
+    
+    def _aplicar_filtros(self, df, reglas):
+        """
+        Aplicar las reglas de descarte {nombre: condición a cumplir} registrando, dentro del
+        mismo job de escritura, filas de entrada, filas que incumplen cada regla y filas de salida
+        """
+        entrada = Observation()
+        df = df.observe(
+            entrada,
+            count(lit(1)).alias('registros_entrada'),
+            *[spark_sum(when(condicion, 0).otherwise(1)).alias(nombre) for nombre, condicion in reglas.items()]
+        )
+        if reglas:
+            df = df.filter(reduce(lambda a, b: a & b, reglas.values()))
         
-        return df
+        salida = Observation()
+        df = df.observe(salida, count(lit(1)).alias('registros_salida'))
+        return df, (entrada, salida)
+    
+    def _stats_tabla(self, observaciones, modo, output_file):
+        """Estadísticas materializadas de una tabla a partir de las métricas observadas"""
+        entrada, salida = observaciones[0].get, observaciones[1].get
+        return {
+            'registros_entrada': entrada['registros_entrada'],
+            'registros_salida': salida['registros_salida'],
+            'descartes': {regla: n or 0 for regla, n in entrada.items() if regla != 'registros_entrada'},
+            'modo': modo,
+            'salida': output_file
+        }
     
-    def estandarizar_fechas(self, df, columnas_fecha):
-        """Estandarizar formato de fechas a YYYY-MM-DD"""
-        for col_name in columnas_fecha:
-            if col_name in df.columns:
-                # CRÍTICO: Primero hacer TRIM para eliminar espacios
-                df = df.withColumn(col_name, trim(col(col_name)))
-                # Luego convertir a fecha
-                df = df.withColumn(
-                    col_name,
-                    to_date(col(col_name), 'yyyy-MM-dd')
-                )
+    def _escribir_silver(self, df, output_file, clave, es_merge):
+        """
+        Escribir Silver particionado por rango de la clave (y las particiones derivadas del
+        layout), con un archivo ordenado por partición. En modo merge hace upsert por clave
+        y reescribe solo los rangos tocados; la carga completa reemplaza todas las particiones.
+        El job escribe en un directorio oculto de la tabla y los archivos anteriores se borran
+        solo con los nuevos ya en su sitio (reemplazar_particiones)
+        """
+        layout = layout_de_ruta('silver', output_file)
+        df = df.withColumn(COLUMNA_PARTICION, floor(col(clave) / TAMANO_RANGO_CODIGO).cast(IntegerType()))
+        for columna, (funcion, origen) in layout['particiones'].items():
+            df = df.withColumn(columna, _DERIVADAS_SPARK[funcion](col(origen)))
+        columnas_particion = [COLUMNA_PARTICION] + list(layout['particiones'])
+        particiones = None
+        
+        if es_merge:
+            rangos = [r[0] for r in df.select(COLUMNA_PARTICION).distinct().collect()]
+            existentes = self.spark.read.parquet(output_file) \
+                .filter(col(COLUMNA_PARTICION).isin(rangos)) \
+                .drop(*layout['particiones'])
+            for columna, (funcion, origen) in layout['particiones'].items():
+                existentes = existentes.withColumn(columna, _DERIVADAS_SPARK[funcion](col(origen)))
+            
+            # La fila nueva gana sobre la existente con la misma clave; entre filas nuevas
+            # repetidas, la primera en orden de Bronze
+            ventana = Window.partitionBy(clave).orderBy(
+                col('_prioridad').desc(), *[col(c).asc_nulls_last() for c in COLUMNAS_ORDEN_BRONZE]
+            )
+            df = df.withColumn('_prioridad', lit(1)) \
+                .unionByName(existentes.withColumn('_prioridad', lit(0)), allowMissingColumns=True) \
+                .withColumn('_fila', row_number().over(ventana)) \
+                .filter(col('_fila') == 1) \
+                .drop('_fila', '_prioridad', *COLUMNAS_ORDEN_BRONZE)
+            
+            # Cada rango se reescribe entero para no dejar filas que cambiaron de partición derivada
+            particiones = [f"{COLUMNA_PARTICION}={rango}" for rango in rangos]
+            logger.info(f"  {os.path.basename(output_file)}: merge sobre {len(rangos)} particiones")
         
-        return df
+        # Una tarea por partición: un archivo (o pocos, por maxRecordsPerFile) en vez de uno por tarea
+        temporal = os.path.join(output_file, f".escribiendo-{datetime.now():%Y%m%d%H%M%S%f}")
+        try:
+            df.repartition(*[col(c) for c in columnas_particion]) \
+                .sortWithinPartitions(*(layout['orden'] or [clave])) \
+                .write.mode('overwrite') \
+                .options(**opciones_spark(layout, df.columns)) \
+                .partitionBy(*columnas_particion) \
+                .parquet(temporal)
+            reemplazar_particiones(output_file, temporal, particiones)
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
     
-    def manejar_nulos(self, df, estrategia=None):
+    def _limpiar_spark(self, rutas, tablas, especificacion, output_file, es_merge, nombres_tablas=()):
         """
-        Manejar valores nulos según estrategia
-        estrategia: dict con {columna: {tipo: 'drop'/'fill', valor: None/valor_default}}
+        Limpiar con Spark: un select, un filter y un único job de escritura. Las tablas
+        entregadas en memoria se convierten vía Arrow, sin pasar por Parquet
+        nombres_tablas: nombre de la parte Bronze de cada tabla en memoria (orden del merge)
         """
-        if estrategia is None:
-            estrategia = {
-                'codigo': {'tipo': 'drop'},
-                'tarjeta_beneficios': {'tipo': 'fill', 'valor': 'NO'},
-                'tipo_alimentacion': {'tipo': 'fill', 'valor': 'No Aplica'},
-                'promedio_compras': {'tipo': 'fill', 'valor': 0},
-                'tiempo_permanencia_min': {'tipo': 'fill', 'valor': 0}
+        dfs = [self.spark.read.parquet(*rutas)] if rutas else []
+        if dfs and es_merge:
+            dfs = [dfs[0].select('*', col('_metadata.file_name').alias('_parte_bronze'),
+                                 col('_metadata.row_index').alias('_fila_bronze'))]
+        tablas = [sin_diccionarios(tabla) for tabla in tablas]
+        if es_merge:
+            tablas = [
+                tabla.append_column('_parte_bronze', pa.array([nombre] * tabla.num_rows, pa.string()))
+                     .append_column('_fila_bronze', pa.array(range(tabla.num_rows), pa.int64()))
+                for nombre, tabla in zip(nombres_tablas, tablas)
+            ]
+        dfs += [self.spark.createDataFrame(tabla.to_pandas(), schema=from_arrow_schema(tabla.schema))
+                for tabla in tablas]
+        df = reduce(lambda a, b: a.unionByName(b), dfs)
+        df, descartes = self.compilar_plan(df, especificacion)
+        df, observaciones = self._aplicar_filtros(df, descartes)
+        self._escribir_silver(df, output_file, especificacion['clave'], es_merge)
+        return self._stats_tabla(observaciones, 'merge' if es_merge else 'completo', output_file)
+    
+    def _clave_cache(self, fuente, tabla):
+        """Clave de cache de una tabla: huella de su Bronze + especificación + versión del código"""
+        return self.cache.clave(
+            'silver', fuente, TABLAS_SILVER[fuente], COLUMNA_PARTICION, TAMANO_RANGO_CODIGO, self.output_path,
+            LAYOUT_SILVER.get(tabla),
+            self.cache.huella_directorio(f"{self.input_path}/{tabla}_bronze.parquet"),
+            self.cache.version_codigo(
+                'limpieza_silver.py', 'motor_arrow.py', 'reglas_silver.py', 'layout_parquet.py', 'esquemas_bronze.py'
+            )
+        )
+    
+    def _desde_cache(self, fuente, tabla, clave):
+        """Restaurar la tabla desde la cache (estado y stats incluidos). Retorna stats o None"""
+        metadatos = self.cache.buscar('silver', clave)
+        if metadatos is None:
+            return None
+        with self._lock:
+            self.estado[tabla] = metadatos['estado']
+            self._guardar_estado()
+        self.stats[fuente] = dict(metadatos['stats'], modo='cache')
+        return self.stats[fuente]
+    
+    def limpiar_tabla(self, fuente, full_refresh=False, entrega=None):
+        """
+        Limpiar una tabla según su especificación en TABLAS_SILVER con el motor activo
+        entrega: resultado de la ingesta Bronze de la fuente (se usa si es una EntregaBronze)
+        """
+        with self.trazador.span('silver', tabla=fuente) as span:
+            stats = self._limpiar_tabla(fuente, full_refresh, entrega)
+            if self.indice is not None and os.path.isdir(stats['salida']):
+                # Solo las columnas de clave de la tabla ya escrita (también si no cambió)
+                self.indice.agregar(fuente, stats['salida'])
+            span.etiquetar(motor=stats.get('motor'), modo=stats.get('modo'))
+            span.registrar(
+                filas_entrada=stats['registros_entrada'], filas_salida=stats['registros_salida'],
+                descartes=stats['descartes'], bytes_leidos=stats.get('bytes_leidos'),
+                bytes_escritos=stats.get('bytes_escritos')
+            )
+            return stats
+    
+    def _limpiar_tabla(self, fuente, full_refresh, entrega):
+        inicio = time.time()
+        especificacion = TABLAS_SILVER[fuente]
+        tabla = especificacion['tabla']
+        output_file = f"{self.output_path}/{tabla}_silver.parquet"
+        logger.info(f"Limpiando {tabla}...")
+        
+        # Qué leer desde Bronze (solo lo nuevo en modo incremental) y qué llegó ya en memoria
+        if not hasattr(entrega, 'partes'):
+            entrega = self.bronze.get(fuente)
+        rutas, partes, es_merge = self._plan_lectura(tabla, full_refresh, entrega)
+        if not rutas:
+            logger.info(f"  {tabla}: sin partes nuevas en Bronze")
+            self.stats[fuente] = self._stats_sin_cambios(tabla)
+            return self.stats[fuente]
+        
+        # Mismo Bronze, reglas y código que una versión ya limpiada (full_refresh fuerza recalcular)
+        clave = self._clave_cache(fuente, tabla) if self.cache else None
+        if clave and not full_refresh:
+            stats = self._desde_cache(fuente, tabla, clave)
+            if stats is not None:
+                return stats
+        if es_merge:
+            logger.info(f"  {tabla}: incremental, {len(rutas)} partes nuevas en Bronze")
+        disco, tablas = self._separar_lectura(rutas, entrega)
+        if tablas:
+            logger.info(f"  {tabla}: {len(tablas)} partes recibidas en memoria, {len(disco)} leídas de disco")
+        
+        if self.motor_arrow:
+            stats = self.motor_arrow.limpiar_tabla(disco, especificacion, output_file, es_merge, tablas)
+            stats.update({'modo': 'merge' if es_merge else 'completo', 'salida': output_file})
+        else:
+            nombres_tablas = [os.path.basename(ruta) for ruta in rutas if ruta not in disco]
+            stats = self._limpiar_spark(disco, tablas, especificacion, output_file, es_merge, nombres_tablas)
+        stats['motor'] = 'arrow' if self.motor_arrow else 'spark'
+        stats['bytes_leidos'] = sum(tamano_ruta(ruta) for ruta in disco)
+        stats['bytes_escritos'] = bytes_escritos_desde(output_file, inicio)
+        
+        with self._lock:
+            self.estado[tabla] = {
+                'partes_bronze': partes,
+                'actualizado': datetime.now().isoformat()
             }
-        
-        for col_name, config in estrategia.items():
-            if col_name in df.columns:
-                if config['tipo'] == 'drop':
-                    df = df.filter(col(col_name).isNotNull())
-                elif config['tipo'] == 'fill':
-                    df = df.withColumn(
-                        col_name,
-                        coalesce(col(col_name), lit(config['valor']))
-                    )
-        
-        return df
+            self._guardar_estado()
+        if clave:
+            self.cache.guardar('silver', clave, output_file, {'estado': self.estado[tabla], 'stats': stats})
+        
+        logger.info(f"✓ {tabla} limpiado: {stats['registros_salida']} registros")
+        if any(stats['descartes'].values()):
+            logger.info(f"  Descartes por regla: {stats['descartes']}")
+        self.stats[fuente] = stats
+        return stats
     
-    def limpiar_clientes_extra(self):
+    def limpiar_clientes_extra(self, full_refresh=False):
         """Limpiar tabla clientes_extra"""
-        logging.info("Limpiando clientes_extra...")
-        
-        # Leer desde Bronze
-        df = self.spark.read.parquet(f"{self.input_path}/clientes_extra_bronze.parquet")
-        
-        # Convertir tipos PRIMERO (antes de normalizar)
-        df = df.withColumn('codigo', col('codigo').cast(IntegerType()))
-        
-        # Normalizar texto
-        df = self.normalizar_texto(df, ['tipo_servicio', 'codigo_unico'])
-        
-        # Estandarizar fechas (ahora con TRIM incluido)
-        df = self.estandarizar_fechas(df, ['fecha_afiliacion'])
-        
-        # Manejar nulos
-        df = self.manejar_nulos(df, {
-            'codigo': {'tipo': 'drop'},
-            'tipo_servicio': {'tipo': 'fill', 'valor': 'LOCAL'},
-            'codigo_unico': {'tipo': 'drop'}
-        })
-        
-        # Agregar metadatos
-        df = df.withColumn('processed_at', current_timestamp())
-        
-        # Guardar en Silver
-        output_file = f"{self.output_path}/clientes_extra_silver.parquet"
-        df.write.mode('overwrite').parquet(output_file)
-        
-        logging.info(f"✓ clientes_extra limpiado: {df.count()} registros")
-        return df
+        return self.limpiar_tabla('extra', full_refresh)
     
-    def limpiar_clientes_info(self):
+    def limpiar_clientes_info(self, full_refresh=False):
         """Limpiar tabla clientes_info"""
-        logging.info("Limpiando clientes_info...")
-        
-        # Leer desde Bronze
-        df = self.spark.read.parquet(f"{self.input_path}/clientes_info_bronze.parquet")
-        
-        # Convertir tipos numéricos
-        df = df.withColumn('codigo_cliente', col('codigo_cliente').cast(IntegerType()))
-        df = df.withColumn('tipo_cliente', col('tipo_cliente').cast(IntegerType()))
-        df = df.withColumn('promedio_compras', col('promedio_compras').cast(DoubleType()))
-        df = df.withColumn('tiempo_permanencia_min', col('tiempo_permanencia_min').cast(IntegerType()))
-        
-        # Normalizar texto
-        df = self.normalizar_texto(df, ['tarjeta_beneficios', 'tipo_alimentacion'])
-        
-        # Normalizar valores específicos
-        df = df.withColumn(
-            'tarjeta_beneficios',
-            when(col('tarjeta_beneficios').isin(['SI', 'YES', 'Y', '1']), 'SI')
-            .when(col('tarjeta_beneficios').isin(['NO', 'N', '0']), 'NO')
-            .otherwise('NO')
-        )
-        
-        df = df.withColumn(
-            'tipo_alimentacion',
-            when(col('tipo_alimentacion').isNull(), 'No Aplica')
-            .otherwise(lower(col('tipo_alimentacion')))
-        )
-        
-        # Manejar nulos
-        df = self.manejar_nulos(df)
-        
-        # Validaciones de negocio
-        df = df.filter(col('tipo_cliente').between(1, 5))
-        df = df.filter(col('promedio_compras') >= 0)
-        df = df.filter(col('tiempo_permanencia_min').between(0, 120))
-        
-        # Agregar metadatos
-        df = df.withColumn('processed_at', current_timestamp())
-        
-        # Guardar en Silver
-        output_file = f"{self.output_path}/clientes_info_silver.parquet"
-        df.write.mode('overwrite').parquet(output_file)
-        
-        logging.info(f"✓ clientes_info limpiado: {df.count()} registros")
-        return df
+        return self.limpiar_tabla('info', full_refresh)
     
-    def limpiar_clientes(self):
+    def limpiar_clientes(self, full_refresh=False):
         """Limpiar tabla clientes"""
-        logging.info("Limpiando clientes...")
-        
-        # Leer desde Bronze
-        df = self.spark.read.parquet(f"{self.input_path}/clientes_bronze.parquet")
-        
-        # Convertir tipos
-        df = df.withColumn('codigo', col('codigo').cast(IntegerType()))
-        
-        # Normalizar texto
-        df = self.normalizar_texto(df, ['nombre', 'apellido', 'comuna', 'rut', 'religion'])
-        
-        # Limpiar RUT (formato chileno)
-        df = df.withColumn(
-            'rut',
-            regexp_replace(col('rut'), r'[.\-]', '')
-        )
-        
-        # Estandarizar fechas (ahora con TRIM incluido)
-        df = self.estandarizar_fechas(df, ['fecha_nacimiento'])
-        
-        # Manejar nulos
-        df = self.manejar_nulos(df, {
-            'codigo': {'tipo': 'drop'},
-            'nombre': {'tipo': 'drop'},
-            'apellido': {'tipo': 'drop'},
-            'rut': {'tipo': 'drop'},
-            'comuna': {'tipo': 'fill', 'valor': 'Sin Comuna'},
-            'religion': {'tipo': 'fill', 'valor': 'Sin especificar'}
-        })
-        
-        # Agregar metadatos
-        df = df.withColumn('processed_at', current_timestamp())
-        
-        # Guardar en Silver
-        output_file = f"{self.output_path}/clientes_silver.parquet"
-        df.write.mode('overwrite').parquet(output_file)
-        
-        logging.info(f"✓ clientes limpiado: {df.count()} registros")
-        return df
+        return self.limpiar_tabla('clientes', full_refresh)
     
-    def ejecutar_limpieza(self):
-        """Ejecutar proceso completo de limpieza"""
-        import os
+    def iniciar(self, full_refresh=False, bronze=None, tamano_estimado=None):
+        """
+        Preparar la limpieza: cargar el watermark, registrar las entregas en memoria e
+        iniciar el motor (Spark solo si hace falta). Ver ejecutar_limpieza
+        """
         os.makedirs(self.output_path, exist_ok=True)
         os.makedirs('logs', exist_ok=True)
         
-        logging.info("=== Iniciando Limpieza Silver Layer ===")
-        
-        # Iniciar Spark
-        self.iniciar_spark()
+        logger.info("=== Iniciando Limpieza Silver Layer ===")
+        self.estado = self._cargar_estado()
+        self.stats = {'timestamp': datetime.now().isoformat()}
+        self.indice = IndiceClaves(self.output_path) if self.indice_claves else None
+        # Solo las EntregaBronze (con partes en memoria); los datasets ya escritos se leen de disco
+        self.bronze = {
+            fuente: resultado for fuente, resultado in (bronze or {}).items()
+            if hasattr(resultado, 'partes')
+        }
+        
+        if self._elegir_motor(full_refresh, tamano_estimado) == 'arrow':
+            self.motor_arrow = MotorArrow()
+            logger.info("✓ Motor Arrow iniciado")
+        else:
+            self.iniciar_spark()
+    
+    def construir_indice(self):
+        """
+        Resolver el índice de claves con las tablas limpiadas hasta ahora: escribe
+        cuarentena_claves.parquet y guarda los conteos en las stats ('indice_claves')
+        """
+        if self.indice is None:
+            return {}
+        with self.trazador.span('indice_claves') as span:
+            conteos = self.indice.construir()
+            span.registrar(filas_salida=conteos.get('filas_cuarentena', 0),
+                           claves_indexadas=conteos.get('claves_indexadas', 0))
+        self.stats['indice_claves'] = conteos
+        return conteos
+    
+    def guardar_stats(self):
+        """Guardar limpieza_stats.json (en el orden de TABLAS_SILVER aunque las tablas terminen en otro)"""
+        stats = {'timestamp': self.stats.get('timestamp', datetime.now().isoformat())}
+        stats.update({fuente: self.stats[fuente] for fuente in TABLAS_SILVER if fuente in self.stats})
+        if 'indice_claves' in self.stats:
+            stats['indice_claves'] = self.stats['indice_claves']
+        stats_file = os.path.join(self.output_path, 'limpieza_stats.json')
+        with open(stats_file, 'w') as f:
+            json.dump(stats, f, indent=2)
+        return stats
+    
+    def detener(self):
+        """Liberar el motor (cerrar la sesión Spark si se inició; la compartida sigue abierta)"""
+        if self.spark and self.spark is not self.sesion:
+            self.spark.stop()
+            logger.info("✓ Sesión Spark cerrada")
+        self.spark = None
+        self.motor_arrow = None
+    
+    def ejecutar_limpieza(self, full_refresh=False, bronze=None):
+        """
+        Ejecutar proceso completo de limpieza
+        full_refresh: reprocesar todo Bronze aunque el modo sea incremental (backfills)
+        bronze: resultado de IngestaBronze.ejecutar_ingesta; las fuentes entregadas en
+                memoria (EntregaBronze) se limpian sin releer su Parquet
+        """
+        self.iniciar(full_refresh, bronze)
         
         try:
-            # Limpiar todas las tablas
-            df_extra = self.limpiar_clientes_extra()
-            df_info = self.limpiar_clientes_info()
-            df_clientes = self.limpiar_clientes()
+            # Limpiar todas las tablas (cada una en un único job de escritura)
+            for fuente in TABLAS_SILVER:
+                self.limpiar_tabla(fuente, full_refresh)
+            self.construir_indice()
             
-            logging.info("\n=== Limpieza Completada ===")
-            logging.info(f"✓ Todos los archivos procesados exitosamente")
+            # Guardar estadísticas (ya materializadas: siguen siendo válidas tras spark.stop())
+            stats = self.guardar_stats()
             
-            return {
-                'extra': df_extra,
-                'info': df_info,
-                'clientes': df_clientes
-            }
+            logger.info("\n=== Limpieza Completada ===")
+            logger.info(f"✓ Todos los archivos procesados exitosamente")
             
+            return stats
+        
         except Exception as e:
-            logging.error(f"Error en limpieza: {str(e)}")
+            logger.error(f"Error en limpieza: {str(e)}")
             raise
         finally:
-            if self.spark:
-                self.spark.stop()
-                logging.info("✓ Sesión Spark cerrada")
+            self.detener()
 
 
 if __name__ == "__main__":
-    limpieza = LimpiezaSilver()
-    dataframes = limpieza.ejecutar_limpieza()
\ No newline at end of file
+    import sys
+    limpieza = LimpiezaSilver(motor=sys.argv[1] if len(sys.argv) > 1 else 'auto', indice_claves=True)
+    stats = limpieza.ejecutar_limpieza()
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+Motor Arrow de Limpieza Silver - Proyecto LIDL
+Implementación en proceso (pyarrow) de las reglas de TABLAS_SILVER, sin JVM,
+para cargas pequeñas y medianas
+"""
+
+import os
+import shutil
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from reglas_silver import COLUMNA_PARTICION, TAMANO_RANGO_CODIGO, reglas_descarte
+from layout_parquet import layout_de_ruta, agregar_derivadas, ordenar, opciones_dataset, reemplazar_particiones
+from observabilidad import obtener_logger
+
+logger = obtener_logger('motor_arrow')
+
+# Literales que Spark acepta al castear texto a número (cast no ANSI)
+_PATRON_ENTERO = r'^[+-]?\d+(\.\d*)?$'
+_PATRON_DOUBLE = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+# Traducción de patrones de fecha de Spark a strptime + regex estricta
+_PATRONES_FECHA = {'yyyy': (r'\d{4}', '%Y'), 'MM': (r'\d{2}', '%m'), 'dd': (r'\d{2}', '%d')}
+
+
+def _patron_fecha(formato):
+    """Convertir un patrón de fecha Spark ('yyyy-MM-dd') a (regex, formato strptime)"""
+    regex, strptime = formato, formato
+    for token, (regex_token, strptime_token) in _PATRONES_FECHA.items():
+        regex = regex.replace(token, regex_token)
+        strptime = strptime.replace(token, strptime_token)
+    return f'^{regex}$', strptime
+
+
+def _es_texto(columna):
+    return pa.types.is_string(columna.type) or pa.types.is_large_string(columna.type)
+
+
+def _nulo_si(columna, invalidos):
+    """Reemplazar por null los valores marcados como inválidos"""
+    return pc.if_else(pc.fill_null(invalidos, True), pa.scalar(None, columna.type), columna)
+
+
+class MotorArrow:
+    """
+    Aplica la especificación de limpieza de una tabla con Arrow compute, con la misma
+    semántica que la compilación a Spark de LimpiezaSilver (trim de espacios, casts no
+    ANSI con null en valores inválidos, to_date estricto, rellenos, descartes y merge)
+    """
+    
+    def compilar_columna(self, columna, regla):
+        """Aplicar la regla de una columna (mismo orden de pasos que en Spark)"""
+        tipo = regla.get('tipo', 'texto')
+        if pa.types.is_dictionary(columna.type):
+            return self._compilar_diccionario(columna, regla)
+        
+        if tipo == 'int':
+            if _es_texto(columna):
+                texto = pc.utf8_trim_whitespace(columna)
+                validos = pc.match_substring_regex(texto, _PATRON_ENTERO)
+                # Spark trunca la parte decimal: '12.7' -> 12
+                entero = pc.replace_substring_regex(_nulo_si(texto, pc.invert(validos)), r'\..*$', '')
+                numero = pc.cast(entero, pa.int64())
+            else:
+                numero = pc.cast(columna, pa.int64(), safe=False)
+            fuera_de_rango = pc.or_(pc.less(numero, -2**31), pc.greater(numero, 2**31 - 1))
+            columna = pc.cast(_nulo_si(numero, fuera_de_rango), pa.int32())
+        elif tipo == 'double':
+            if _es_texto(columna):
+                texto = pc.utf8_trim_whitespace(columna)
+                validos = pc.match_substring_regex(texto, _PATRON_DOUBLE)
+                columna = pc.cast(_nulo_si(texto, pc.invert(validos)), pa.float64())
+            else:
+                columna = pc.cast(columna, pa.float64())
+        elif not (tipo == 'fecha' and pa.types.is_date32(columna.type)):
+            # (las fechas que Bronze ya guarda como date32 pasan sin reparsear)
+            if not _es_texto(columna):
+                columna = pc.cast(columna, pa.string())
+            # trim() de Spark solo elimina espacios
+            columna = pc.utf8_trim(columna, characters=' ')
+            if tipo == 'fecha':
+                regex, formato = _patron_fecha(regla.get('formato', 'yyyy-MM-dd'))
+                validos = pc.match_substring_regex(columna, regex)
+                fechas = pc.strptime(
+                    _nulo_si(columna, pc.invert(validos)), format=formato, unit='s', error_is_null=True
+                )
+                # strptime desborda fechas imposibles (2024-02-30 -> 2024-03-01); Spark da null
+                inexistentes = pc.not_equal(pc.strftime(fechas, format=formato), columna)
+                columna = pc.cast(_nulo_si(fechas, inexistentes), pa.date32())
+        
+        if regla.get('espacios'):
+            columna = pc.replace_substring_regex(columna, r'\s+', ' ')
+        if regla.get('caso') == 'upper':
+            columna = pc.utf8_upper(columna)
+        elif regla.get('caso') == 'lower':
+            columna = pc.utf8_lower(columna)
+        if 'reemplazar' in regla:
+            patron, reemplazo = regla['reemplazar']
+            columna = pc.replace_substring_regex(columna, patron, reemplazo)
+        if 'mapa' in regla:
+            resultado = pa.scalar(regla['otro'], columna.type) if 'otro' in regla else columna
+            # Se recorre al revés para que el primer destino que coincide tenga prioridad (como when/when)
+            for destino, origenes in reversed(list(regla['mapa'].items())):
+                coincide = pc.fill_null(pc.is_in(columna, value_set=pa.array(origenes, columna.type)), False)
+                resultado = pc.if_else(coincide, pa.scalar(destino, columna.type), resultado)
+            columna = resultado
+        if 'nulo' in regla:
+            columna = pc.coalesce(columna, pa.scalar(regla['nulo']).cast(columna.type))
+        
+        return columna
+    
+    def _compilar_diccionario(self, columna, regla):
+        """
+        Columna dictionary (enums de Bronze): la regla se evalúa una vez por valor distinto
+        (más el null) y se expande a las filas con take; el resultado es una columna normal
+        """
+        tipo = self.compilar_columna(pa.nulls(1, pa.string()), regla).type
+        chunks = []
+        for chunk in (columna.chunks if isinstance(columna, pa.ChunkedArray) else [columna]):
+            valores = pa.concat_arrays([chunk.dictionary.cast(pa.string()), pa.nulls(1, pa.string())])
+            indices = pc.fill_null(chunk.indices.cast(pa.int64()), len(chunk.dictionary))
+            chunks.append(pc.take(self.compilar_columna(valores, regla), indices))
+        return pa.chunked_array(chunks, type=tipo)
+    
+    def compilar_descarte(self, tabla, regla):
+        """Máscara de filas que cumplen la regla (null cuenta como incumplida)"""
+        columna = tabla.column(regla['columna'])
+        if regla.get('requerido'):
+            return pc.is_valid(columna)
+        cumple = pa.scalar(True)
+        if 'min' in regla:
+            cumple = pc.and_(cumple, pc.greater_equal(columna, regla['min']))
+        if 'max' in regla:
+            cumple = pc.and_(cumple, pc.less_equal(columna, regla['max']))
+        return pc.fill_null(cumple, False)
+    
+    def limpiar(self, tabla, especificacion):
+        """Limpiar una tabla Arrow. Retorna (tabla limpia, stats de entrada/salida/descartes)"""
+        columnas = especificacion['columnas']
+        procesada = pa.table({
+            nombre: self.compilar_columna(tabla.column(nombre), columnas[nombre]) if nombre in columnas
+            else tabla.column(nombre)
+            for nombre in tabla.column_names
+        })
+        procesada = procesada.append_column(
+            'processed_at',
+            pa.array([datetime.now(timezone.utc)] * procesada.num_rows, pa.timestamp('us', tz='UTC'))
+        )
+        
+        descartes = {}
+        filtro = pa.array([True] * procesada.num_rows)
+        for nombre, regla in reglas_descarte(especificacion).items():
+            cumple = self.compilar_descarte(procesada, regla)
+            descartes[nombre] = procesada.num_rows - pc.sum(pc.cast(cumple, pa.int64())).as_py() \
+                if procesada.num_rows else 0
+            filtro = pc.and_(filtro, cumple)
+        
+        limpia = procesada.filter(filtro)
+        stats = {
+            'registros_entrada': tabla.num_rows,
+            'registros_salida': limpia.num_rows,
+            'descartes': descartes
+        }
+        return limpia, stats
+    
+    def _agregar_particion(self, tabla, clave):
+        """Columna rango_codigo = floor(clave / TAMANO_RANGO_CODIGO), como en Spark"""
+        rango = pc.cast(pc.floor(pc.divide(pc.cast(tabla.column(clave), pa.float64()), TAMANO_RANGO_CODIGO)),
+                        pa.int32())
+        return tabla.append_column(COLUMNA_PARTICION, rango)
+    
+    def escribir(self, tabla, output_file, clave, es_merge):
+        """
+        Escribir Silver particionado (hive: rango_codigo=N/ y debajo las particiones derivadas
+        del layout) con el orden y los tamaños de LAYOUT_SILVER. En merge hace upsert por clave
+        y reescribe solo los rangos tocados; la carga completa reemplaza el directorio. Se
+        escribe en un directorio oculto de la tabla y los archivos anteriores se borran solo
+        con los nuevos ya en su sitio (reemplazar_particiones)
+        """
+        layout = layout_de_ruta('silver', output_file)
+        tabla = agregar_derivadas(self._agregar_particion(tabla, clave), layout)
+        columnas_particion = [COLUMNA_PARTICION] + list(layout['particiones'])
+        
+        if es_merge:
+            rangos = pc.unique(tabla.column(COLUMNA_PARTICION)).to_pylist()
+            existentes = ds.dataset(output_file, format='parquet', partitioning='hive') \
+                .to_table(filter=ds.field(COLUMNA_PARTICION).isin(rangos))
+            # Recalcular las derivadas (la tabla pudo escribirse con otro layout)
+            existentes = agregar_derivadas(
+                existentes.drop([c for c in layout['particiones'] if c in existentes.column_names]), layout
+            )
+            
+            # La fila nueva gana sobre la existente con la misma clave y, dentro del delta, la
+            # primera en orden de Bronze (parte, fila), igual que la ventana de Spark
+            indices = pc.cast(pa.array(range(tabla.num_rows)), pa.int64())
+            primeras = tabla.append_column('_fila', indices) \
+                .group_by(clave).aggregate([('_fila', 'min')]).column('_fila_min')
+            tabla = tabla.take(pc.take(primeras, pc.sort_indices(primeras)))
+            conservadas = existentes.filter(
+                pc.invert(pc.is_in(existentes.column(clave), value_set=tabla.column(clave)))
+            )
+            tabla = pa.concat_tables([
+                tabla, conservadas.select(tabla.column_names).cast(tabla.schema)
+            ])
+            # Cada rango se reescribe entero: una fila que cambió de partición derivada no queda duplicada
+            particiones = [f"{COLUMNA_PARTICION}={rango}" for rango in rangos]
+            logger.info(f"  {os.path.basename(output_file)}: merge sobre {len(rangos)} particiones")
+        else:
+            particiones = None
+        
+        # Sin hilos para que cada archivo conserve el orden del layout
+        tabla = ordenar(tabla, layout)
+        temporal = os.path.join(output_file, f".escribiendo-{datetime.now():%Y%m%d%H%M%S%f}")
+        try:
+            ds.write_dataset(
+                tabla, temporal, use_threads=False,
+                partitioning=ds.partitioning(tabla.select(columnas_particion).schema, flavor='hive'),
+                basename_template=f"part-{datetime.now():%Y%m%d%H%M%S}-{{i}}.parquet",
+                existing_data_behavior='overwrite_or_ignore',
+                **opciones_dataset(layout, tabla.schema)
+            )
+            reemplazar_particiones(output_file, temporal, particiones)
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+    
+    def limpiar_tabla(self, rutas, especificacion, output_file, es_merge, tablas=None):
+        """
+        Leer las partes Bronze indicadas (más las tablas ya entregadas en memoria), limpiar
+        y escribir. Retorna stats sin modo/salida. Las partes en memoria son del último lote,
+        así que rutas + tablas ya están en orden de Bronze (el que decide entre claves repetidas)
+        """
+        partes = [ds.dataset(rutas, format='parquet').to_table()] if rutas else []
+        tabla = pa.concat_tables(partes + list(tablas or []))
+        limpia, stats = self.limpiar(tabla, especificacion)
+        self.escribir(limpia, output_file, especificacion['clave'], es_merge)
+        return stats
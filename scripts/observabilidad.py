@@ -0,0 +1,323 @@
+"""
+Observabilidad - Proyecto LIDL
+Loggers por módulo y trazas de ejecución: spans por etapa y por tabla con tiempo, CPU,
+filas, descartes por regla, bytes y memoria pico, exportados como JSON lines y como
+textfile de Prometheus (node_exporter --collector.textfile)
+"""
+
+import os
+import json
+import time
+import uuid
+import resource
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+DIRECTORIO_LOGS = 'logs'
+FORMATO_LOG = '%(asctime)s - %(levelname)s - %(message)s'
+METRICAS_JSONL = 'logs/metricas.jsonl'
+METRICAS_PROMETHEUS = 'logs/metricas.prom'
+PREFIJO_PROMETHEUS = 'lidl'
+INTERVALO_MUESTREO_RSS = 0.05  # segundos entre lecturas del RSS mientras dura un span
+
+# Métricas conocidas de un span: descripción para el # HELP de Prometheus
+METRICAS = {
+    'segundos': 'Duración del span en segundos',
+    'cpu_segundos': 'CPU de usuario y sistema del proceso y sus hijos durante el span',
+    'filas_entrada': 'Filas leídas',
+    'filas_salida': 'Filas escritas',
+    'filas_por_segundo': 'Filas de salida por segundo de duración',
+    'bytes_leidos': 'Bytes leídos de disco',
+    'bytes_escritos': 'Bytes escritos en disco',
+    'rss_pico_bytes': 'RSS máximo muestreado durante el span',
+    'exito': '1 si el span terminó sin error'
+}
+
+# Varios spans con la misma etapa y etiquetas (p.ej. bronze de 'extra' con dos archivos en un
+# ciclo de streaming) se exportan como una sola muestra: se suman salvo estas métricas, y
+# filas_por_segundo se recalcula con las filas y segundos sumados
+AGREGACION_PROMETHEUS = {
+    'rss_pico_bytes': max,
+    'exito': min
+}
+
+_LOGGER_RAIZ = 'lidl'
+
+
+def obtener_logger(nombre):
+    """
+    Logger 'lidl.<nombre>' que escribe en logs/<nombre>.log y en consola (vía el logger
+    'lidl'). Cada módulo tiene su propio archivo aunque se importen todos en el mismo
+    proceso (con logging.basicConfig solo contaba la configuración del primero importado)
+    """
+    raiz = logging.getLogger(_LOGGER_RAIZ)
+    if not raiz.handlers:
+        raiz.setLevel(logging.INFO)
+        consola = logging.StreamHandler()
+        consola.setFormatter(logging.Formatter(FORMATO_LOG))
+        raiz.addHandler(consola)
+        raiz.propagate = False
+    
+    logger = logging.getLogger(f"{_LOGGER_RAIZ}.{nombre}")
+    if not logger.handlers:
+        os.makedirs(DIRECTORIO_LOGS, exist_ok=True)
+        archivo = logging.FileHandler(os.path.join(DIRECTORIO_LOGS, f"{nombre}.log"), delay=True)
+        archivo.setFormatter(logging.Formatter(FORMATO_LOG))
+        logger.addHandler(archivo)
+    return logger
+
+
+def rss_actual():
+    """RSS del proceso en bytes (Linux: /proc/self/statm); None si no se puede leer"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def cpu_proceso():
+    """Segundos de CPU (usuario + sistema) del proceso y de sus hijos ya terminados"""
+    propio = resource.getrusage(resource.RUSAGE_SELF)
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return propio.ru_utime + propio.ru_stime + hijos.ru_utime + hijos.ru_stime
+
+
+def tamano_ruta(ruta):
+    """Bytes de un archivo o de todos los archivos de un directorio (0 si no existe)"""
+    if os.path.isfile(ruta):
+        return os.path.getsize(ruta)
+    return sum(
+        os.path.getsize(os.path.join(raiz, archivo))
+        for raiz, _, archivos in os.walk(ruta) for archivo in archivos
+    )
+
+
+def bytes_escritos_desde(ruta, desde):
+    """Bytes de los archivos de `ruta` modificados desde el timestamp `desde` (time.time())"""
+    if not os.path.isdir(ruta):
+        return 0
+    total = 0
+    for raiz, _, archivos in os.walk(ruta):
+        for archivo in archivos:
+            info = os.stat(os.path.join(raiz, archivo))
+            if info.st_mtime >= desde:
+                total += info.st_size
+    return total
+
+
+class MuestreadorRSS:
+    """Hilo que muestrea el RSS del proceso mientras está activo y guarda el máximo"""
+    
+    def __init__(self, intervalo=INTERVALO_MUESTREO_RSS):
+        self.intervalo = intervalo
+        self.pico = 0
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+    
+    def _muestrear(self):
+        while True:
+            self.pico = max(self.pico, rss_actual() or 0)
+            if self._detener.wait(self.intervalo):
+                break
+    
+    def __enter__(self):
+        self._hilo.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+        self.pico = max(self.pico, rss_actual() or 0)
+        return False
+
+
+class Span:
+    """
+    Unidad medida de trabajo (etapa o tabla). atributos: etiquetas (tabla, motor, modo...);
+    metricas: valores numéricos (ver METRICAS, se admiten otros); descartes: {regla: filas
+    descartadas}; invalidos: {campo: filas que no pasan la validación} (no se descartan)
+    """
+    
+    def __init__(self, nombre, traza_id, padre=None, atributos=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.nombre = nombre
+        self.traza_id = traza_id
+        self.padre = padre
+        self.atributos = dict(atributos or {})
+        self.metricas = {}
+        self.descartes = {}
+        self.invalidos = {}
+        self.estado = 'ok'
+        self.error = None
+        self.inicio = None
+        self.fin = None
+    
+    def registrar(self, descartes=None, invalidos=None, **metricas):
+        """Añadir métricas al span (las medidas automáticamente se pueden sobrescribir)"""
+        if descartes:
+            self.descartes.update({regla: int(n) for regla, n in descartes.items()})
+        if invalidos:
+            self.invalidos.update({campo: int(n) for campo, n in invalidos.items()})
+        self.metricas.update({nombre: valor for nombre, valor in metricas.items() if valor is not None})
+    
+    def etiquetar(self, **atributos):
+        self.atributos.update({nombre: valor for nombre, valor in atributos.items() if valor is not None})
+    
+    def fallar(self, error):
+        """Marcar el span como fallido cuando el error se captura dentro del bloque"""
+        self.estado = 'error'
+        self.error = str(error)
+    
+    def a_dict(self):
+        return {
+            'traza': self.traza_id,
+            'span': self.id,
+            'padre': self.padre,
+            'nombre': self.nombre,
+            'inicio': datetime.fromtimestamp(self.inicio).isoformat() if self.inicio else None,
+            'fin': datetime.fromtimestamp(self.fin).isoformat() if self.fin else None,
+            'estado': self.estado,
+            'error': self.error,
+            'atributos': self.atributos,
+            'metricas': self.metricas,
+            'descartes': self.descartes,
+            'invalidos': self.invalidos
+        }
+
+
+class Trazador:
+    """
+    Registra spans anidados (por hilo; los spans abiertos desde otros hilos, p.ej. tareas
+    del planificador, cuelgan del primer span de la traza). Cada span terminado se añade a
+    jsonl_file; exportar() reescribe prometheus_file con los de la traza. La CPU es la del
+    proceso completo: con spans simultáneos incluye el trabajo de los demás
+    """
+    
+    def __init__(self, jsonl_file=METRICAS_JSONL, prometheus_file=METRICAS_PROMETHEUS):
+        self.jsonl_file = jsonl_file
+        self.prometheus_file = prometheus_file
+        self.traza_id = uuid.uuid4().hex[:16]
+        self.spans = []
+        self.raiz = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    def __getstate__(self):
+        # Las instancias que lo referencian se envían a procesos worker: Lock y local no se serializan
+        estado = dict(self.__dict__)
+        del estado['_lock'], estado['_local']
+        return estado
+    
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    def _pila(self):
+        if not hasattr(self._local, 'pila'):
+            self._local.pila = []
+        return self._local.pila
+    
+    @contextmanager
+    def span(self, nombre, **atributos):
+        """Medir el bloque como un span: with trazador.span('silver', tabla='clientes') as span"""
+        pila = self._pila()
+        span = Span(nombre, self.traza_id, pila[-1].id if pila else self.raiz, atributos)
+        if self.raiz is None:
+            self.raiz = span.id
+        
+        pila.append(span)
+        cpu_inicio = cpu_proceso()
+        span.inicio = time.time()
+        inicio = time.perf_counter()
+        try:
+            with MuestreadorRSS() as muestreador:
+                yield span
+        except BaseException as e:
+            span.estado = 'error'
+            span.error = str(e)
+            raise
+        finally:
+            pila.pop()
+            span.fin = time.time()
+            medidas = {
+                'segundos': round(time.perf_counter() - inicio, 4),
+                'cpu_segundos': round(cpu_proceso() - cpu_inicio, 4),
+                'rss_pico_bytes': muestreador.pico
+            }
+            span.metricas = {**medidas, **span.metricas}
+            filas = span.metricas.get('filas_salida')
+            if filas is not None and span.metricas['segundos'] > 0:
+                span.metricas.setdefault('filas_por_segundo', round(filas / span.metricas['segundos'], 1))
+            span.metricas['exito'] = int(span.estado == 'ok')
+            self._terminar(span)
+    
+    def _terminar(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if self.jsonl_file:
+                os.makedirs(os.path.dirname(self.jsonl_file) or '.', exist_ok=True)
+                with open(self.jsonl_file, 'a') as f:
+                    f.write(json.dumps(span.a_dict(), ensure_ascii=False, default=str) + '\n')
+    
+    def _etiquetas(self, span, **extra):
+        etiquetas = {'etapa': span.nombre, **{k: v for k, v in span.atributos.items() if k in ('tabla', 'motor', 'modo')}}
+        etiquetas.update(extra)
+        escapar = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in etiquetas.items()) + '}'
+    
+    def texto_prometheus(self):
+        """Métricas de los spans de la traza en el formato de exposición de Prometheus"""
+        with self._lock:
+            spans = list(self.spans)
+        series = {}
+    
+        def agregar(metrica, etiquetas, valor):
+            muestras = series.setdefault(metrica, {})
+            if etiquetas in muestras:
+                valor = AGREGACION_PROMETHEUS.get(metrica, lambda a, b: a + b)(muestras[etiquetas], valor)
+            muestras[etiquetas] = valor
+        
+        for span in spans:
+            for metrica, valor in span.metricas.items():
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool) and metrica != 'filas_por_segundo':
+                    agregar(metrica, self._etiquetas(span), valor)
+            for regla, filas in span.descartes.items():
+                agregar('filas_descartadas', self._etiquetas(span, regla=regla), filas)
+            for campo, filas in span.invalidos.items():
+                agregar('filas_invalidas', self._etiquetas(span, campo=campo), filas)
+        
+        filas, segundos = series.get('filas_salida', {}), series.get('segundos', {})
+        por_segundo = {e: round(filas[e] / segundos[e], 1) for e in filas if segundos.get(e, 0) > 0}
+        if por_segundo:
+            series['filas_por_segundo'] = por_segundo
+        
+        lineas = []
+        descripciones = {
+            **METRICAS,
+            'filas_descartadas': 'Filas descartadas por regla',
+            'filas_invalidas': 'Filas que no pasan la validación, por campo'
+        }
+        for metrica, muestras in series.items():
+            nombre = f"{PREFIJO_PROMETHEUS}_{metrica}"
+            lineas.append(f"# HELP {nombre} {descripciones.get(metrica, metrica)}")
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.extend(f"{nombre}{etiquetas} {round(valor, 4) if isinstance(valor, float) else valor}"
+                          for etiquetas, valor in muestras.items())
+        lineas.append(f"# HELP {PREFIJO_PROMETHEUS}_ultima_ejecucion_timestamp_seconds Fin de la última ejecución")
+        lineas.append(f"# TYPE {PREFIJO_PROMETHEUS}_ultima_ejecucion_timestamp_seconds gauge")
+        lineas.append(f"{PREFIJO_PROMETHEUS}_ultima_ejecucion_timestamp_seconds {time.time():.3f}")
+        return '\n'.join(lineas) + '\n'
+    
+    def exportar(self):
+        """Escribir el textfile de Prometheus (atómico: el collector nunca lee un archivo a medias)"""
+        if not self.prometheus_file:
+            return
+        os.makedirs(os.path.dirname(self.prometheus_file) or '.', exist_ok=True)
+        temporal = f"{self.prometheus_file}.{os.getpid()}.tmp"
+        with open(temporal, 'w') as f:
+            f.write(self.texto_prometheus())
+        os.replace(temporal, self.prometheus_file)
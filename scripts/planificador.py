@@ -0,0 +1,133 @@
+"""
+Planificador DAG - Proyecto LIDL
+Ejecuta tareas con dependencias en cuanto sus entradas están listas,
+con concurrencia acotada, reintentos y tiempos por tarea
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from observabilidad import obtener_logger
+
+logger = obtener_logger('planificador')
+
+
+class PlanificadorDAG:
+    """
+    Grafo de tareas {nombre: funcion, dependencias}. Cada tarea recibe como argumentos
+    los resultados de sus dependencias (en el orden declarado). Una tarea que falla tras
+    agotar sus reintentos marca como omitidas a todas las que dependen de ella.
+    """
+    
+    def __init__(self, max_concurrencia=4, reintentos=0, espera_reintento=1.0):
+        self.max_concurrencia = max_concurrencia
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+        self.tareas = {}
+        self.resultados = {}
+        # {tarea: {'estado', 'intentos', 'inicio', 'duracion', 'error'}}
+        self.tiempos = {}
+    
+    def agregar(self, nombre, funcion, dependencias=(), reintentos=None):
+        """Registrar una tarea; reintentos=None usa el valor por defecto del planificador"""
+        if nombre in self.tareas:
+            raise ValueError(f"Tarea duplicada: {nombre}")
+        self.tareas[nombre] = {
+            'funcion': funcion,
+            'dependencias': list(dependencias),
+            'reintentos': self.reintentos if reintentos is None else reintentos
+        }
+    
+    def _validar(self):
+        """Comprobar que las dependencias existen y que el grafo no tiene ciclos"""
+        for nombre, tarea in self.tareas.items():
+            faltantes = [d for d in tarea['dependencias'] if d not in self.tareas]
+            if faltantes:
+                raise ValueError(f"Tarea {nombre}: dependencias desconocidas {faltantes}")
+        
+        visitadas, en_curso = set(), set()
+    
+        def visitar(nombre):
+            if nombre in en_curso:
+                raise ValueError(f"Ciclo en el grafo de tareas en {nombre}")
+            if nombre in visitadas:
+                return
+            en_curso.add(nombre)
+            for dependencia in self.tareas[nombre]['dependencias']:
+                visitar(dependencia)
+            en_curso.discard(nombre)
+            visitadas.add(nombre)
+        
+        for nombre in self.tareas:
+            visitar(nombre)
+    
+    def _ejecutar_tarea(self, nombre):
+        """Ejecutar una tarea con sus reintentos. Retorna su resultado o lanza el último error"""
+        tarea = self.tareas[nombre]
+        argumentos = [self.resultados[d] for d in tarea['dependencias']]
+        registro = self.tiempos[nombre]
+        registro['inicio'] = time.time()
+        inicio = time.perf_counter()
+        
+        for intento in range(1, tarea['reintentos'] + 2):
+            registro['intentos'] = intento
+            try:
+                resultado = tarea['funcion'](*argumentos)
+                registro['duracion'] = time.perf_counter() - inicio
+                return resultado
+            except Exception as e:
+                registro['error'] = str(e)
+                if intento > tarea['reintentos']:
+                    registro['duracion'] = time.perf_counter() - inicio
+                    raise
+                logger.warning(f"  {nombre}: intento {intento} fallido ({e}), reintentando")
+                time.sleep(self.espera_reintento * intento)
+    
+    def _omitir_dependientes(self, fallida):
+        """Marcar como omitidas las tareas pendientes que dependen (directa o indirectamente) de una fallida"""
+        for nombre, tarea in self.tareas.items():
+            if self.tiempos[nombre]['estado'] == 'pendiente' and fallida in tarea['dependencias']:
+                self.tiempos[nombre]['estado'] = 'omitida'
+                self.tiempos[nombre]['error'] = f"dependencia fallida: {fallida}"
+                logger.warning(f"  {nombre}: omitida (falló {fallida})")
+                self._omitir_dependientes(nombre)
+    
+    def ejecutar(self):
+        """Ejecutar el grafo. Retorna {tarea: resultado} de las tareas completadas"""
+        self._validar()
+        self.resultados = {}
+        self.tiempos = {
+            nombre: {'estado': 'pendiente', 'intentos': 0, 'inicio': None, 'duracion': None, 'error': None}
+            for nombre in self.tareas
+        }
+        
+        with ThreadPoolExecutor(max_workers=self.max_concurrencia) as pool:
+            en_ejecucion = {}
+            while True:
+                # Lanzar todas las tareas cuyas dependencias ya terminaron
+                for nombre, tarea in self.tareas.items():
+                    listas = all(self.tiempos[d]['estado'] == 'completada' for d in tarea['dependencias'])
+                    if self.tiempos[nombre]['estado'] == 'pendiente' and listas:
+                        self.tiempos[nombre]['estado'] = 'en ejecucion'
+                        en_ejecucion[pool.submit(self._ejecutar_tarea, nombre)] = nombre
+                
+                if not en_ejecucion:
+                    break
+                
+                terminadas, _ = wait(en_ejecucion, return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    nombre = en_ejecucion.pop(futuro)
+                    try:
+                        self.resultados[nombre] = futuro.result()
+                        self.tiempos[nombre]['estado'] = 'completada'
+                        logger.info(f"✓ {nombre}: {self.tiempos[nombre]['duracion']:.2f} s")
+                    except Exception as e:
+                        self.tiempos[nombre]['estado'] = 'fallida'
+                        logger.error(f"❌ {nombre}: {e}")
+                        self._omitir_dependientes(nombre)
+        
+        return self.resultados
+    
+    def fallidas(self):
+        """Tareas fallidas u omitidas en la última ejecución"""
+        return [nombre for nombre, t in self.tiempos.items() if t['estado'] in ('fallida', 'omitida')]
@@ -0,0 +1,81 @@
+"""
+Reglas de Limpieza Silver - Proyecto LIDL
+Especificación declarativa por tabla que LimpiezaSilver compila a un único select + filter
+(motor Spark) o a operaciones Arrow compute (MotorArrow)
+"""
+
+# Silver se particiona por rangos de la clave de negocio: los clientes nuevos
+# (codigo creciente) caen en las últimas particiones y un MERGE solo reescribe esas
+COLUMNA_PARTICION = 'rango_codigo'
+TAMANO_RANGO_CODIGO = 100_000
+
+# Por tabla (clave = nombre de la fuente Bronze):
+#   tabla:    nombre base (<tabla>_bronze.parquet -> <tabla>_silver.parquet)
+#   clave:    clave de negocio (upsert y particionado)
+#   columnas: {columna: regla}. Las columnas sin regla pasan sin cambios. Regla:
+#       tipo:       'texto' (defecto, con trim) | 'int' | 'double' | 'fecha' (trim + to_date)
+#       formato:    patrón de fecha (sintaxis Spark), por defecto 'yyyy-MM-dd'
+#       espacios:   True para colapsar espacios internos repetidos
+#       caso:       'upper' | 'lower'
+#       reemplazar: (regex, reemplazo)
+#       mapa:       {valor_destino: [valores_origen]}; otro: valor si no coincide ninguno
+#       nulo:       valor con el que se rellenan los nulos
+#       requerido:  True para descartar filas nulas (regla de descarte 'nulo_<columna>')
+#   filtros:  {nombre_regla: {'columna': c, 'min': x, 'max': y}} reglas de negocio (inclusivas)
+TABLAS_SILVER = {
+    'extra': {
+        'tabla': 'clientes_extra',
+        'clave': 'codigo',
+        'columnas': {
+            'codigo': {'tipo': 'int', 'requerido': True},
+            'tipo_servicio': {'caso': 'upper', 'nulo': 'LOCAL'},
+            'codigo_unico': {'caso': 'upper', 'requerido': True},
+            'fecha_afiliacion': {'tipo': 'fecha'}
+        },
+        'filtros': {}
+    },
+    'info': {
+        'tabla': 'clientes_info',
+        'clave': 'codigo_cliente',
+        'columnas': {
+            'codigo_cliente': {'tipo': 'int'},
+            'tarjeta_beneficios': {
+                'mapa': {'SI': ['SI', 'YES', 'Y', '1'], 'NO': ['NO', 'N', '0']},
+                'otro': 'NO'
+            },
+            'tipo_cliente': {'tipo': 'int'},
+            'promedio_compras': {'tipo': 'double', 'nulo': 0},
+            'tipo_alimentacion': {'caso': 'lower', 'nulo': 'No Aplica'},
+            'tiempo_permanencia_min': {'tipo': 'int', 'nulo': 0}
+        },
+        'filtros': {
+            'tipo_cliente_rango': {'columna': 'tipo_cliente', 'min': 1, 'max': 5},
+            'promedio_compras_negativo': {'columna': 'promedio_compras', 'min': 0},
+            'tiempo_permanencia_rango': {'columna': 'tiempo_permanencia_min', 'min': 0, 'max': 120}
+        }
+    },
+    'clientes': {
+        'tabla': 'clientes',
+        'clave': 'codigo',
+        'columnas': {
+            'codigo': {'tipo': 'int', 'requerido': True},
+            'nombre': {'espacios': True, 'requerido': True},
+            'apellido': {'espacios': True, 'requerido': True},
+            'comuna': {'espacios': True, 'nulo': 'Sin Comuna'},
+            'rut': {'caso': 'upper', 'reemplazar': (r'[.\-]', ''), 'requerido': True},
+            'fecha_nacimiento': {'tipo': 'fecha'},
+            'religion': {'nulo': 'Sin especificar'}
+        },
+        'filtros': {}
+    }
+}
+
+
+def reglas_descarte(especificacion):
+    """Reglas de descarte en orden: nulos de columnas requeridas y luego filtros de negocio"""
+    reglas = {
+        f'nulo_{columna}': {'columna': columna, 'requerido': True}
+        for columna, regla in especificacion['columnas'].items() if regla.get('requerido')
+    }
+    reglas.update(especificacion.get('filtros', {}))
+    return reglas
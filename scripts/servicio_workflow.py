@@ -0,0 +1,215 @@
+"""
+Servicio Workflow - Proyecto LIDL
+Modo daemon: mantiene una SparkSession configurada y un pool de procesos de ingesta vivos
+entre ejecuciones y ejecuta las peticiones que llegan por una cola local o como archivos
+JSON en un directorio vigilado, sin pagar el arranque de la JVM en cada micro-lote
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sesion_spark import crear_sesion, calentar, sesion_activa
+from observabilidad import obtener_logger
+
+logger = obtener_logger('servicio_workflow')
+
+DIRECTORIO_PETICIONES = 'peticiones'
+INTERVALO_SONDEO = 2.0  # segundos entre revisiones del directorio de peticiones
+
+# Opciones que acepta una petición (las mismas que los flags de main.py)
+OPCIONES_PETICION = {'incremental', 'full_refresh', 'motor', 'en_memoria', 'cache'}
+
+# Subdirectorios: una petición pasa de pendientes a en_curso y de ahí a completadas o fallidas
+ESTADOS = ['pendientes', 'en_curso', 'completadas', 'fallidas']
+
+
+def validar_opciones(opciones):
+    """Error si la petición trae opciones que el workflow no conoce"""
+    desconocidas = set(opciones) - OPCIONES_PETICION
+    if desconocidas:
+        raise ValueError(f"Opciones desconocidas: {', '.join(sorted(desconocidas))}")
+
+
+def encolar(opciones, directorio=DIRECTORIO_PETICIONES):
+    """
+    Dejar una petición en <directorio>/pendientes para un servicio en marcha (otro proceso,
+    cron...). Se escribe con otro nombre y se renombra: el servicio nunca lee un JSON a medias
+    """
+    validar_opciones(opciones)
+    pendientes = os.path.join(directorio, 'pendientes')
+    os.makedirs(pendientes, exist_ok=True)
+    
+    # El nombre empieza por la fecha: las peticiones se atienden en orden de llegada
+    nombre = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{uuid.uuid4().hex[:8]}.json"
+    temporal = os.path.join(pendientes, f".{nombre}.tmp")
+    with open(temporal, 'w') as f:
+        json.dump(opciones, f, indent=2)
+    os.replace(temporal, os.path.join(pendientes, nombre))
+    return nombre
+
+
+class ServicioWorkflow:
+    """
+    ejecutar(opciones, sesion, pool): ejecuta una petición contra la sesión y el pool
+    compartidos y retorna un dict con al menos 'exito'. Las peticiones se atienden de una en
+    una (todas escriben las mismas tablas); primero las de la cola local y después las del
+    directorio, por orden de nombre
+    """
+    
+    def __init__(self, ejecutar, directorio=DIRECTORIO_PETICIONES, intervalo=INTERVALO_SONDEO,
+                 trabajadores=None, config_spark=None, spark=True):
+        self.ejecutar = ejecutar
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.trabajadores = trabajadores or os.cpu_count() or 1
+        self.config_spark = config_spark
+        # spark=False: servicio solo con el motor Arrow (sin JVM)
+        self.usar_spark = spark
+        self.sesion = None
+        self.pool = None
+        self.cola = queue.Queue()
+        self.ejecuciones = 0
+        self._detener = threading.Event()
+    
+    def _ruta(self, estado, nombre=''):
+        return os.path.join(self.directorio, estado, nombre)
+    
+    def encolar(self, opciones):
+        """Petición en memoria (mismo proceso); se atiende antes que las del directorio"""
+        validar_opciones(opciones)
+        self.cola.put(dict(opciones))
+    
+    def detener(self, *_):
+        """Terminar tras la petición en curso (también con SIGTERM / SIGINT)"""
+        logger.info("🛑 Parada solicitada: se termina la petición en curso")
+        self._detener.set()
+    
+    def _iniciar_pool(self):
+        """
+        Pool de ingesta creado y con sus procesos arrancados antes que la JVM, para que los
+        workers no hereden por fork los hilos de la pasarela de Spark
+        """
+        self.pool = ProcessPoolExecutor(max_workers=self.trabajadores)
+        for futuro in [self.pool.submit(os.getpid) for _ in range(self.trabajadores)]:
+            futuro.result()
+    
+    def _iniciar_spark(self):
+        inicio = time.perf_counter()
+        self.sesion = crear_sesion("LIDL - Servicio Workflow", self.config_spark)
+        arranque = time.perf_counter() - inicio
+        logger.info(f"✓ Sesión Spark iniciada en {arranque:.1f} s (calentamiento {calentar(self.sesion):.1f} s)")
+    
+    def iniciar(self):
+        for estado in ESTADOS:
+            os.makedirs(self._ruta(estado), exist_ok=True)
+        
+        # Peticiones que quedaron a medias si el servicio anterior murió: se reintentan
+        for nombre in sorted(os.listdir(self._ruta('en_curso'))):
+            logger.warning(f"  Petición interrumpida, se reintenta: {nombre}")
+            os.replace(self._ruta('en_curso', nombre), self._ruta('pendientes', nombre))
+        
+        self._iniciar_pool()
+        if self.usar_spark:
+            self._iniciar_spark()
+    
+    def _reparar(self):
+        """Tras una petición fallida: recrear el pool si algún worker murió y la sesión si se cerró"""
+        try:
+            self.pool.submit(os.getpid).result()
+        except Exception:
+            logger.warning("  Pool de ingesta roto: se recrea")
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self._iniciar_pool()
+        if self.usar_spark and not sesion_activa(self.sesion):
+            logger.warning("  Sesión Spark detenida: se recrea")
+            self._iniciar_spark()
+    
+    def _siguiente(self):
+        """(nombre del archivo o None, opciones) de la próxima petición; None si no hay"""
+        try:
+            return None, self.cola.get_nowait()
+        except queue.Empty:
+            pass
+        
+        for nombre in sorted(os.listdir(self._ruta('pendientes'))):
+            if not nombre.endswith('.json'):
+                continue
+            # El renombrado reclama la petición: si otro servicio la tomó antes, falla
+            try:
+                os.replace(self._ruta('pendientes', nombre), self._ruta('en_curso', nombre))
+            except FileNotFoundError:
+                continue
+            try:
+                with open(self._ruta('en_curso', nombre)) as f:
+                    opciones = json.load(f)
+            except ValueError as e:
+                self._archivar(nombre, {}, {'exito': False, 'error': f"JSON inválido: {e}"})
+                continue
+            return nombre, opciones
+        return None
+    
+    def _archivar(self, nombre, opciones, resultado):
+        """Mover la petición a completadas/fallidas con su resultado"""
+        destino = 'completadas' if resultado.get('exito') else 'fallidas'
+        with open(self._ruta(destino, nombre), 'w') as f:
+            json.dump({'opciones': opciones, 'resultado': resultado}, f, indent=2, default=str)
+        os.remove(self._ruta('en_curso', nombre))
+    
+    def atender(self, nombre, opciones):
+        """Ejecutar una petición con la sesión y el pool compartidos"""
+        self.ejecuciones += 1
+        logger.info(f"\n📨 Petición {nombre or '(cola local)'} #{self.ejecuciones}: {opciones}")
+        inicio = time.perf_counter()
+        resultado = {'inicio': datetime.now().isoformat()}
+        try:
+            validar_opciones(opciones)
+            resultado.update(self.ejecutar(opciones, self.sesion, self.pool))
+        except Exception as e:
+            logger.error(f"❌ Error en la petición: {e}")
+            resultado.update({'exito': False, 'error': str(e)})
+        resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+        
+        if not resultado.get('exito'):
+            self._reparar()
+        if nombre:
+            self._archivar(nombre, opciones, resultado)
+        logger.info(f"{'✓' if resultado.get('exito') else '❌'} Petición terminada en {resultado['segundos']:.2f} s")
+        return resultado
+    
+    def ejecutar_servicio(self, max_peticiones=None):
+        """
+        Atender peticiones hasta detener() o hasta max_peticiones. La sesión Spark y el pool
+        se crean una vez y se cierran al salir
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.detener)
+            signal.signal(signal.SIGINT, self.detener)
+        
+        logger.info("="*60)
+        logger.info(f"🛎️  SERVICIO WORKFLOW LIDL - peticiones en {self.directorio}/pendientes")
+        logger.info("="*60)
+        self.iniciar()
+        try:
+            while not self._detener.is_set():
+                if max_peticiones is not None and self.ejecuciones >= max_peticiones:
+                    break
+                siguiente = self._siguiente()
+                if siguiente is None:
+                    self._detener.wait(self.intervalo)
+                    continue
+                self.atender(*siguiente)
+        finally:
+            if self.sesion is not None:
+                self.sesion.stop()
+                logger.info("✓ Sesión Spark cerrada")
+            if self.pool is not None:
+                self.pool.shutdown()
+        logger.info(f"✓ Servicio detenido ({self.ejecuciones} peticiones atendidas)")
+        return self.ejecuciones
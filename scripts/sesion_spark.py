@@ -0,0 +1,65 @@
+"""
+Sesión Spark - Proyecto LIDL
+Configuración común de las sesiones Spark (particiones de shuffle, memoria y Arrow) y
+calentamiento de una sesión de larga duración para el modo servicio
+"""
+
+import os
+import time
+
+from pyspark.sql import SparkSession
+
+# La memoria del driver solo tiene efecto si la sesión arranca la JVM (no con spark-submit)
+MEMORIA_DRIVER = '4g'
+MEMORIA_EXECUTOR = '4g'
+
+# Con 200 particiones de shuffle (el valor por defecto) las tablas de clientes generan
+# cientos de tareas casi vacías; AQE las une después, pero el planificado ya se pagó
+PARTICIONES_SHUFFLE = 4 * (os.cpu_count() or 1)
+
+CONFIG_SPARK = {
+    'spark.sql.adaptive.enabled': 'true',
+    'spark.sql.adaptive.coalescePartitions.enabled': 'true',
+    'spark.sql.adaptive.skewJoin.enabled': 'true',
+    'spark.sql.shuffle.partitions': str(PARTICIONES_SHUFFLE),
+    'spark.sql.legacy.timeParserPolicy': 'CORRECTED',
+    'spark.driver.memory': MEMORIA_DRIVER,
+    'spark.executor.memory': MEMORIA_EXECUTOR,
+    'spark.memory.fraction': '0.6',
+    # Arrow para createDataFrame desde las entregas en memoria de Bronze y para toPandas
+    'spark.sql.execution.arrow.pyspark.enabled': 'true',
+    'spark.sql.execution.arrow.pyspark.fallback.enabled': 'true',
+    'spark.sql.execution.arrow.maxRecordsPerBatch': '50000'
+}
+
+
+def crear_sesion(nombre, config=None):
+    """
+    SparkSession con CONFIG_SPARK (config: claves que se sobrescriben). Si ya hay una sesión
+    activa en el proceso, getOrCreate la reutiliza y las opciones estáticas (memoria) se ignoran
+    """
+    builder = SparkSession.builder.appName(nombre)
+    for clave, valor in {**CONFIG_SPARK, **(config or {})}.items():
+        builder = builder.config(clave, valor)
+    return builder.getOrCreate()
+
+
+def calentar(spark):
+    """
+    Ejecutar un job con shuffle para que la JVM cargue las clases de SQL y arranquen los
+    executors antes de la primera ejecución real. Retorna los segundos empleados
+    """
+    inicio = time.perf_counter()
+    spark.range(0, 100_000, numPartitions=PARTICIONES_SHUFFLE) \
+        .selectExpr('id % 97 AS clave') \
+        .groupBy('clave').count() \
+        .collect()
+    return time.perf_counter() - inicio
+
+
+def sesion_activa(spark):
+    """True si la sesión sigue utilizable (su SparkContext no se ha detenido)"""
+    try:
+        return not spark.sparkContext._jsc.sc().isStopped()
+    except Exception:
+        return False
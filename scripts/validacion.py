@@ -0,0 +1,179 @@
+"""
+Motor de Validación - Proyecto LIDL
+Validación declarativa y vectorizada (Arrow compute) reutilizable por cualquier fuente
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from observabilidad import obtener_logger
+
+logger = obtener_logger('validacion')
+
+# Literales aceptados al normalizar texto a número. 'entero' acepta lo mismo que 'numero'
+# (como pd.to_numeric en la validación original: '2.0' o '1e3' son códigos válidos)
+_PATRON_NUMERO = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+# Ceros a la izquierda de cada campo numérico ('2024-01-05' -> '2024-1-5')
+_CEROS_IZQUIERDA = r'(^|\D)0+(\d)'
+
+NUM_EJEMPLOS = 3
+
+
+class ResultadoValidacion:
+    """
+    Resultado compacto de una validación:
+    - conteos: {campo: registros inválidos}
+    - bitmaps: {campo: máscara de inválidos empaquetada con np.packbits (1 bit por fila)}
+    - ejemplos: {campo: hasta NUM_EJEMPLOS filas inválidas como (índice, valor)}
+    - fallos: {campo: mensaje} cuando la regla no se pudo evaluar
+    """
+    
+    def __init__(self, total=0, conteos=None, bitmaps=None, ejemplos=None, fallos=None):
+        self.total = total
+        self.conteos = conteos or {}
+        self.bitmaps = bitmaps or {}
+        self.ejemplos = ejemplos or {}
+        self.fallos = fallos or {}
+    
+    def invalidos(self, campo):
+        """Máscara booleana de filas que violan la regla del campo"""
+        return np.unpackbits(self.bitmaps[campo], count=self.total).astype(bool)
+    
+    def errores(self):
+        """Errores en el formato de ingesta_stats.json"""
+        errores = [f"{campo}: {n} registros inválidos" for campo, n in self.conteos.items() if n > 0]
+        errores += [f"{campo}: Error en validación - {msg}" for campo, msg in self.fallos.items()]
+        return errores
+    
+    @staticmethod
+    def combinar(resultados):
+        """Unir resultados de bloques consecutivos (rangos o record batches) en uno solo"""
+        combinado = ResultadoValidacion()
+        segmentos = {}
+        for resultado in resultados:
+            for campo, n in resultado.conteos.items():
+                combinado.conteos[campo] = combinado.conteos.get(campo, 0) + n
+            for campo in resultado.bitmaps:
+                segmentos.setdefault(campo, []).append((combinado.total, resultado.invalidos(campo)))
+            for campo, ejemplos in resultado.ejemplos.items():
+                actuales = combinado.ejemplos.setdefault(campo, [])
+                actuales.extend((combinado.total + i, v) for i, v in ejemplos[:NUM_EJEMPLOS - len(actuales)])
+            combinado.fallos.update(resultado.fallos)
+            combinado.total += resultado.total
+        
+        for campo, partes in segmentos.items():
+            mascara = np.zeros(combinado.total, dtype=bool)
+            for inicio, parte in partes:
+                mascara[inicio:inicio + len(parte)] = parte
+            combinado.bitmaps[campo] = np.packbits(mascara)
+        return combinado
+
+
+class MotorValidacion:
+    """
+    Valida una tabla contra un esquema declarativo:
+    esquema: {columna: {'tipo': 'texto'|'entero'|'numero'|'fecha',
+                        'valores': [...], 'regex': '...', 'min': x, 'max': y,
+                        'formato': '%Y-%m-%d', 'nulos': False}}
+    Cada columna se normaliza una sola vez (trim + conversión de tipo) y todas sus
+    reglas se evalúan sobre esa columna normalizada.
+    """
+    
+    def __init__(self, esquema):
+        self.esquema = esquema
+    
+    def _a_tabla(self, datos):
+        """Aceptar DataFrame de pandas, Table o RecordBatch de Arrow"""
+        if isinstance(datos, pa.Table):
+            return datos
+        if isinstance(datos, pa.RecordBatch):
+            return pa.Table.from_batches([datos])
+        
+        columnas = {}
+        for campo in datos.columns:
+            try:
+                columnas[campo] = pa.array(datos[campo], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Columnas object con tipos mezclados: validar su representación como texto
+                columnas[campo] = pa.array(
+                    [None if pd.isna(v) else str(v) for v in datos[campo]], type=pa.string()
+                )
+        return pa.table(columnas)
+    
+    def normalizar(self, columna, regla):
+        """Convertir la columna al tipo declarado; los valores no convertibles quedan null"""
+        tipo = regla.get('tipo', 'texto')
+        es_texto = pa.types.is_string(columna.type) or pa.types.is_large_string(columna.type)
+        
+        if tipo == 'texto' or es_texto:
+            texto = pc.utf8_trim_whitespace(columna if es_texto else pc.cast(columna, pa.string()))
+        
+        if tipo in ('entero', 'numero'):
+            if not es_texto:
+                return pc.cast(columna, pa.float64())
+            validos = pc.fill_null(pc.match_substring_regex(texto, _PATRON_NUMERO), False)
+            return pc.cast(pc.if_else(validos, texto, pa.scalar(None, pa.string())), pa.float64())
+        
+        if tipo == 'fecha':
+            if not es_texto:
+                return columna
+            formato = regla.get('formato', '%Y-%m-%d')
+            fechas = pc.strptime(texto, format=formato, unit='s', error_is_null=True)
+            # strptime desborda fechas imposibles (2024-02-30 -> 2024-03-01): al volver a
+            # formatearlas no coinciden con el texto (se comparan sin ceros a la izquierda,
+            # que strptime no exige)
+            inexistentes = pc.not_equal(
+                pc.replace_substring_regex(pc.strftime(fechas, format=formato), _CEROS_IZQUIERDA, r'\1\2'),
+                pc.replace_substring_regex(texto, _CEROS_IZQUIERDA, r'\1\2')
+            )
+            return pc.if_else(pc.fill_null(inexistentes, False), pa.scalar(None, fechas.type), fechas)
+        
+        return texto
+    
+    def evaluar(self, valores, regla):
+        """Máscara de filas inválidas para una columna ya normalizada"""
+        condiciones = []
+        if not regla.get('nulos', False):
+            condiciones.append(pc.is_null(valores))
+        if 'valores' in regla:
+            condiciones.append(pc.invert(pc.is_in(valores, value_set=pa.array(regla['valores']))))
+        if 'regex' in regla:
+            condiciones.append(pc.invert(pc.match_substring_regex(valores, regla['regex'])))
+        if 'min' in regla:
+            condiciones.append(pc.less(valores, regla['min']))
+        if 'max' in regla:
+            condiciones.append(pc.greater(valores, regla['max']))
+        
+        if not condiciones:
+            return np.zeros(len(valores), dtype=bool)
+        invalido = pc.fill_null(condiciones[0], False)
+        for condicion in condiciones[1:]:
+            invalido = pc.or_(invalido, pc.fill_null(condicion, False))
+        return np.asarray(invalido, dtype=bool)
+    
+    def validar(self, datos):
+        """Evaluar todas las reglas del esquema en una pasada. Retorna ResultadoValidacion"""
+        tabla = self._a_tabla(datos)
+        resultado = ResultadoValidacion(total=tabla.num_rows)
+        
+        for campo, regla in self.esquema.items():
+            if campo not in tabla.column_names:
+                continue
+            try:
+                columna = tabla.column(campo)
+                mascara = self.evaluar(self.normalizar(columna, regla), regla)
+                
+                resultado.conteos[campo] = int(mascara.sum())
+                resultado.bitmaps[campo] = np.packbits(mascara)
+                if resultado.conteos[campo]:
+                    indices = np.flatnonzero(mascara)[:NUM_EJEMPLOS]
+                    resultado.ejemplos[campo] = list(zip(indices.tolist(), columna.take(indices).to_pylist()))
+                    # Log algunos ejemplos de valores inválidos para debugging
+                    logger.debug(f"  Ejemplos de {campo} inválidos: {resultado.ejemplos[campo]}")
+            except Exception as e:
+                resultado.fallos[campo] = str(e)
+        
+        return resultado
@@ -0,0 +1,57 @@
+"""
+Configuración común de los tests: los módulos del pipeline viven en scripts/ (como en
+main.py) y sus logs y salidas van a directorios temporales, no al repositorio
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'scripts'))
+
+import observabilidad  # noqa: E402
+
+# Antes de importar cualquier otro módulo: cada logger abre su archivo al crearse
+observabilidad.DIRECTORIO_LOGS = tempfile.mkdtemp(prefix='lidl-logs-')
+
+
+@pytest.fixture(autouse=True)
+def directorio_trabajo(tmp_path, monkeypatch):
+    """Ejecutar cada test en su directorio (logs/, métricas y estado relativos)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope='session')
+def spark():
+    """SparkSession compartida por los tests; se omiten si no hay Java"""
+    if shutil.which('java') is None and not os.environ.get('JAVA_HOME'):
+        pytest.skip("Spark necesita Java")
+    from sesion_spark import crear_sesion
+    sesion = crear_sesion('LIDL - Tests', {'spark.sql.shuffle.partitions': '2', 'spark.ui.enabled': 'false'})
+    yield sesion
+    sesion.stop()
+
+
+def construir_silver_muestra(directorio):
+    """Bronze y Silver (motor Arrow) de los archivos de muestra del repositorio. Retorna la ruta Silver"""
+    from ingesta_bronze import IngestaBronze, FUENTES_DEFAULT
+    from limpieza_silver import LimpiezaSilver
+    
+    bronze_path, silver_path = os.path.join(directorio, 'bronze'), os.path.join(directorio, 'silver')
+    ingesta = IngestaBronze(output_path=bronze_path, workers_por_archivo=1)
+    for fuente, (metodo, archivo) in FUENTES_DEFAULT.items():
+        ingesta.registrar_fuente(fuente, metodo, os.path.join(RAIZ, archivo))
+    ingesta.ejecutar_ingesta()
+    LimpiezaSilver(input_path=bronze_path, output_path=silver_path, motor='arrow').ejecutar_limpieza()
+    return silver_path
+
+
+@pytest.fixture
+def silver_muestra(tmp_path):
+    """Silver de los archivos de muestra (ver construir_silver_muestra)"""
+    return construir_silver_muestra(str(tmp_path))
@@ -0,0 +1,97 @@
+"""Tests de CacheEtapas: aciertos, fallos, invalidación por entradas, restauración y LRU"""
+
+import os
+
+from cache_etapas import CacheEtapas
+
+
+def _escribir_salida(salida, contenido):
+    """Dataset de un part file con `contenido` (reemplaza lo que hubiera)"""
+    os.makedirs(salida, exist_ok=True)
+    for archivo in os.listdir(salida):
+        os.remove(os.path.join(salida, archivo))
+    with open(os.path.join(salida, 'part-00000.parquet'), 'w') as f:
+        f.write(contenido)
+
+
+def _leer_salida(salida):
+    with open(os.path.join(salida, 'part-00000.parquet')) as f:
+        return f.read()
+
+
+def _clave(cache, entrada):
+    return cache.clave('silver', entrada, cache.huella_archivo(entrada))
+
+
+def test_fallo_acierto_e_invalidacion_por_entradas(tmp_path):
+    cache = CacheEtapas(directorio=str(tmp_path / 'cache'))
+    entrada, salida = str(tmp_path / 'clientes.sql'), str(tmp_path / 'silver' / 'clientes')
+    with open(entrada, 'w') as f:
+        f.write('INSERT INTO clientes VALUES (1);')
+    
+    clave = _clave(cache, entrada)
+    assert cache.buscar('silver', clave) is None
+    _escribir_salida(salida, 'v1')
+    cache.guardar('silver', clave, salida, {'registros': 1})
+    
+    # Otra instancia lee el índice persistido
+    cache = CacheEtapas(directorio=str(tmp_path / 'cache'))
+    assert cache.buscar('silver', _clave(cache, entrada)) == {'registros': 1}
+    assert cache.version_actual(salida) == clave
+    
+    with open(entrada, 'a') as f:
+        f.write('\nINSERT INTO clientes VALUES (2);')
+    assert _clave(cache, entrada) != clave
+    assert cache.buscar('silver', _clave(cache, entrada)) is None
+
+
+def test_restaurar_version_con_hard_links(tmp_path):
+    cache = CacheEtapas(directorio=str(tmp_path / 'cache'))
+    salida = str(tmp_path / 'silver' / 'clientes')
+    _escribir_salida(salida, 'v1')
+    cache.guardar('silver', 'clave-v1', salida)
+    _escribir_salida(salida, 'v2')
+    cache.guardar('silver', 'clave-v2', salida)
+    
+    assert cache.buscar('silver', 'clave-v1') is not None
+    assert _leer_salida(salida) == 'v1'
+    assert cache.version_actual(salida) == 'clave-v1'
+    # La salida restaurada comparte los archivos con la cache (sin copia)
+    cacheado = os.path.join(cache.directorio, 'silver', 'clave-v1', 'part-00000.parquet')
+    assert os.path.samefile(os.path.join(salida, 'part-00000.parquet'), cacheado)
+
+
+def test_salida_modificada_fuera_de_la_cache_se_restaura(tmp_path):
+    cache = CacheEtapas(directorio=str(tmp_path / 'cache'))
+    salida = str(tmp_path / 'silver' / 'clientes')
+    _escribir_salida(salida, 'v1')
+    cache.guardar('silver', 'clave-v1', salida)
+    
+    # Otra ejecución sin cache reescribe la salida: la firma ya no coincide
+    _escribir_salida(salida, 'otra cosa')
+    assert cache.version_actual(salida) is None
+    assert cache.buscar('silver', 'clave-v1') is not None
+    assert _leer_salida(salida) == 'v1'
+
+
+def test_desalojo_lru_por_tamano_y_versiones(tmp_path):
+    # Cada versión ocupa 100 bytes: caben dos
+    cache = CacheEtapas(directorio=str(tmp_path / 'cache'), tamano_maximo=250, versiones_por_salida=3)
+    salidas = {nombre: str(tmp_path / 'silver' / nombre) for nombre in ('a', 'b', 'c')}
+    for nombre in ('a', 'b'):
+        _escribir_salida(salidas[nombre], nombre * 100)
+        cache.guardar('silver', f'clave-{nombre}', salidas[nombre])
+    
+    # 'a' se usó después que 'b': al entrar 'c' se desaloja 'b', la menos usada
+    assert cache.buscar('silver', 'clave-a') is not None
+    _escribir_salida(salidas['c'], 'c' * 100)
+    cache.guardar('silver', 'clave-c', salidas['c'])
+    assert sorted(cache.indice['entradas']) == ['silver/clave-a', 'silver/clave-c']
+    assert not os.path.exists(os.path.join(cache.directorio, 'silver', 'clave-b'))
+    
+    # Versiones por salida: solo las más recientes de la misma salida
+    cache = CacheEtapas(directorio=str(tmp_path / 'cache2'), versiones_por_salida=2)
+    for version in range(3):
+        _escribir_salida(salidas['a'], f'v{version}')
+        cache.guardar('silver', f'clave-{version}', salidas['a'])
+    assert sorted(cache.indice['entradas']) == ['silver/clave-1', 'silver/clave-2']
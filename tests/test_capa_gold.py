@@ -0,0 +1,35 @@
+"""Tests de CapaGold (motor Arrow): escritura de la tabla desnormalizada"""
+
+import os
+
+import pyarrow.dataset as ds
+import pytest
+
+import capa_gold
+from capa_gold import CapaGold
+
+
+def _filas(output_file):
+    return ds.dataset(output_file, format='parquet', partitioning='hive').count_rows()
+
+
+def test_reconstruir_gold_no_duplica_filas(tmp_path, silver_muestra):
+    gold = CapaGold(input_path=silver_muestra, output_path=str(tmp_path / 'gold'), motor='arrow')
+    registros = gold.ejecutar_gold()['registros']
+    gold.ejecutar_gold()
+    
+    assert _filas(gold.output_file) == registros == 500
+
+
+def test_escritura_fallida_conserva_gold(tmp_path, silver_muestra, monkeypatch):
+    gold = CapaGold(input_path=silver_muestra, output_path=str(tmp_path / 'gold'), motor='arrow')
+    registros = gold.ejecutar_gold()['registros']
+    
+    def fallar(*args, **kwargs):
+        raise OSError('disco lleno')
+    monkeypatch.setattr(capa_gold.ds, 'write_dataset', fallar)
+    with pytest.raises(OSError):
+        gold.ejecutar_gold()
+    
+    assert _filas(gold.output_file) == registros
+    assert not [e for e in os.listdir(gold.output_file) if e.startswith('.')]
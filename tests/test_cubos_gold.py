@@ -0,0 +1,92 @@
+"""Tests de CubosGold: actualización incremental frente a reconstrucción completa"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pytest
+
+import cubos_gold
+import motor_arrow
+from conftest import construir_silver_muestra
+from cubos_gold import CubosGold, CUBOIDES
+from layout_parquet import columnas_derivadas
+from motor_arrow import MotorArrow
+from reglas_silver import COLUMNA_PARTICION
+
+# Error típico de HLL con 2^10 registros ~3%; margen holgado para no depender de la semilla del hash
+TOLERANCIA_HLL = 0.08
+
+
+@pytest.fixture
+def silver_por_rangos(tmp_path, monkeypatch):
+    """Silver de muestra particionado en rangos de 100 códigos (los 500 clientes en 5 rangos)"""
+    monkeypatch.setattr(motor_arrow, 'TAMANO_RANGO_CODIGO', 100)
+    monkeypatch.setattr(cubos_gold, 'TAMANO_RANGO_CODIGO', 100)
+    return construir_silver_muestra(str(tmp_path))
+
+
+def _modificar_clientes(silver_path):
+    """Merge en clientes: cambia la comuna de los códigos 201-220 y agrega los códigos 501-510"""
+    output_file = os.path.join(silver_path, 'clientes_silver.parquet')
+    actual = ds.dataset(output_file, format='parquet', partitioning='hive').to_table()
+    actual = actual.drop([c for c in [COLUMNA_PARTICION] + columnas_derivadas() if c in actual.column_names])
+    codigos = actual.column('codigo')
+    
+    cambiados = actual.filter(pc.and_(pc.greater_equal(codigos, 201), pc.less_equal(codigos, 220)))
+    cambiados = cambiados.set_column(cambiados.schema.get_field_index('comuna'), 'comuna',
+                                     pa.array(['Comuna Nueva'] * cambiados.num_rows, cambiados.schema.field('comuna').type))
+    nuevos = actual.filter(pc.less_equal(codigos, 10))
+    nuevos = nuevos.set_column(nuevos.schema.get_field_index('codigo'), 'codigo',
+                               pc.add(nuevos.column('codigo'), pa.scalar(500, codigos.type)))
+    MotorArrow().escribir(pa.concat_tables([cambiados, nuevos]), output_file, 'codigo', es_merge=True)
+
+
+def _celdas(cubos, nombre):
+    celdas = pd.read_parquet(cubos._ruta_cuboide(nombre))
+    claves = [COLUMNA_PARTICION] + CUBOIDES[nombre]
+    return celdas.sort_values(claves, na_position='first').reset_index(drop=True)
+
+
+def test_incremental_igual_que_reconstruccion_completa(tmp_path, silver_por_rangos):
+    incremental = CubosGold(input_path=silver_por_rangos, output_path=str(tmp_path / 'gold'))
+    assert incremental.actualizar()['modo'] == 'completo'
+    
+    _modificar_clientes(silver_por_rangos)
+    estado = incremental.actualizar()
+    assert estado['modo'] == 'incremental'
+    assert estado['rangos_recalculados'] == [2, 5]
+    
+    completo = CubosGold(input_path=silver_por_rangos, output_path=str(tmp_path / 'gold_completo'))
+    completo.actualizar(full_refresh=True)
+    for nombre in CUBOIDES:
+        pd.testing.assert_frame_equal(_celdas(incremental, nombre), _celdas(completo, nombre))
+    
+    # Sin cambios en Silver no se recalcula nada
+    assert incremental.actualizar()['modo'] == 'sin cambios'
+
+
+def test_consultas_contra_gold_y_distintos_aproximados(tmp_path, silver_por_rangos):
+    cubos = CubosGold(input_path=silver_por_rangos, output_path=str(tmp_path / 'gold'))
+    cubos.actualizar()
+    _modificar_clientes(silver_por_rangos)
+    cubos.actualizar()
+    gold, _ = cubos.gold.unir_arrow()
+    gold = gold.to_pandas()
+    
+    total = cubos.consultar()
+    assert int(total['registros'].iloc[0]) == len(gold)
+    assert total['promedio_promedio_compras'].iloc[0] == pytest.approx(gold['promedio_compras'].mean())
+    
+    por_tipo = cubos.consultar(['tipo_cliente']).set_index('tipo_cliente')
+    exactos = gold.groupby('tipo_cliente')['rut'].nunique()
+    for tipo, distintos in exactos.items():
+        assert int(por_tipo.loc[tipo, 'registros']) == int((gold['tipo_cliente'] == tipo).sum())
+        assert abs(por_tipo.loc[tipo, 'distintos_rut'] - distintos) <= TOLERANCIA_HLL * distintos
+    
+    # Los códigos 501-510 repiten los RUT de 1-10: los distintos no crecen con ellos
+    assert abs(total['distintos_rut'].iloc[0] - gold['rut'].nunique()) <= TOLERANCIA_HLL * gold['rut'].nunique()
+    assert np.isclose(cubos.consultar(filtros={'comuna': 'Comuna Nueva'})['registros'].iloc[0], 20)
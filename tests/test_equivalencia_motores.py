@@ -0,0 +1,142 @@
+"""
+Equivalencia de motores Silver: MotorArrow y Spark deben producir el mismo Silver (salvo
+processed_at) con los datos de muestra, con datos sintéticos sucios y en merges
+incrementales con claves repetidas. Los tests con Spark se omiten si no hay Java
+"""
+
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import RAIZ
+from datos_sinteticos import GeneradorDatos
+from ingesta_bronze import IngestaBronze, FUENTES_DEFAULT
+from limpieza_silver import LimpiezaSilver
+from reglas_silver import TABLAS_SILVER
+
+# Columna de texto por tabla con la que se distinguen las versiones de una fila en el merge
+COLUMNA_VERSION = {'clientes': 'nombre', 'extra': 'codigo_unico'}
+
+
+def ingestar(directorio, bronze_path):
+    """Bronze en disco de las tres fuentes de `directorio`"""
+    ingesta = IngestaBronze(output_path=bronze_path, workers_por_archivo=1)
+    for fuente, (metodo, archivo) in FUENTES_DEFAULT.items():
+        ingesta.registrar_fuente(fuente, metodo, os.path.join(directorio, archivo))
+    ingesta.ejecutar_ingesta()
+    return bronze_path
+
+
+def limpiar(bronze_path, silver_path, motor, spark=None, incremental=False):
+    limpieza = LimpiezaSilver(input_path=bronze_path, output_path=silver_path, incremental=incremental,
+                              motor=motor, sesion=spark)
+    return limpieza.ejecutar_limpieza()
+
+
+def leer_silver(silver_path, fuente):
+    """Silver de una tabla como DataFrame con orden de filas y columnas estable"""
+    tabla = ds.dataset(f"{silver_path}/{TABLAS_SILVER[fuente]['tabla']}_silver.parquet",
+                       format='parquet', partitioning='hive').to_table()
+    df = tabla.drop(['processed_at']).to_pandas()
+    columnas = sorted(df.columns)
+    clave = TABLAS_SILVER[fuente]['clave']
+    return df[columnas].sort_values([clave] + [c for c in columnas if c != clave]).reset_index(drop=True)
+
+
+def comparar_motores(silver_arrow, silver_spark):
+    for fuente in TABLAS_SILVER:
+        pd.testing.assert_frame_equal(
+            leer_silver(silver_arrow, fuente), leer_silver(silver_spark, fuente), check_dtype=False
+        )
+
+
+def agregar_delta(bronze_path, fuente):
+    """
+    Parte Bronze nueva con una clave existente repetida dos veces y una clave nueva.
+    Retorna (clave repetida, versión que debe ganar, clave nueva)
+    """
+    especificacion = TABLAS_SILVER[fuente]
+    directorio = f"{bronze_path}/{especificacion['tabla']}_bronze.parquet"
+    base = ds.dataset(directorio, format='parquet').to_table()
+    clave, columna = especificacion['clave'], COLUMNA_VERSION[fuente]
+    repetida = 2
+    nueva = pc.max(base.column(clave)).as_py() + 1
+    
+    delta = base.take([0, 1, 2])
+    delta = delta.set_column(delta.schema.get_field_index(clave), clave,
+                             pa.array([repetida, repetida, nueva], base.schema.field(clave).type))
+    delta = delta.set_column(delta.schema.get_field_index(columna), columna,
+                             pa.array(['PRIM01', 'SEGU02', 'NUEV03'], base.schema.field(columna).type))
+    pq.write_table(delta, f"{directorio}/part-99999-00000.parquet")
+    return repetida, 'PRIM01', nueva
+
+
+def comprobar_merge(silver_path, fuente, repetida, ganadora, nueva):
+    """Semántica fijada del merge: una fila por clave y gana la primera del delta"""
+    df = leer_silver(silver_path, fuente)
+    clave = TABLAS_SILVER[fuente]['clave']
+    assert not df[clave].duplicated().any()
+    assert df.loc[df[clave] == repetida, COLUMNA_VERSION[fuente]].tolist() == [ganadora]
+    assert df.loc[df[clave] == nueva, COLUMNA_VERSION[fuente]].tolist() == ['NUEV03']
+
+
+@pytest.fixture
+def sinteticos(tmp_path):
+    """Fuentes sintéticas con un 10% de filas sucias"""
+    directorio = str(tmp_path / 'fuentes')
+    GeneradorDatos(2_000, proporcion_sucios=0.10, semilla=7, filas_por_bloque=700).generar(directorio)
+    return directorio
+
+
+@pytest.mark.parametrize('motor', ['arrow', 'spark'])
+def test_merge_con_claves_repetidas(motor, tmp_path, sinteticos, request):
+    spark = request.getfixturevalue('spark') if motor == 'spark' else None
+    bronze_path = ingestar(sinteticos, str(tmp_path / 'bronze'))
+    silver_path = str(tmp_path / 'silver')
+    limpiar(bronze_path, silver_path, motor, spark)
+    
+    esperados = {fuente: agregar_delta(bronze_path, fuente) for fuente in COLUMNA_VERSION}
+    stats = limpiar(bronze_path, silver_path, motor, spark, incremental=True)
+    
+    for fuente, (repetida, ganadora, nueva) in esperados.items():
+        assert stats[fuente]['modo'] == 'merge'
+        comprobar_merge(silver_path, fuente, repetida, ganadora, nueva)
+
+
+def test_equivalencia_datos_muestra(tmp_path, spark):
+    bronze_path = str(tmp_path / 'bronze')
+    os.makedirs(tmp_path / 'fuentes')
+    for _, archivo in FUENTES_DEFAULT.values():
+        shutil.copy(os.path.join(RAIZ, archivo), tmp_path / 'fuentes')
+    ingestar(str(tmp_path / 'fuentes'), bronze_path)
+    
+    limpiar(bronze_path, str(tmp_path / 'silver_arrow'), 'arrow')
+    limpiar(bronze_path, str(tmp_path / 'silver_spark'), 'spark', spark)
+    comparar_motores(str(tmp_path / 'silver_arrow'), str(tmp_path / 'silver_spark'))
+
+
+def test_equivalencia_datos_sinteticos(tmp_path, sinteticos, spark):
+    bronze_path = ingestar(sinteticos, str(tmp_path / 'bronze'))
+    
+    limpiar(bronze_path, str(tmp_path / 'silver_arrow'), 'arrow')
+    limpiar(bronze_path, str(tmp_path / 'silver_spark'), 'spark', spark)
+    comparar_motores(str(tmp_path / 'silver_arrow'), str(tmp_path / 'silver_spark'))
+
+
+def test_equivalencia_merge_incremental(tmp_path, sinteticos, spark):
+    bronze_path = ingestar(sinteticos, str(tmp_path / 'bronze'))
+    silver_arrow, silver_spark = str(tmp_path / 'silver_arrow'), str(tmp_path / 'silver_spark')
+    limpiar(bronze_path, silver_arrow, 'arrow')
+    limpiar(bronze_path, silver_spark, 'spark', spark)
+    
+    for fuente in COLUMNA_VERSION:
+        agregar_delta(bronze_path, fuente)
+    limpiar(bronze_path, silver_arrow, 'arrow', incremental=True)
+    limpiar(bronze_path, silver_spark, 'spark', spark, incremental=True)
+    comparar_motores(silver_arrow, silver_spark)
@@ -0,0 +1,33 @@
+"""Tests de indice_claves: dígito verificador y validación del RUT"""
+
+import numpy as np
+import pyarrow as pa
+
+from indice_claves import digito_verificador, rut_valido
+
+
+def _digito_referencia(cuerpo):
+    """Módulo 11 escalar (factores 2..7 de derecha a izquierda), como se calcula a mano"""
+    suma = sum(int(d) * factor for d, factor in zip(reversed(str(cuerpo)), [2, 3, 4, 5, 6, 7] * 2))
+    return {11: '0', 10: 'K'}.get(11 - suma % 11, str(11 - suma % 11))
+
+
+def test_digito_verificador():
+    cuerpos = [12345678, 11111111, 1931858, 6, 14, 23, 28, 99999999]
+    
+    assert digito_verificador(cuerpos).tolist() == [_digito_referencia(c) for c in cuerpos]
+    # Casos conocidos, incluidos los que terminan en K y en 0
+    assert digito_verificador([12345678, 11111111, 6, 14]).tolist() == ['5', '1', 'K', '0']
+
+
+def test_rut_valido_conocidos_k_y_cero():
+    validos = ['123456785', '111111111', '19318583', '6K', '6k', '140', ' 23K ']
+    
+    assert rut_valido(validos).tolist() == [True] * len(validos)
+    assert rut_valido(['123456784', '111111112', '60', '14K']).tolist() == [False] * 4
+
+
+def test_rut_valido_formato_nulos_y_cuerpo_cero():
+    ruts = pa.array([None, '', '12.345.678-5', '12345678-5', 'K', '1234567890', 'ABC', '00', '000000000', '0K'])
+    
+    assert not np.any(rut_valido(ruts))
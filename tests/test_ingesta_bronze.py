@@ -0,0 +1,179 @@
+"""
+Tests de IngestaBronze: parser SQL en streaming, división en rangos de bytes e ingesta
+incremental por marca de agua (offset + huella)
+"""
+
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pytest
+
+from conftest import RAIZ
+from ingesta_bronze import IngestaBronze, TABLAS_BRONZE
+
+DUMP_SQL = """CREATE TABLE clientes (
+codigo INT,
+nombre VARCHAR(50),
+comuna VARCHAR(50)
+);
+
+INSERT INTO clientes VALUES (1, 'O''Brien', 'Ñuñoa');
+INSERT INTO `clientes` VALUES (2, 'D\\'Angelo', NULL), (3, 'Punto; y coma', 'Las Condes');
+INSERT INTO otra VALUES (9, 'x', 'y');
+INSERT INTO clientes VALUES (4, 'Línea\\nnueva', 'Maipú');
+"""
+
+FILAS_DUMP = [
+    ['1', "O'Brien", 'Ñuñoa'],
+    ['2', "D'Angelo", None],
+    ['3', 'Punto; y coma', 'Las Condes'],
+    ['4', 'Línea\nnueva', 'Maipú']
+]
+
+
+def _escribir_dump(tmp_path, contenido=DUMP_SQL):
+    ruta = tmp_path / 'clientes.sql'
+    ruta.write_text(contenido, encoding='utf-8')
+    return str(ruta)
+
+
+def _filas(lotes):
+    tabla = pa.Table.from_batches(list(lotes))
+    return [list(fila.values()) for fila in tabla.to_pylist()]
+
+
+def test_parser_sql_escapes_nulos_y_varias_filas(tmp_path):
+    sql_file = _escribir_dump(tmp_path)
+    lotes = list(IngestaBronze().iterar_lotes_sql(sql_file))
+    
+    assert lotes[0].schema.names == ['codigo', 'nombre', 'comuna']
+    assert _filas(lotes) == FILAS_DUMP
+
+
+def test_parser_sql_sentencias_cortadas_entre_bloques(tmp_path):
+    sql_file = _escribir_dump(tmp_path)
+    ingesta = IngestaBronze()
+    esperado = list(ingesta.iterar_sentencias_sql(sql_file))
+    assert len(esperado) == 3
+    
+    # Bloques de 1 byte cortan también los caracteres UTF-8 de varios bytes ('Ñ', 'í')
+    for tamano_bloque in (1, 2, 7, 33, 100):
+        assert list(ingesta.iterar_sentencias_sql(sql_file, tamano_bloque=tamano_bloque)) == esperado
+
+
+def test_parser_sql_lotes_de_tamano_fijo(tmp_path):
+    sql_file = _escribir_dump(tmp_path)
+    lotes = list(IngestaBronze().iterar_lotes_sql(sql_file, tamano_lote=2))
+    
+    # El corte de lote va tras el INSERT que alcanza el tamaño (el de dos filas no se parte)
+    assert [lote.num_rows for lote in lotes] == [3, 1]
+    assert _filas(lotes) == FILAS_DUMP
+
+
+def test_parse_sql_inserts_tipa_segun_create_table(tmp_path):
+    df = IngestaBronze().parse_sql_inserts(_escribir_dump(tmp_path))
+    
+    assert df['codigo'].tolist() == [1, 2, 3, 4]
+    assert df['comuna'].isna().tolist() == [False, True, False, False]
+
+
+@pytest.mark.parametrize('archivo,es_sql', [('clientes_extra.txt', False), ('clientes.sql', True)])
+def test_rangos_alineados_a_linea_y_sentencia(archivo, es_sql):
+    filepath = os.path.join(RAIZ, archivo)
+    with open(filepath, 'rb') as f:
+        contenido = f.read()
+    
+    for inicio in (0, contenido.index(b'\n', len(contenido) // 2) + 1):
+        rangos = IngestaBronze().calcular_rangos(filepath, es_sql=es_sql, tamano_rango=2_000, inicio=inicio)
+        assert len(rangos) > 3
+        # Contiguos y cubriendo [inicio, tamaño) completo
+        assert rangos[0][0] == inicio and rangos[-1][1] == len(contenido)
+        assert all(fin == siguiente for (_, fin), (siguiente, _) in zip(rangos, rangos[1:]))
+        for _, fin in rangos[:-1]:
+            assert contenido[fin - 1:fin] == b'\n'
+            if es_sql:
+                assert contenido[:fin].rstrip().endswith(b';')
+                assert contenido[fin:].lstrip().startswith(b'INSERT')
+
+
+def _ingestar(metodo, archivo, output_path, **opciones):
+    ingesta = IngestaBronze(output_path=output_path, **opciones)
+    getattr(ingesta, metodo)(os.path.join(RAIZ, archivo))
+    partes = ds.dataset(os.path.join(output_path, TABLAS_BRONZE[metodo]), format='parquet')
+    return len(partes.files), partes.to_table().sort_by('codigo')
+
+
+@pytest.mark.parametrize('metodo,archivo', [('ingestar_txt', 'clientes_extra.txt'), ('ingestar_sql', 'clientes.sql')])
+def test_rangos_en_paralelo_igual_que_un_solo_rango(tmp_path, metodo, archivo):
+    _, un_rango = _ingestar(metodo, archivo, str(tmp_path / 'un_rango'))
+    archivos, por_rangos = _ingestar(metodo, archivo, str(tmp_path / 'rangos'), tamano_rango=4_000, workers_por_archivo=2)
+    
+    assert archivos > 1
+    assert por_rangos.equals(un_rango)
+
+
+def _ingesta_incremental(tmp_path, filepath):
+    """Ingesta incremental de un TXT como fuente 'extra'. Retorna (ingesta, filas en Bronze, lotes con partes)"""
+    ingesta = IngestaBronze(output_path=str(tmp_path / 'bronze'), incremental=True, workers_por_archivo=1)
+    ingesta.fuentes = {}
+    ingesta.registrar_fuente('extra', 'ingestar_txt', filepath)
+    ingesta.ejecutar_ingesta()
+    output_dir = os.path.join(ingesta.output_path, TABLAS_BRONZE['ingestar_txt'])
+    lotes = sorted({int(nombre.split('-')[1]) for nombre in os.listdir(output_dir) if nombre.startswith('part-')})
+    return ingesta, ds.dataset(output_dir, format='parquet').count_rows(), lotes
+
+
+@pytest.fixture
+def extra_txt(tmp_path):
+    """Copia modificable de clientes_extra.txt (500 líneas)"""
+    filepath = str(tmp_path / 'clientes_extra.txt')
+    shutil.copy(os.path.join(RAIZ, 'clientes_extra.txt'), filepath)
+    return filepath
+
+
+def test_incremental_anexado_lee_solo_la_cola(tmp_path, extra_txt):
+    ingesta, filas, lotes = _ingesta_incremental(tmp_path, extra_txt)
+    assert (filas, lotes) == (500, [0])
+    
+    with open(extra_txt, 'a') as f:
+        f.write('501, APP, NUEV01, 2025-03-01\n502, LOCAL, NUEV02, 2025-03-02\n')
+    ingesta, filas, lotes = _ingesta_incremental(tmp_path, extra_txt)
+    assert (filas, lotes) == (502, [0, 1])
+    assert ingesta.stats['registros_totales'] == 2
+    assert ingesta.estado['clientes_extra_bronze.parquet']['offset'] == os.path.getsize(extra_txt)
+    assert ingesta.estado['clientes_extra_bronze.parquet']['max_codigo'] == 502
+    
+    # Sin cambios: ni lote nuevo ni filas nuevas
+    ingesta, filas, lotes = _ingesta_incremental(tmp_path, extra_txt)
+    assert (filas, lotes, ingesta.stats['registros_totales']) == (502, [0, 1], 0)
+
+
+def test_incremental_reescritura_detectada_por_huella(tmp_path, extra_txt):
+    _ingesta_incremental(tmp_path, extra_txt)
+    
+    # Mismo prefijo de bytes en tamaño pero con otro contenido, y una línea nueva al final:
+    # por tamaño parecería un anexado, la huella del tramo ya ingerido lo descarta
+    with open(extra_txt) as f:
+        contenido = f.read()
+    with open(extra_txt, 'w') as f:
+        f.write(contenido.replace('1, APP, XMOR34', '1, APP, XMOR35', 1) + '501, APP, NUEV01, 2025-03-01\n')
+    ingesta, filas, lotes = _ingesta_incremental(tmp_path, extra_txt)
+    
+    assert (filas, lotes, ingesta.stats['registros_totales']) == (501, [0], 501)
+    bronze = ds.dataset(os.path.join(ingesta.output_path, TABLAS_BRONZE['ingestar_txt']), format='parquet').to_table()
+    assert ' XMOR35' in bronze.column('codigo_unico').to_pylist()
+
+
+def test_incremental_archivo_truncado_recarga_completa(tmp_path, extra_txt):
+    _ingesta_incremental(tmp_path, extra_txt)
+    
+    with open(extra_txt) as f:
+        lineas = f.readlines()
+    with open(extra_txt, 'w') as f:
+        f.writelines(lineas[:200])
+    ingesta, filas, lotes = _ingesta_incremental(tmp_path, extra_txt)
+    
+    assert (filas, lotes) == (200, [0])
+    assert ingesta.estado['clientes_extra_bronze.parquet']['offset'] == os.path.getsize(extra_txt)
@@ -0,0 +1,86 @@
+"""Tests de MotorArrow: escritura de Silver y merge por clave"""
+
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from motor_arrow import MotorArrow
+
+
+def _leer(output_file):
+    tabla = ds.dataset(output_file, format='parquet', partitioning='hive').to_table()
+    return sorted(zip(tabla.column('codigo').to_pylist(), tabla.column('nombre').to_pylist()))
+
+
+def test_merge_con_claves_repetidas_en_el_delta(tmp_path):
+    output_file = str(tmp_path / 'clientes_silver.parquet')
+    motor = MotorArrow()
+    base = pa.table({'codigo': pa.array([1, 2, 3], pa.int32()), 'nombre': ['uno', 'dos', 'tres']})
+    motor.escribir(base, output_file, 'codigo', es_merge=False)
+    
+    delta = pa.table({'codigo': pa.array([2, 2, 4], pa.int32()), 'nombre': ['dos-a', 'dos-b', 'cuatro']})
+    motor.escribir(delta, output_file, 'codigo', es_merge=True)
+    
+    # Cada clave una vez; la primera fila del delta gana entre las repetidas
+    assert _leer(output_file) == [(1, 'uno'), (2, 'dos-a'), (3, 'tres'), (4, 'cuatro')]
+
+
+def test_merge_conserva_claves_nuevas_desordenadas(tmp_path):
+    output_file = str(tmp_path / 'clientes_silver.parquet')
+    motor = MotorArrow()
+    motor.escribir(pa.table({'codigo': pa.array([5], pa.int32()), 'nombre': ['cinco']}),
+                   output_file, 'codigo', es_merge=False)
+    
+    delta = pa.table({'codigo': pa.array([9, 7, 9, 5, 8], pa.int32()),
+                      'nombre': ['nueve', 'siete', 'nueve-b', 'cinco-b', 'ocho']})
+    motor.escribir(delta, output_file, 'codigo', es_merge=True)
+    
+    assert _leer(output_file) == [(5, 'cinco-b'), (7, 'siete'), (8, 'ocho'), (9, 'nueve')]
+
+
+def test_escritura_fallida_conserva_las_particiones(tmp_path, monkeypatch):
+    output_file = str(tmp_path / 'clientes_silver.parquet')
+    motor = MotorArrow()
+    motor.escribir(pa.table({'codigo': pa.array([1, 2], pa.int32()), 'nombre': ['uno', 'dos']}),
+                   output_file, 'codigo', es_merge=False)
+    
+    def fallar(*args, **kwargs):
+        raise OSError('disco lleno')
+    monkeypatch.setattr(ds, 'write_dataset', fallar)
+    delta = pa.table({'codigo': pa.array([2, 3], pa.int32()), 'nombre': ['dos-b', 'tres']})
+    for es_merge in (True, False):
+        with pytest.raises(OSError):
+            motor.escribir(delta, output_file, 'codigo', es_merge=es_merge)
+        # Ni el rango tocado ni el resto de la tabla se pierden, y no queda el directorio temporal
+        assert _leer(output_file) == [(1, 'uno'), (2, 'dos')]
+        assert not [e for e in os.listdir(output_file) if e.startswith('.')]
+
+
+def test_carga_completa_reemplaza_todas_las_particiones(tmp_path):
+    output_file = str(tmp_path / 'clientes_silver.parquet')
+    motor = MotorArrow()
+    motor.escribir(pa.table({'codigo': pa.array([1, 50_000_000], pa.int32()), 'nombre': ['uno', 'lejano']}),
+                   output_file, 'codigo', es_merge=False)
+    motor.escribir(pa.table({'codigo': pa.array([2], pa.int32()), 'nombre': ['dos']}),
+                   output_file, 'codigo', es_merge=False)
+    
+    assert _leer(output_file) == [(2, 'dos')]
+    assert len(os.listdir(output_file)) == 1
+
+
+def test_carga_completa_sobre_silver_sin_particionar(tmp_path):
+    # Layout anterior de Silver: part files en el primer nivel de la tabla, sin rango_codigo
+    output_file = tmp_path / 'clientes_silver.parquet'
+    output_file.mkdir()
+    pq.write_table(pa.table({'codigo': pa.array([1, 2], pa.int32()), 'nombre': ['uno', 'dos']}),
+                   output_file / 'part-00000-antiguo-c000.snappy.parquet')
+    (output_file / '_SUCCESS').touch()
+    
+    MotorArrow().escribir(pa.table({'codigo': pa.array([1, 2, 3], pa.int32()), 'nombre': ['uno', 'dos', 'tres']}),
+                          str(output_file), 'codigo', es_merge=False)
+    
+    assert _leer(str(output_file)) == [(1, 'uno'), (2, 'dos'), (3, 'tres')]
+    assert not list(output_file.glob('*.parquet'))
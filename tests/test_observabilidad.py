@@ -0,0 +1,29 @@
+"""Tests del Trazador: exportación a Prometheus"""
+
+from observabilidad import Trazador
+
+
+def _muestras(texto):
+    lineas = [l for l in texto.splitlines() if l and not l.startswith('#')]
+    return dict(l.rsplit(' ', 1) for l in lineas)
+
+
+def test_prometheus_una_muestra_por_conjunto_de_etiquetas(tmp_path):
+    trazador = Trazador(jsonl_file=None, prometheus_file=str(tmp_path / 'metricas.prom'))
+    # Un ciclo de streaming con dos archivos de 'extra': dos spans con las mismas etiquetas
+    for filas in (100, 50):
+        with trazador.span('bronze', tabla='extra', modo='disco') as span:
+            span.registrar(filas_salida=filas, descartes={'codigo_nulo': 2})
+    with trazador.span('bronze', tabla='info', modo='disco') as span:
+        span.registrar(filas_salida=10)
+    
+    texto = trazador.texto_prometheus()
+    muestras = _muestras(texto)
+    lineas = [l for l in texto.splitlines() if l and not l.startswith('#')]
+    assert len(lineas) == len(set(l.rsplit(' ', 1)[0] for l in lineas))
+    
+    extra = '{etapa="bronze",tabla="extra",modo="disco"}'
+    assert muestras[f'lidl_filas_salida{extra}'] == '150'
+    assert muestras[f'lidl_exito{extra}'] == '1'
+    assert muestras['lidl_filas_descartadas{etapa="bronze",tabla="extra",modo="disco",regla="codigo_nulo"}'] == '4'
+    assert muestras['lidl_filas_salida{etapa="bronze",tabla="info",modo="disco"}'] == '10'
@@ -0,0 +1,101 @@
+"""Tests de PlanificadorDAG: orden por dependencias, reintentos y omisión tras un fallo"""
+
+import threading
+import time
+
+import pytest
+
+from planificador import PlanificadorDAG
+
+
+def test_dependencias_en_orden_y_con_sus_resultados():
+    orden, lock = [], threading.Lock()
+    
+    def tarea(nombre, valor):
+        def funcion(*argumentos):
+            time.sleep(0.01)
+            with lock:
+                orden.append(nombre)
+            return valor + sum(argumentos)
+        return funcion
+    
+    planificador = PlanificadorDAG(max_concurrencia=4)
+    planificador.agregar('gold', tarea('gold', 100), dependencias=['silver_a', 'silver_b'])
+    planificador.agregar('silver_a', tarea('silver_a', 10), dependencias=['bronze_a'])
+    planificador.agregar('silver_b', tarea('silver_b', 20), dependencias=['bronze_b'])
+    planificador.agregar('bronze_a', tarea('bronze_a', 1))
+    planificador.agregar('bronze_b', tarea('bronze_b', 2))
+    resultados = planificador.ejecutar()
+    
+    # Cada tarea recibe los resultados de sus dependencias en el orden declarado
+    assert resultados == {'bronze_a': 1, 'bronze_b': 2, 'silver_a': 11, 'silver_b': 22, 'gold': 133}
+    assert orden.index('bronze_a') < orden.index('silver_a') < orden.index('gold')
+    assert orden.index('bronze_b') < orden.index('silver_b') < orden.index('gold')
+    assert planificador.fallidas() == []
+
+
+def test_tareas_independientes_en_paralelo():
+    barrera = threading.Barrier(3, timeout=5)
+    planificador = PlanificadorDAG(max_concurrencia=3)
+    for nombre in ('extra', 'info', 'clientes'):
+        # Solo terminan si las tres están en ejecución a la vez
+        planificador.agregar(f'bronze_{nombre}', barrera.wait)
+    planificador.ejecutar()
+    
+    assert planificador.fallidas() == []
+
+
+def test_reintentos_hasta_completar():
+    intentos = []
+    
+    def inestable():
+        intentos.append(1)
+        if len(intentos) < 3:
+            raise OSError('fallo transitorio')
+        return 'ok'
+    
+    planificador = PlanificadorDAG(reintentos=2, espera_reintento=0)
+    planificador.agregar('bronze', inestable)
+    
+    assert planificador.ejecutar() == {'bronze': 'ok'}
+    assert planificador.tiempos['bronze']['estado'] == 'completada'
+    assert planificador.tiempos['bronze']['intentos'] == 3
+
+
+def test_fallo_omite_dependientes_directos_e_indirectos():
+    ejecutadas = []
+    
+    def fallar():
+        raise ValueError('archivo corrupto')
+    
+    planificador = PlanificadorDAG(reintentos=1, espera_reintento=0)
+    planificador.agregar('bronze_extra', fallar)
+    planificador.agregar('bronze_info', lambda: ejecutadas.append('bronze_info'))
+    planificador.agregar('silver_extra', lambda _: ejecutadas.append('silver_extra'), dependencias=['bronze_extra'])
+    planificador.agregar('silver_info', lambda _: ejecutadas.append('silver_info'), dependencias=['bronze_info'])
+    planificador.agregar('gold', lambda *_: ejecutadas.append('gold'), dependencias=['silver_extra', 'silver_info'])
+    resultados = planificador.ejecutar()
+    
+    assert sorted(ejecutadas) == ['bronze_info', 'silver_info']
+    assert set(resultados) == {'bronze_info', 'silver_info'}
+    assert planificador.tiempos['bronze_extra']['estado'] == 'fallida'
+    assert planificador.tiempos['bronze_extra']['intentos'] == 2
+    assert planificador.tiempos['silver_extra']['estado'] == 'omitida'
+    assert planificador.tiempos['gold']['estado'] == 'omitida'
+    assert planificador.tiempos['gold']['error'] == 'dependencia fallida: silver_extra'
+    assert sorted(planificador.fallidas()) == ['bronze_extra', 'gold', 'silver_extra']
+
+
+@pytest.mark.parametrize('dependencias,mensaje', [
+    ({'a': ['b'], 'b': ['a']}, 'Ciclo'),
+    ({'a': ['inexistente']}, 'dependencias desconocidas')
+])
+def test_grafo_invalido(dependencias, mensaje):
+    planificador = PlanificadorDAG()
+    for nombre, previas in dependencias.items():
+        planificador.agregar(nombre, lambda *_: None, dependencias=previas)
+    
+    with pytest.raises(ValueError, match=mensaje):
+        planificador.ejecutar()
+    with pytest.raises(ValueError, match='duplicada'):
+        planificador.agregar('a', lambda: None)
@@ -0,0 +1,20 @@
+"""Tests de MotorValidacion: normalización de enteros y fechas"""
+
+import pandas as pd
+
+from validacion import MotorValidacion
+
+
+def test_fechas_inexistentes_son_invalidas():
+    datos = pd.DataFrame({'fecha': ['2024-02-29', '2024-02-30', '2023-02-29', '1990-13-45', ' 2024-1-5 ', None]})
+    resultado = MotorValidacion({'fecha': {'tipo': 'fecha'}}).validar(datos)
+    
+    assert resultado.invalidos('fecha').tolist() == [False, True, True, True, False, True]
+
+
+def test_enteros_aceptan_literales_numericos():
+    # Igual que pd.to_numeric(errors='coerce').notna() en la validación original
+    datos = pd.DataFrame({'codigo': ['12', '2.0', ' 7 ', '1e3', 'NULL', 'abc', '']})
+    resultado = MotorValidacion({'codigo': {'tipo': 'entero'}}).validar(datos)
+    
+    assert resultado.invalidos('codigo').tolist() == [False, False, False, False, True, True, True]